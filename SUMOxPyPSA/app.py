@@ -4,23 +4,30 @@ SUMOxPyPSA
 Manhattan Grid Simulation with Ultra-Realistic Power Network Visualization and Smart EV Routing
 """
 
-from flask import Flask, render_template
-from flask_socketio import SocketIO, emit
-import traci
-import time
+from flask import Flask, Response, render_template, request, jsonify
+from flask_socketio import SocketIO, emit, join_room, leave_room
+import argparse
 import threading
 import os
-import random
-import math
 import json
 import numpy as np
 from datetime import datetime
 from config import *
-from sumo_config import SUMO_COMMON_CONFIG, CITY_CONFIGS as SUMO_CITY_CONFIGS
+from sumo_config import CITY_CONFIGS as SUMO_CITY_CONFIGS
 
-# Import the ultra-realistic power network
-from manhattan_power_network import ManhattanPowerNetworkRealistic
-from traffic_power_integration import TrafficPowerCoupler
+# Each session runs lights, EV network and power grid in its own worker process
+from session_pool import SessionPool, SessionLimitError, CitySupervisor
+from session_worker import new_metrics
+from frame_pipeline import FramePipeline, DROP_OLDEST
+from frame_delta import FrameStream, KEYFRAME
+from vehicle_frames import VehicleFrameEncoder
+from vehicle_harvester import select_columns
+from viewport_index import GridIndex
+from vehicle_density import DensityGrid
+from frame_recorder import FrameRecording
+from manhattan_core import read_checkpoint_info
+from snapshot_library import closest_snapshot
+from stage_timing import StageTimer, merge_summaries, prometheus_text
 
 app = Flask(__name__, static_url_path='/static', static_folder='static')
 app.config['SECRET_KEY'] = 'SUMOxPyPSA2024'
@@ -29,757 +36,357 @@ socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*")
 # SUMO Configuration
 SUMO_BINARY = os.path.join(SUMO_PATH, "bin/sumo")
 
-# Global state
-simulation_running = False
-simulation_thread = None
-stop_event = threading.Event()
-
-# Power network
-power_network = None
-power_coupler = None
-
-# Real-time metrics
-metrics = {
-    'vehicles': {'total': 0, 'evs': 0, 'charging': 0, 'moving': 0, 'stopped': 0},
-    'power': {'total_mw': 0, 'ev_mw': 0, 'traffic_mw': 0, 'peak_mw': 0},
-    'traffic_lights': {'total': 0, 'green': 0, 'yellow': 0, 'red': 0},
-    'grid': {'efficiency': 0, 'load_factor': 0, 'renewable_percent': 0, 'violations': 0}
-}
-
-class ManhattanTrafficController:
-    """Professional Manhattan traffic light controller with realistic patterns"""
-    
-    def __init__(self):
-        self.lights = {}
-        self.manhattan_bounds = {
-            'lat_min': 40.700,
-            'lat_max': 40.800,
-            'lon_min': -74.020,
-            'lon_max': -73.930
-        }
-        self.cycle_time = 0
-        self.avenue_sync_offset = 0
-        self.traffic_light_states = {}  # Store states for power network
-        
-    def initialize_manhattan_lights(self):
-        """Initialize traffic lights with Manhattan-specific patterns"""
-        try:
-            all_tl_ids = traci.trafficlight.getIDList()
-            manhattan_lights = []
-            
-            for tl_id in all_tl_ids:
-                try:
-                    controlled_lanes = traci.trafficlight.getControlledLanes(tl_id)
-                    if controlled_lanes:
-                        lane_shape = traci.lane.getShape(controlled_lanes[0])
-                        if lane_shape:
-                            pos = lane_shape[-1]
-                            gps = traci.simulation.convertGeo(*pos)
-                            
-                            if (self.manhattan_bounds['lat_min'] <= gps[1] <= self.manhattan_bounds['lat_max'] and
-                                self.manhattan_bounds['lon_min'] <= gps[0] <= self.manhattan_bounds['lon_max']):
-                                manhattan_lights.append((tl_id, gps))
-                except:
-                    continue
-            
-            print(f"🚦 Found {len(manhattan_lights)} traffic lights in Manhattan")
-            
-            for i, (tl_id, gps) in enumerate(manhattan_lights):
-                is_avenue = (i % 3 == 0)
-                pattern = 'AVENUE' if is_avenue else 'STREET'
-                
-                if is_avenue:
-                    offset = int((gps[1] - 40.700) * 1000) % 60
-                else:
-                    offset = random.randint(0, 30)
-                
-                self.lights[tl_id] = {
-                    'pattern': pattern,
-                    'phase': 0,
-                    'timer': offset,
-                    'green_time': 35 if is_avenue else 25,
-                    'yellow_time': 3,
-                    'all_red_time': 2,
-                    'position': gps,
-                    'state_history': []
-                }
-                
-                initial_state = self._generate_manhattan_state(tl_id, 0)
-                traci.trafficlight.setRedYellowGreenState(tl_id, initial_state)
-                self.traffic_light_states[tl_id] = initial_state
-            
-            return True
-            
-        except Exception as e:
-            print(f"Error initializing Manhattan lights: {e}")
-            return False
-    
-    def _generate_manhattan_state(self, tl_id, phase):
-        """Generate state based on Manhattan traffic patterns"""
-        try:
-            current_state = traci.trafficlight.getRedYellowGreenState(tl_id)
-            num_signals = len(current_state)
-            
-            light_info = self.lights.get(tl_id, {})
-            pattern = light_info.get('pattern', 'STREET')
-            
-            if pattern == 'AVENUE':
-                if phase == 0:
-                    state = 'GG' + 'r' * (num_signals - 2) if num_signals > 2 else 'GG'
-                elif phase == 1:
-                    state = 'yy' + 'r' * (num_signals - 2) if num_signals > 2 else 'yy'
-                elif phase == 2:
-                    state = 'r' * num_signals
-                elif phase == 3:
-                    state = 'r' * 2 + 'G' * (num_signals - 2) if num_signals > 2 else 'GG'
-                elif phase == 4:
-                    state = 'r' * 2 + 'y' * (num_signals - 2) if num_signals > 2 else 'yy'
-                else:
-                    state = 'r' * num_signals
-            else:
-                if phase == 0:
-                    state = 'G' * (num_signals // 2) + 'r' * (num_signals - num_signals // 2)
-                elif phase == 1:
-                    state = 'y' * (num_signals // 2) + 'r' * (num_signals - num_signals // 2)
-                elif phase == 2:
-                    state = 'r' * num_signals
-                elif phase == 3:
-                    state = 'r' * (num_signals // 2) + 'G' * (num_signals - num_signals // 2)
-                elif phase == 4:
-                    state = 'r' * (num_signals // 2) + 'y' * (num_signals - num_signals // 2)
-                else:
-                    state = 'r' * num_signals
-            
-            if len(state) != num_signals:
-                state = state[:num_signals] if len(state) > num_signals else state + 'r' * (num_signals - len(state))
-            
-            return state
-            
-        except:
-            return 'rrrr'
-    
-    def update_cycle(self):
-        """Update all traffic lights with Manhattan logic"""
-        self.cycle_time += 1
-        
-        green_count = yellow_count = red_count = 0
-        
-        for tl_id, light_data in self.lights.items():
-            try:
-                light_data['timer'] += 1
-                
-                if light_data['phase'] in [0, 3]:
-                    duration = light_data['green_time']
-                elif light_data['phase'] in [1, 4]:
-                    duration = light_data['yellow_time']
-                else:
-                    duration = light_data['all_red_time']
-                
-                if light_data['timer'] >= duration:
-                    light_data['phase'] = (light_data['phase'] + 1) % 6
-                    light_data['timer'] = 0
-                    
-                    new_state = self._generate_manhattan_state(tl_id, light_data['phase'])
-                    traci.trafficlight.setRedYellowGreenState(tl_id, new_state)
-                    self.traffic_light_states[tl_id] = new_state
-                    
-                    light_data['state_history'].append(new_state)
-                    if len(light_data['state_history']) > 10:
-                        light_data['state_history'].pop(0)
-                
-                current_state = traci.trafficlight.getRedYellowGreenState(tl_id)
-                if 'G' in current_state or 'g' in current_state:
-                    green_count += 1
-                elif 'y' in current_state or 'Y' in current_state:
-                    yellow_count += 1
-                else:
-                    red_count += 1
-                    
-            except:
-                continue
-        
-        metrics['traffic_lights']['green'] = green_count
-        metrics['traffic_lights']['yellow'] = yellow_count
-        metrics['traffic_lights']['red'] = red_count
-    
-    def get_traffic_light_states(self):
-        """Get current traffic light states for power network"""
-        return self.traffic_light_states
+# Replay mode (python app.py --replay <recording>): every session streams the
+# recording instead of running SUMO; set from the command line
+replay = None   # {'path', 'city', 'start', 'end', 'frames'}
+
+# Update streams, one per Socket.IO room. A room is a session plus a frame format
+# and a viewport snapped to the session city's grid (None = whole city), so clients
+# of a session with similar views share one. Clients also join the session's own
+# room (its id) for control messages.
+FRAME_FORMATS = ('json', 'binary')
+client_settings = {}   # Socket.IO sid -> {'format', 'viewport', 'zoom', 'room', 'session', 'overrides'}
+streams_lock = threading.Lock()
+
+def stream_room(session, fmt, viewport):
+    """Room name of a session, frame format and snapped viewport"""
+    if viewport is None:
+        return f"{session.id}/frames_{fmt}"
+    return f"{session.id}/frames_{fmt}_" + "_".join(str(cell) for cell in viewport)
 
-class ManhattanEVNetwork:
-    """EV charging network with smart routing"""
+def lod_room(session):
+    return f"{session.id}/frames_lod"
+
+def assign_client_room(sid):
+    """Move a client into the room matching its session, format and viewport"""
+    settings = client_settings[sid]
+    session = sessions.get(settings['session'])
+    if session is None:
+        return
+    frame_streams = session.state['streams']
+    viewport_grid = session.state['viewport_grid']
+    fmt = settings['format']
+    viewport = None
+    if settings['viewport'] is not None:
+        viewport = viewport_grid.snap_viewport(settings['viewport'], VIEWPORT_MARGIN)
+        if viewport_grid.covers_all(viewport):
+            viewport = None
     
-    def __init__(self):
-        self.stations = []
-        self.charging_sessions = {}
-        self.charging_vehicles = {}  # Track which vehicles are charging at which station
-        self.total_energy_delivered = 0
-        self.peak_demand = 0
-        self.ev_share_percent = 30
-        self.ev_charging_bias_percent = 30
-        self.ev_vehicles = {}  # Track EV vehicles
-        
-    def create_manhattan_grid_stations(self, traffic_light_positions):
-        """Create EV stations WITHIN the traffic light grid area"""
-        if traffic_light_positions and len(traffic_light_positions) > 0:
-            sorted_lights = sorted(traffic_light_positions, key=lambda x: (x[1], x[0]))
-            
-            num_stations = min(12, len(sorted_lights) // 5)
-            step = len(sorted_lights) // num_stations if num_stations > 0 else 1
-            
-            station_names = [
-                'Times Square Supercharger', 'Penn Station Hub', 'Grand Central Station',
-                'Columbus Circle', 'Lincoln Center Station', 'Union Square Station',
-                'Washington Square', 'Financial District', 'UN Plaza Station',
-                'Chelsea Market', 'Hudson Yards', 'Central Park South'
-            ]
-            
-            self.stations = []
-            for i in range(0, min(len(sorted_lights), num_stations * step), step):
-                if len(self.stations) >= 12:
-                    break
-                    
-                light_pos = sorted_lights[i]
-                station_lat = light_pos[1] + random.uniform(-0.0005, 0.0005)
-                station_lon = light_pos[0] + random.uniform(-0.0005, 0.0005)
-                
-                station_lat = max(40.700, min(40.800, station_lat))
-                station_lon = max(-74.020, min(-73.930, station_lon))
-                
-                self.stations.append({
-                    'id': f'ev_station_{len(self.stations)}',
-                    'lat': station_lat,
-                    'lon': station_lon,
-                    'name': station_names[len(self.stations)] if len(self.stations) < len(station_names) else f'Station {len(self.stations)}',
-                    'power': random.choice([150, 250, 350]),
-                    'capacity': random.randint(6, 12),
-                    'street': f'Near intersection {i}',
-                    'vehicles_charging': []
-                })
+    with streams_lock:
+        if settings['zoom'] is not None and settings['zoom'] < LOD_ZOOM_THRESHOLD:
+            # Zoomed out: one city-wide stream of density cells instead of vehicles
+            room = lod_room(session)
         else:
-            # Fallback stations
-            self.stations = []
-            lat_step = (40.800 - 40.700) / 4
-            lon_step = (-73.930 - (-74.020)) / 3
-            
-            station_names = [
-                'Times Square Supercharger', 'Penn Station Hub', 'Grand Central Station',
-                'Columbus Circle', 'Lincoln Center Station', 'Union Square Station',
-                'Washington Square', 'Financial District', 'UN Plaza Station',
-                'Chelsea Market', 'Hudson Yards', 'Central Park South'
-            ]
-            
-            idx = 0
-            for lat_i in range(4):
-                for lon_i in range(3):
-                    if idx >= 12:
-                        break
-                    
-                    station_lat = 40.710 + lat_i * lat_step
-                    station_lon = -74.010 + lon_i * lon_step
-                    
-                    self.stations.append({
-                        'id': f'ev_station_{idx}',
-                        'lat': station_lat,
-                        'lon': station_lon,
-                        'name': station_names[idx] if idx < len(station_names) else f'Station {idx}',
-                        'power': random.choice([150, 250, 350]),
-                        'capacity': random.randint(6, 12),
-                        'street': f'Grid location {lat_i}-{lon_i}',
-                        'vehicles_charging': []
-                    })
-                    idx += 1
-        
-        for station in self.stations:
-            self.charging_sessions[station['id']] = {}
-        
-        print(f"⚡ Created {len(self.stations)} EV stations within Manhattan traffic grid")
-        return self.stations
-    
-    def route_ev_to_station(self, vehicle_id, vehicle_pos):
-        """Route an EV to the nearest available charging station"""
-        try:
-            # Find nearest available station
-            best_station = None
-            min_distance = float('inf')
-            
-            for station in self.stations:
-                # Check if station has capacity
-                if len(station['vehicles_charging']) < station['capacity']:
-                    # Calculate distance
-                    distance = math.sqrt((vehicle_pos[0] - station['lon'])**2 + 
-                                       (vehicle_pos[1] - station['lat'])**2)
-                    
-                    if distance < min_distance:
-                        min_distance = distance
-                        best_station = station
-            
-            if best_station and min_distance < 0.01:  # Within reasonable distance
-                # Convert GPS to SUMO coordinates
-                sumo_pos = traci.simulation.convertGeo(best_station['lon'], best_station['lat'], True)
-                
-                # Get nearest edge to station
-                edges = traci.edge.getIDList()
-                if edges:
-                    # Set new route to charging station
-                    nearest_edge = traci.simulation.convertRoad(sumo_pos[0], sumo_pos[1])[0]
-                    if nearest_edge:
-                        current_edge = traci.vehicle.getRoadID(vehicle_id)
-                        if current_edge and current_edge != nearest_edge:
-                            try:
-                                # Calculate route to charging station
-                                route = traci.simulation.findRoute(current_edge, nearest_edge)
-                                if route and route.edges:
-                                    traci.vehicle.setRoute(vehicle_id, list(route.edges))
-                                    return best_station
-                            except:
-                                pass
-        except Exception as e:
-            pass
-        
-        return None
+            room = stream_room(session, fmt, viewport)
+        if room not in frame_streams and viewport is not None:
+            viewport_rooms = sum(1 for stream in frame_streams.values() if stream.viewport is not None)
+            if viewport_rooms >= MAX_VIEWPORT_ROOMS:
+                # Too many distinct views: serve this client the whole city
+                viewport = None
+                room = stream_room(session, fmt, None)
+        
+        if room not in frame_streams:
+            vehicle_encoder = VehicleFrameEncoder(session.state['bounds']) if fmt == 'binary' else None
+            frame_streams[room] = FrameStream(room, vehicle_encoder=vehicle_encoder, viewport=viewport)
+        
+        old_room = settings['room']
+        if old_room != room:
+            if old_room is not None:
+                leave_room(old_room, sid=sid)
+                release_stream(session, old_room)
+            join_room(room, sid=sid)
+            frame_streams[room].clients += 1
+            settings['room'] = room
+        frame_streams[room].request_keyframe()
+
+def release_stream(session, room):
+    """Drop a client from a stream; viewport streams without clients are discarded"""
+    frame_streams = session.state['streams']
+    stream = frame_streams.get(room)
+    if stream is None:
+        return
+    stream.clients -= 1
+    if stream.clients <= 0 and stream.viewport is not None:
+        del frame_streams[room]
+
+def open_session_streams(session):
+    """Permanent streams, grids, metrics and display pipeline of a new session"""
+    bounds = CITY_CONFIGS[session.settings['city']]['bounds']
+    frame_streams = {}
+    for fmt in FRAME_FORMATS:
+        room = stream_room(session, fmt, None)
+        frame_streams[room] = FrameStream(
+            room, vehicle_encoder=VehicleFrameEncoder(bounds) if fmt == 'binary' else None)
+    frame_streams[lod_room(session)] = FrameStream(lod_room(session), lod=True)
     
-    def process_ev_charging(self, vehicles):
-        """Process EV charging with smart routing"""
-        self.charging_vehicles = {}  # Reset each update
-        total_evs = 0
-        charging_count = 0
-        
-        try:
-            share = int(self.ev_share_percent)
-        except Exception:
-            share = 30
-        share = max(0, min(100, share))
-        
-        try:
-            bias = int(self.ev_charging_bias_percent)
-        except Exception:
-            bias = 30
-        bias = max(0, min(100, bias))
-        
-        # Dynamic capture radius
-        base_radius = 0.002
-        max_extra = 0.006
-        capture_radius = base_radius + (bias / 100.0) * max_extra
-        
-        current_tick = int(time.time())
-        
-        for vehicle in vehicles:
-            vid = vehicle['id']
-            is_ev = (hash(vid) % 100) < share
-            vehicle['is_ev'] = bool(is_ev)
-            
-            if not is_ev:
-                continue
-            
-            total_evs += 1
-            
-            # Check if EV needs charging
-            if vid not in self.ev_vehicles:
-                self.ev_vehicles[vid] = {
-                    'battery': random.uniform(20, 80),  # Battery percentage
-                    'charging': False,
-                    'target_station': None
-                }
-            
-            ev_data = self.ev_vehicles[vid]
-            speed = float(vehicle.get('speed', 0) or 0)
-            
-            # Decide if vehicle needs to charge
-            needs_charging = ev_data['battery'] < 30 or (ev_data['battery'] < 50 and random.random() < bias/100)
-            
-            if needs_charging and not ev_data['charging']:
-                # Route to nearest station
-                station = self.route_ev_to_station(vid, (vehicle['x'], vehicle['y']))
-                if station:
-                    ev_data['target_station'] = station['id']
-            
-            # Check if at charging station
-            for station in self.stations:
-                lat_diff = abs(vehicle['y'] - station['lat'])
-                lon_diff = abs(vehicle['x'] - station['lon'])
-                
-                if lat_diff < capture_radius and lon_diff < capture_radius:
-                    if station['id'] not in self.charging_vehicles:
-                        self.charging_vehicles[station['id']] = []
-                    
-                    if len(self.charging_vehicles[station['id']]) < station['capacity']:
-                        if speed < 2.0:  # Vehicle is stopped/slow
-                            self.charging_vehicles[station['id']].append(vid)
-                            charging_count += 1
-                            ev_data['charging'] = True
-                            vehicle['charging'] = True
-                            
-                            # Update battery
-                            ev_data['battery'] = min(100, ev_data['battery'] + 0.5)
-                            
-                            if vid not in self.charging_sessions[station['id']]:
-                                self.charging_sessions[station['id']][vid] = {
-                                    'start': time.time(),
-                                    'energy_kwh': 0
-                                }
-                            
-                            session = self.charging_sessions[station['id']][vid]
-                            duration_hours = (time.time() - session['start']) / 3600
-                            session['energy_kwh'] = min(station['power'] * duration_hours, 100)
-                            
-                            # If fully charged, leave
-                            if ev_data['battery'] >= 95:
-                                ev_data['charging'] = False
-                                ev_data['target_station'] = None
-                                vehicle['charging'] = False
-                            
-                            break
-        
-        # Update station occupancy
-        for station in self.stations:
-            station['vehicles_charging'] = self.charging_vehicles.get(station['id'], [])
-        
-        return total_evs, charging_count, self.charging_vehicles
+    session.state.update(
+        streams=frame_streams, metrics=new_metrics(), topology=None, bounds=bounds,
+        timer=StageTimer(STAGE_TIMING), worker_timing=None,
+        viewport_grid=GridIndex(bounds, cells=VIEWPORT_GRID_CELLS),
+        density_grid=DensityGrid(bounds, cells=LOD_GRID_CELLS))
+    session.state['pipeline'] = build_frame_pipeline(session)
+    session.state['pipeline'].start()
+
+def close_session_streams(session):
+    """Stop the display pipeline of a closed session"""
+    pipeline = session.state.get('pipeline')
+    if pipeline is not None:
+        pipeline.stop_event.set()
+        pipeline.join()
 
-class PowerGridManager:
-    """Advanced power grid management for Manhattan with ultra-realistic network"""
+def reset_session_streams(session):
+    """Fresh metrics and keyframes for a restarted session"""
+    with streams_lock:
+        for stream in session.state['streams'].values():
+            stream.reset()
+    session.state['metrics'] = new_metrics()
+
+def handle_session_message(session, kind, payload):
+    """Messages from a session's worker process (runs on the session's relay thread)"""
+    if kind == 'frame':
+        timing = payload.pop('timing', None)
+        if timing is not None:
+            session.state['worker_timing'] = timing
+        session.state['pipeline'].submit(payload)
+    elif kind == 'topology':
+        session.state['topology'] = payload
+    elif kind == 'reply':
+        event, data, sid = payload
+        socketio.emit(event, data, to=sid)
+    elif kind == 'started':
+        if payload.get('replay'):
+            print(f"✅ Session {session.id} replaying {replay['path']} (pid {payload['pid']})")
+        else:
+            print(f"✅ Session {session.id} running (pid {payload['pid']}, TraCI port {payload['port']}, "
+                  f"{payload['backend']} backend)")
+        if payload.get('restored'):
+            socketio.emit('checkpoint_restored', payload['restored'], to=session.id)
+        if payload.get('snapshot'):
+            socketio.emit('snapshot_loaded', payload['snapshot'], to=session.id)
+    elif kind == 'restarted':
+        # Frames queued before this message belong to the old run
+        reset_session_streams(session)
+        socketio.emit('simulation_restarted', payload, to=session.id)
+        if payload.get('snapshot'):
+            socketio.emit('snapshot_loaded', payload['snapshot'], to=session.id)
+    elif kind == 'stopped':
+        print(f"⏹️ Session {session.id} simulation stopped")
+        socketio.emit('session_stopped', {'session': session.id, 'error': payload['error']}, to=session.id)
+
+sessions = SessionPool(MAX_SESSIONS, SESSION_IDLE_TIMEOUT,
+                       on_message=handle_session_message, on_close=close_session_streams)
+
+# One shared session per city (session id = city name), e.g. for wall displays
+supervisor = CitySupervisor(sessions, lambda city: with_start_snapshot(session_settings({}, city)),
+                            on_open=open_session_streams)
+
+def city_available(city):
+    """Whether a city's SUMO network has been built (see build.py), or is the replayed city"""
+    if replay is not None:
+        return city == replay['city']
+    net_file = SUMO_CITY_CONFIGS[city.upper()]['net-file']
+    return os.path.exists(os.path.join(CITY_CONFIGS[city]['working_dir'], net_file))
+
+def frame_view(frame, stream, indexes):
+    """Vehicles, vehicle columns and lights of a frame inside a stream's viewport"""
+    if stream.viewport is None:
+        return frame['vehicles'], frame['vehicle_columns'], frame['traffic_lights']
     
-    def __init__(self):
-        self.network = None
-        self.history = []
-        self.peak_demand = 0
-        self.total_energy = 0
-        
-    def initialize_nyc_grid(self):
-        """Initialize NYC power grid with ultra-realistic network"""
-        print("⚡ Initializing Ultra-Realistic Manhattan Power Grid...")
-        self.network = ManhattanPowerNetworkRealistic()
-        self.network.build_network()
-        
-        print(f"✅ NYC Power Grid initialized with {len(self.network.buses)} buses")
-        print(f"   {len(self.network.lines)} lines, {len(self.network.transformers)} transformers")
-        print(f"   {len(self.network.generators)} generators")
-        return self.network
+    vehicle_index, light_index = indexes
+    vehicle_rows = vehicle_index.query(stream.viewport)
+    light_rows = light_index.query(stream.viewport).tolist()
+    vehicles = frame['vehicles']
+    lights = frame['traffic_lights']
+    return ([vehicles[i] for i in vehicle_rows.tolist()],
+            select_columns(frame['vehicle_columns'], vehicle_rows),
+            [lights[i] for i in sorted(light_rows)])
+
+def density_frame(frame, density_grid):
+    """Per-cell vehicle aggregates of a frame (computed once, shared by LOD streams)"""
+    if 'density' not in frame:
+        vehicles = frame['vehicles']
+        columns = frame['vehicle_columns']
+        is_ev = np.fromiter((v['is_ev'] for v in vehicles), dtype=bool, count=len(vehicles))
+        charging = np.fromiter((v['charging'] for v in vehicles), dtype=bool, count=len(vehicles))
+        frame['density'] = density_grid.aggregate(columns['lon'], columns['lat'], is_ev, charging, columns['speed'])
+    return frame['density']
+
+def encode_stage(session, frame):
+    """Delta-encode and serialize the update payload once per active stream (room) of a session"""
+    metrics = frame['metrics']
+    with streams_lock:
+        frame_streams = session.state['streams']
+        streams = [stream for stream in frame_streams.values() if stream.clients > 0]
+        if not streams:
+            streams = [frame_streams[stream_room(session, 'json', None)]]
+        metrics['stream'] = {stream.room: stream.meter.stats() for stream in streams}
+    metrics['worker'] = session.usage  # CPU / memory of the session's process
+    session.state['metrics'] = metrics
+    # One spatial index per frame, shared by every viewport stream
+    indexes = None
+    if any(stream.viewport is not None for stream in streams):
+        columns = frame['vehicle_columns']
+        lights = frame['traffic_lights']
+        indexes = (
+            GridIndex(session.state['bounds'], VIEWPORT_GRID_CELLS).build(columns['lon'], columns['lat']),
+            GridIndex(session.state['bounds'], VIEWPORT_GRID_CELLS).build(
+                [light['x'] for light in lights], [light['y'] for light in lights])
+        )
     
-    def get_power_network_data(self):
-        """Get comprehensive power network data for visualization"""
-        if not self.network:
-            return None
-        
-        # Use the new comprehensive network data method
-        return self.network.get_network_data()
+    payload = {
+        'vehicles': frame['vehicles'],
+        'traffic_lights': frame['traffic_lights'],
+        'ev_stations': frame['ev_stations'],
+        'power': frame['power'],
+        'power_flows': frame['power_flows'],  # Indexed by the 'power_topology' message
+        'metrics': metrics,
+        'simulation_time': frame['simulation_time'],
+        'timestamp': datetime.now().isoformat()
+    }
     
-    def calculate_real_time_load(self, traffic_data, ev_data, traffic_light_states):
-        """Calculate real-time power load using realistic network"""
-        # Update traffic loads in the network
-        self.network.update_traffic_loads(
-            traffic_data['vehicle_count'],
-            traffic_light_states,
-            ev_data.get('charging_vehicles', {})
-        )
-        
-        # Run power flow simulation
-        self.network.simulate_power_flow()
-        
-        # Get status
-        status = self.network.get_status()
-        
-        # Update history
-        self.history.append(status['total_load_mw'])
-        if len(self.history) > 100:
-            self.history.pop(0)
-        
-        # Update peak demand
-        if status['total_load_mw'] > self.peak_demand:
-            self.peak_demand = status['total_load_mw']
-        
-        self.total_energy += status['total_load_mw'] / 3600
-        
-        # Return formatted data for frontend
-        return {
-            'total_load_mw': status['total_load_mw'],
-            'base_load_mw': status['total_load_mw'] - status['traffic_light_load_mw'] - status['street_light_load_mw'] - status['ev_charging_load_mw'],
-            'traffic_infrastructure_mw': status['traffic_light_load_mw'] + status['street_light_load_mw'],
-            'ev_charging_mw': status['ev_charging_load_mw'],
-            'traffic_systems_mw': status['traffic_light_load_mw'],
-            'line_utilization': status['line_utilization'],
-            'load_factor': (status['total_load_mw'] / self.peak_demand * 100) if self.peak_demand > 0 else 0,
-            'renewable_percent': status['renewable_percent'],
-            'peak_demand_mw': self.peak_demand,
-            'total_energy_mwh': self.total_energy,
-            'trend': self._calculate_trend(),
-            'violations': status.get('violations', {'thermal': 0, 'voltage': 0})
-        }
+    encoded_frames = []
+    for stream in streams:
+        vehicles, vehicle_columns, traffic_lights = frame_view(frame, stream, indexes)
+        view = dict(payload, vehicles=vehicles, traffic_lights=traffic_lights)
+        if stream.viewport is not None:
+            view['viewport'] = session.state['viewport_grid'].cells_bounds(stream.viewport)
+        
+        if stream.lod:
+            del view['vehicles']
+            view['density'] = density_frame(frame, session.state['density_grid'])
+            message = stream.encoder.encode(view)
+            attachment = None
+        elif stream.vehicle_encoder is None:
+            message = stream.encoder.encode(view)
+            attachment = None
+        else:
+            # Vehicles travel as a binary attachment; the JSON part carries the announcements
+            del view['vehicles']
+            message = stream.encoder.encode(view)
+            message['vehicles'], attachment = stream.vehicle_encoder.encode_vehicles(
+                vehicles, vehicle_columns, keyframe=message['type'] == KEYFRAME)
+        
+        encoded = json.dumps(message, separators=(',', ':'))
+        stream.meter.record(message['type'], len(encoded) + len(attachment or b''))
+        encoded_frames.append((stream, message['seq'], encoded, attachment))
     
-    def _calculate_trend(self):
-        """Calculate load trend"""
-        if len(self.history) < 10:
-            return 'stable'
-        
-        recent = sum(self.history[-5:]) / 5
-        older = sum(self.history[-10:-5]) / 5
-        
-        if recent > older * 1.05:
-            return 'increasing'
-        elif recent < older * 0.95:
-            return 'decreasing'
+    return encoded_frames
+
+def broadcast_stage(session, encoded_frames):
+    """Push the encoded frames to the clients of each stream"""
+    timer = session.state['timer']
+    for stream, seq, encoded, attachment in encoded_frames:
+        # A frame dropped in the queue forces a keyframe so clients can resync
+        stream.mark_sent(seq)
+        if attachment is None:
+            socketio.emit('update', encoded, to=stream.room)
         else:
-            return 'stable'
+            socketio.emit('update_binary', (encoded, attachment), to=stream.room)
+        timer.count('bytes_emitted', len(encoded) + len(attachment or b''))
+    timer.count('frames_emitted')
 
-# Initialize systems
-traffic_controller = ManhattanTrafficController()
-ev_network = ManhattanEVNetwork()
-power_grid = PowerGridManager()
+def build_frame_pipeline(session):
+    """Display stages of a session after its worker: encode and broadcast, dropping stale frames"""
+    timer = session.state['timer']
+    encode = timer.wrap('encode', encode_stage)
+    emit_frames = timer.wrap('emit', broadcast_stage)
+    pipeline = FramePipeline(threading.Event())
+    pipeline.add_stage('encode', lambda frame: encode(session, frame), maxsize=2, policy=DROP_OLDEST)
+    pipeline.add_stage('broadcast', lambda frames: emit_frames(session, frames), maxsize=2, policy=DROP_OLDEST)
+    return pipeline
 
-def create_manhattan_sumocfg(city):
-    """Create SUMO config optimized for Manhattan"""
-    city_dir = CITY_CONFIGS[city]["working_dir"]
-    city_sumo_config = SUMO_CITY_CONFIGS[city.upper()]
-    
-    temp_path = os.path.join(city_dir, "manhattan.sumocfg")
-    
-    with open(temp_path, 'w') as f:
-        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-        f.write('<configuration>\n')
-        
-        f.write('    <input>\n')
-        f.write(f'        <net-file value="{os.path.basename(city_sumo_config["net-file"])}"/>\n')
-        f.write(f'        <route-files value="{os.path.basename(city_sumo_config["route-files"])}"/>\n')
-        
-        poly_file = "osm.poly.xml.gz"
-        if os.path.exists(os.path.join(city_dir, poly_file)):
-            f.write(f'        <additional-files value="{poly_file}"/>\n')
-        
-        f.write('    </input>\n')
-        
-        f.write('    <processing>\n')
-        f.write('        <ignore-route-errors value="true"/>\n')
-        f.write('        <time-to-teleport value="300"/>\n')
-        f.write('        <max-depart-delay value="900"/>\n')
-        f.write('        <routing-algorithm value="dijkstra"/>\n')
-        f.write('        <device.rerouting.probability value="0.5"/>\n')
-        f.write('        <device.rerouting.period value="60"/>\n')
-        f.write('        <scale value="0.3"/>\n')
-        f.write('        <lateral-resolution value="0.8"/>\n')
-        f.write('    </processing>\n')
-        
-        f.write('    <time>\n')
-        f.write('        <begin value="0"/>\n')
-        f.write('        <step-length value="0.1"/>\n')
-        f.write('    </time>\n')
-        
-        f.write('</configuration>\n')
-    
-    return temp_path
+def session_timing(session):
+    """Stage timings and counters of a session: its worker's latest summary plus the web side"""
+    return merge_summaries(session.state.get('worker_timing'), session.state['timer'].summary())
 
-def get_manhattan_vehicles():
-    """Get vehicles in Manhattan area only"""
-    manhattan_vehicles = []
-    
-    for vid in traci.vehicle.getIDList():
-        try:
-            pos = traci.vehicle.getPosition(vid)
-            gps = traci.simulation.convertGeo(*pos)
-            
-            if (40.700 <= gps[1] <= 40.800 and -74.020 <= gps[0] <= -73.930):
-                manhattan_vehicles.append({
-                    'id': vid,
-                    'x': gps[0],
-                    'y': gps[1],
-                    'angle': traci.vehicle.getAngle(vid),
-                    'speed': traci.vehicle.getSpeed(vid),
-                    'type': traci.vehicle.getTypeID(vid),
-                    'is_ev': False,
-                    'charging': False
-                })
-        except:
-            continue
-    
-    return manhattan_vehicles
+def session_settings(overrides, city=None):
+    """Worker settings of a new session: defaults from config plus the client's choices"""
+    settings = {
+        'city': city or DEFAULT_CITY,
+        'sumo_binary': SUMO_BINARY,
+        'native_programs': NATIVE_SIGNAL_PROGRAMS,
+        'ratio': SIMULATION_RATIO,
+        'ev_share_percent': 30,
+        'ev_charging_bias_percent': 30,
+        'record_dir': RECORDINGS_DIR if RECORD_FRAMES else None,
+        'timing': STAGE_TIMING
+    }
+    settings.update(overrides)
+    if replay is not None:
+        settings.update(city=replay['city'], replay=replay['path'])
+    return settings
 
-def get_manhattan_traffic_lights():
-    """Get traffic lights in Manhattan with proper states"""
-    lights = []
-    
-    for tl_id in traffic_controller.lights:
-        try:
-            light_data = traffic_controller.lights[tl_id]
-            state = traci.trafficlight.getRedYellowGreenState(tl_id)
-            
-            if 'G' in state or 'g' in state:
-                color = 'green'
-            elif 'y' in state or 'Y' in state:
-                color = 'yellow'
-            else:
-                color = 'red'
-            
-            lights.append({
-                'id': tl_id,
-                'x': light_data['position'][0],
-                'y': light_data['position'][1],
-                'state': state,
-                'color': color,
-                'pattern': light_data['pattern']
-            })
-        except:
-            continue
-    
-    return lights
+def with_start_snapshot(settings):
+    """Point a session's next start at the pre-warmed snapshot closest to the current time of day"""
+    settings.pop('snapshot', None)
+    if USE_START_SNAPSHOTS and replay is None:
+        snapshot = closest_snapshot(settings['city'], native_programs=settings['native_programs'])
+        if snapshot is not None:
+            settings['snapshot'] = snapshot['path']
+    return settings
 
-def prepare_ev_station_data(charging_vehicles):
-    """Prepare EV station data for frontend"""
-    station_data = []
-    total_power_mw = 0
-    ev_charging_data = {}  # For power network update
-    
-    for station in ev_network.stations:
-        vehicles_at_station = charging_vehicles.get(station['id'], [])
-        num_charging = len(vehicles_at_station)
-        utilization = (num_charging / station['capacity']) * 100 if station['capacity'] > 0 else 0
-        power_output_mw = (num_charging * station['power']) / 1000
-        
-        total_power_mw += power_output_mw
-        
-        # Prepare data for power network
-        ev_charging_data[station['id']] = vehicles_at_station
-        
-        station_data.append({
-            'id': station['id'],
-            'lat': station['lat'],
-            'lon': station['lon'],
-            'name': station['name'],
-            'street': station['street'],
-            'power': station['power'],
-            'capacity': station['capacity'],
-            'evs_charging': num_charging,
-            'utilization': utilization,
-            'power_output_mw': power_output_mw,
-            'status': 'busy' if utilization > 80 else 'available',
-            'vehicles_charging': vehicles_at_station
-        })
+def join_client_session(sid, session):
+    """Move a client into a session: its control room and one of its frame rooms"""
+    settings = client_settings[sid]
+    leave_client_session(sid)
     
-    return station_data, total_power_mw, ev_charging_data
+    join_room(session.id, sid=sid)
+    session.join(sid)
+    settings['session'] = session.id
+    assign_client_room(sid)
+    emit('session_joined', session_info(session), to=sid)
 
-def manhattan_simulation():
-    """Main Manhattan simulation loop with ultra-realistic power network"""
-    global simulation_running, metrics
-    
-    print("🏙️ Starting Manhattan Grid Simulation with Ultra-Realistic Power Network")
-    print("📍 Area: 40.70°N to 40.80°N, -74.02°W to -73.93°W")
-    print("⚡ Power Network: 138kV/27kV/13.8kV/4.16kV Multi-Level Grid")
-    
-    city_config = CITY_CONFIGS["newyork"]
-    working_dir = city_config["working_dir"]
+def session_info(session):
+    """What a client needs to show a session: id, city, map bounds"""
+    city = session.settings['city']
+    return {
+        'session': session.id,
+        'running': session.running,
+        'shared': session.persistent,
+        'city': city,
+        'name': CITY_CONFIGS[city]['name'],
+        'bounds': session.state['bounds'],
+        'replay': replay
+    }
+
+def leave_client_session(sid):
+    settings = client_settings.get(sid)
+    session = sessions.get(settings['session']) if settings else None
+    if session is None:
+        return
     
-    original_dir = os.getcwd()
-    temp_cfg = None
+    if settings['room'] is not None:
+        leave_room(settings['room'], sid=sid)
+        with streams_lock:
+            release_stream(session, settings['room'])
+    leave_room(session.id, sid=sid)
+    session.leave(sid)
+    settings['session'] = None
+    settings['room'] = None
+
+def client_session():
+    """Session of the requesting client, or None"""
+    settings = client_settings.get(request.sid)
+    return sessions.get(settings['session']) if settings else None
+
+def set_session_value(key, command, value):
+    """Apply a setting to the client's session, or keep it for the session it starts"""
+    session = client_session()
+    if session is None:
+        client_settings[request.sid]['overrides'][key] = value
+        return None
     
-    try:
-        os.chdir(working_dir)
-        temp_cfg = create_manhattan_sumocfg("newyork")
-        
-        simulation_running = True
-        stop_event.clear()
-        
-        sumo_cmd = [SUMO_BINARY, "-c", os.path.basename(temp_cfg)]
-        traci.start(sumo_cmd)
-        print("✅ SUMO started successfully")
-        
-        traffic_controller.initialize_manhattan_lights()
-        
-        traffic_light_positions = []
-        for tl_id, light_data in traffic_controller.lights.items():
-            traffic_light_positions.append(light_data['position'])
-        
-        ev_network.create_manhattan_grid_stations(traffic_light_positions)
-        power_grid.initialize_nyc_grid()
-        
-        step_counter = 0
-        last_update_time = time.time()
-        
-        while traci.simulation.getMinExpectedNumber() > 0 and not stop_event.is_set():
-            traci.simulationStep()
-            step_counter += 1
-            
-            if step_counter % 10 == 0:
-                traffic_controller.update_cycle()
-            
-            if step_counter % 5 == 0:
-                current_time = time.time()
-                
-                if current_time - last_update_time >= 0.1:
-                    vehicles = get_manhattan_vehicles()
-                    metrics['vehicles']['total'] = len(vehicles)
-                    
-                    total_evs, charging_evs, charging_vehicles = ev_network.process_ev_charging(vehicles)
-                    metrics['vehicles']['evs'] = total_evs
-                    metrics['vehicles']['charging'] = charging_evs
-                    
-                    traffic_lights = get_manhattan_traffic_lights()
-                    metrics['traffic_lights']['total'] = len(traffic_lights)
-                    
-                    ev_stations, total_ev_power_mw, ev_charging_data = prepare_ev_station_data(charging_vehicles)
-                    
-                    # Get traffic light states for power network
-                    traffic_light_states = traffic_controller.get_traffic_light_states()
-                    
-                    traffic_data = {
-                        'lights_count': len(traffic_lights),
-                        'vehicle_count': len(vehicles)
-                    }
-                    ev_data = {
-                        'total_power_mw': total_ev_power_mw,
-                        'charging_vehicles': ev_charging_data
-                    }
-                    
-                    # Calculate power with ultra-realistic network
-                    power_data = power_grid.calculate_real_time_load(traffic_data, ev_data, traffic_light_states)
-                    
-                    metrics['power']['total_mw'] = power_data['total_load_mw']
-                    metrics['power']['ev_mw'] = power_data['ev_charging_mw']
-                    metrics['power']['traffic_mw'] = power_data['traffic_infrastructure_mw']
-                    metrics['grid']['load_factor'] = power_data['load_factor']
-                    metrics['grid']['renewable_percent'] = power_data['renewable_percent']
-                    metrics['grid']['violations'] = power_data['violations']['thermal'] + power_data['violations']['voltage']
-                    
-                    # Get comprehensive power network data for visualization
-                    power_network_data = power_grid.get_power_network_data()
-                    
-                    if step_counter % 100 == 0:
-                        print(f"\n📊 Step {step_counter} | Time: {traci.simulation.getTime():.1f}s")
-                        print(f"  🚗 Vehicles: {len(vehicles)} in Manhattan ({total_evs} EVs)")
-                        print(f"  ⚡ Charging: {charging_evs} EVs at stations")
-                        print(f"  🚦 Lights: {metrics['traffic_lights']['green']}G/{metrics['traffic_lights']['yellow']}Y/{metrics['traffic_lights']['red']}R")
-                        print(f"  💡 Power: {power_data['total_load_mw']:.1f} MW (EV: {power_data['ev_charging_mw']:.3f} MW)")
-                        print(f"  📊 Grid: {len(power_network_data['buses'])} buses, {len(power_network_data['lines'])} lines")
-                        print(f"  ⚠️ Violations: {power_data['violations']['thermal']} thermal, {power_data['violations']['voltage']} voltage")
-                    
-                    socketio.emit('update', {
-                        'vehicles': vehicles,
-                        'traffic_lights': traffic_lights,
-                        'ev_stations': ev_stations,
-                        'power': power_data,
-                        'power_network': power_network_data,  # Comprehensive network data
-                        'metrics': metrics,
-                        'simulation_time': traci.simulation.getTime(),
-                        'timestamp': datetime.now().isoformat()
-                    })
-                    
-                    last_update_time = current_time
-            
-            time.sleep(SIMULATION_SPEED)
-        
-        traci.close()
-        
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
-    finally:
-        if temp_cfg and os.path.exists(temp_cfg):
-            os.unlink(temp_cfg)
-        os.chdir(original_dir)
-        simulation_running = False
+    # Kept in the settings so a restarted worker starts with it
+    session.settings[key] = value
+    session.send(command, value)
+    return session
 
 @socketio.on('connect')
 def handle_connect():
     print("✅ Client connected")
+    # Whole-city JSON frames once the client joins or starts a session
+    client_settings[request.sid] = {'format': 'json', 'viewport': None, 'zoom': None, 'room': None,
+                                    'session': None, 'overrides': {}}
     emit('system_ready', {
         'message': 'Connected to Manhattan Grid System with Ultra-Realistic Power Network',
         'features': [
@@ -788,46 +395,145 @@ def handle_connect():
             'Ultra-Realistic Power Grid (138kV/27kV/13.8kV/4.16kV)',
             'Real-time Metrics',
             'Power Flow Analysis',
-            'Violation Detection'
-        ]
+            'Violation Detection',
+            'Isolated Simulation Sessions',
+            'Concurrent Multi-City Simulation',
+            'Frame Recording and Replay'
+        ],
+        'sessions': {'active': len(sessions.sessions), 'max': sessions.max_sessions},
+        'cities': [{'id': city, 'name': config['name'], 'available': city_available(city),
+                    'power_network': config.get('power_network', False)}
+                   for city, config in CITY_CONFIGS.items()],
+        'replay': replay
     })
 
+@socketio.on('disconnect')
+def handle_disconnect():
+    leave_client_session(request.sid)
+    client_settings.pop(request.sid, None)
+
+@socketio.on('join_session')
+def handle_join_session(data):
+    """Watch (and control) an existing session, e.g. from a shared ?session= link"""
+    session = sessions.get((data or {}).get('session'))
+    if session is None:
+        emit('session_error', {'message': 'Session not found (it may have been closed after being idle)'})
+        return
+    join_client_session(request.sid, session)
+
+@socketio.on('change_city')
+def handle_change_city(data):
+    """Watch a city's shared simulation; each city runs in its own worker process"""
+    city = (data or {}).get('city')
+    if city not in CITY_CONFIGS:
+        emit('session_error', {'message': f"Unknown city '{city}'"})
+        return
+    if replay is not None and city != replay['city']:
+        emit('session_error', {'message': f"Replaying a {CITY_CONFIGS[replay['city']]['name']} recording; "
+                                          f"no other city is available"})
+        return
+    if not city_available(city):
+        emit('session_error', {'message': f"{CITY_CONFIGS[city]['name']} has no SUMO network yet "
+                                          f"(run: python build.py {city})"})
+        return
+    
+    session = supervisor.session(city)
+    join_client_session(request.sid, session)
+    print(f"🏙️ Client watching {CITY_CONFIGS[city]['name']}")
+
+@socketio.on('set_frame_format')
+def handle_set_frame_format(data):
+    """Opt in to binary vehicle frames ('binary') or back to JSON ('json')"""
+    fmt = (data or {}).get('format', 'json')
+    if fmt not in FRAME_FORMATS or request.sid not in client_settings:
+        emit('error', {'message': f"Unknown frame format '{fmt}'"})
+        return
+    
+    client_settings[request.sid]['format'] = fmt
+    assign_client_room(request.sid)
+    print(f"📦 Client switched to {fmt} frames")
+
+@socketio.on('set_viewport')
+def handle_set_viewport(data):
+    """Client map bounds [west, south, east, north] and zoom; only that area is streamed"""
+    try:
+        bounds = [float(v) for v in data['bounds']]
+        zoom = float(data.get('zoom', 0))
+    except (KeyError, TypeError, ValueError):
+        emit('error', {'message': 'Invalid viewport'})
+        return
+    if len(bounds) != 4 or request.sid not in client_settings:
+        return
+    
+    settings = client_settings[request.sid]
+    settings['viewport'] = bounds
+    settings['zoom'] = zoom
+    assign_client_room(request.sid)
+
+@socketio.on('request_keyframe')
+def handle_request_keyframe():
+    """Client missed a delta (sequence gap) and needs a full frame"""
+    settings = client_settings.get(request.sid)
+    session = client_session()
+    if session is None:
+        return
+    with streams_lock:
+        stream = session.state['streams'].get(settings['room'])
+        if stream is not None:
+            stream.request_keyframe()
+
 @socketio.on('start_simulation')
-def handle_start():
-    global simulation_thread
+def handle_start(data=None):
+    """Start the client's session, creating one if it has none"""
+    session = client_session()
+    if session is None and (data or {}).get('session'):
+        session = sessions.get(data['session'])
+        if session is not None:
+            join_client_session(request.sid, session)
+    
+    if session is None:
+        try:
+            session = sessions.create(session_settings(client_settings[request.sid]['overrides']))
+        except SessionLimitError as e:
+            emit('session_error', {'message': str(e)})
+            return
+        open_session_streams(session)
+        join_client_session(request.sid, session)
     
-    if not simulation_running:
-        print("🚀 Starting Manhattan simulation with ultra-realistic power network...")
-        simulation_thread = threading.Thread(target=manhattan_simulation)
-        simulation_thread.start()
+    if not session.running:
+        print(f"🚀 Starting session {session.id} with ultra-realistic power network...")
+        reset_session_streams(session)
+        with_start_snapshot(session.settings)
+        session.start()
+        emit('session_joined', session_info(session), to=session.id)
 
 @socketio.on('restart_simulation')
 def handle_restart():
-    global simulation_thread
+    session = client_session()
+    if session is None:
+        handle_start()
+        return
     
-    print("🔄 Restarting simulation...")
+    with_start_snapshot(session.settings)
+    if session.running and replay is None:
+        # Same worker, SUMO process and grid model: the run is reset in place
+        print(f"🔄 Restarting session {session.id} in place...")
+        session.send('restart', session.settings.get('snapshot'))
+        return
     
-    if simulation_running:
-        stop_event.set()
-        if simulation_thread:
-            simulation_thread.join(timeout=2)
-    
-    for key in metrics:
-        if isinstance(metrics[key], dict):
-            for subkey in metrics[key]:
-                metrics[key][subkey] = 0
-    
-    simulation_thread = threading.Thread(target=manhattan_simulation)
-    simulation_thread.start()
+    print(f"🔄 Restarting session {session.id}...")
+    session.stop()
+    reset_session_streams(session)
+    session.start()
 
 @socketio.on('set_ev_percentage')
 def handle_set_ev_percentage(data):
     try:
         percent = int(data.get('percent', 30))
         percent = max(0, min(100, percent))
-        ev_network.ev_share_percent = percent
+        session = set_session_value('ev_share_percent', 'set_ev_percentage', percent)
         print(f"🔧 EV share set to {percent}%")
-        emit('ev_percentage_updated', {'percent': percent})
+        emit('ev_percentage_updated', {'percent': percent}, to=session.id if session else request.sid)
     except Exception as e:
         print(f"Error setting EV percentage: {e}")
 
@@ -836,24 +542,176 @@ def handle_set_ev_charging_bias(data):
     try:
         percent = int(data.get('percent', 30))
         percent = max(0, min(100, percent))
-        ev_network.ev_charging_bias_percent = percent
+        session = set_session_value('ev_charging_bias_percent', 'set_ev_charging_bias', percent)
         print(f"🔧 EV charging propensity set to {percent}%")
-        emit('ev_charging_bias_updated', {'percent': percent})
+        emit('ev_charging_bias_updated', {'percent': percent}, to=session.id if session else request.sid)
     except Exception as e:
         print(f"Error setting EV charging bias: {e}")
 
+@socketio.on('power_outage')
+def handle_power_outage(data):
+    """Cut power to grid buses ({buses: [bus ids]}, empty to restore); the traffic lights they feed go dark"""
+    buses = sorted({str(bus) for bus in (data or {}).get('buses') or ()})
+    session = set_session_value('outage_buses', 'power_outage', buses)
+    print(f"🔌 Power outage: {', '.join(buses) or 'none'}")
+    emit('power_outage_updated', {'buses': buses}, to=session.id if session else request.sid)
+
+@socketio.on('set_simulation_ratio')
+def handle_set_simulation_ratio(data):
+    """Target sim/wall time ratio (e.g. 1, 10; 0 = as fast as possible), applied without a restart"""
+    try:
+        ratio = max(0.0, min(1000.0, float((data or {}).get('ratio', SIMULATION_RATIO))))
+    except (TypeError, ValueError):
+        emit('error', {'message': 'Invalid simulation ratio'})
+        return
+    
+    session = set_session_value('ratio', 'set_ratio', ratio)
+    print(f"⏱️ Simulation pace set to {'max' if ratio == 0 else f'{ratio:g}x'}")
+    emit('simulation_ratio_updated', {'ratio': ratio}, to=session.id if session else request.sid)
+
+@socketio.on('seek_replay')
+def handle_seek_replay(data):
+    """Jump a replay session to a simulation time (seconds); the stream restarts with a keyframe"""
+    session = client_session()
+    if session is None or replay is None:
+        return
+    try:
+        sim_time = float((data or {}).get('time', 0))
+    except (TypeError, ValueError):
+        emit('error', {'message': 'Invalid replay position'})
+        return
+    session.send('seek', sim_time)
+    with streams_lock:
+        for stream in session.state['streams'].values():
+            stream.request_keyframe()
+
+def list_checkpoints():
+    """Saved checkpoints, newest first"""
+    if not os.path.isdir(CHECKPOINTS_DIR):
+        return []
+    checkpoints = []
+    for name in os.listdir(CHECKPOINTS_DIR):
+        info = read_checkpoint_info(os.path.join(CHECKPOINTS_DIR, name))
+        if info is not None:
+            checkpoints.append(dict(info, checkpoint=name))
+    return sorted(checkpoints, key=lambda info: info['created'], reverse=True)
+
+@socketio.on('list_checkpoints')
+def handle_list_checkpoints():
+    emit('checkpoints', {'checkpoints': list_checkpoints()})
+
+@socketio.on('save_checkpoint')
+def handle_save_checkpoint():
+    """Checkpoint the client's running session; watchers get 'checkpoint_saved'"""
+    session = client_session()
+    if session is None or not session.running or replay is not None:
+        emit('session_error', {'message': 'No running simulation to checkpoint'})
+        return
+    
+    name = f"{session.settings['city']}_{session.id}_{datetime.now():%Y%m%d_%H%M%S}"
+    session.send('checkpoint', (os.path.join(CHECKPOINTS_DIR, name), session.id))
+
+@socketio.on('restore_checkpoint')
+def handle_restore_checkpoint(data):
+    """Restart the client's session from a checkpoint (a private session is created if needed)"""
+    name = os.path.basename((data or {}).get('checkpoint') or '')
+    path = os.path.join(CHECKPOINTS_DIR, name)
+    info = read_checkpoint_info(path) if name else None
+    if info is None or replay is not None:
+        emit('session_error', {'message': f"Checkpoint '{name}' not found"})
+        return
+    
+    # Native tlLogic programs are part of the saved SUMO state, so the modes must agree
+    native_programs = bool(info.get('native_programs'))
+    session = client_session()
+    if session is not None and session.settings['city'] != info['city']:
+        emit('session_error', {'message': f"Checkpoint '{name}' is for {CITY_CONFIGS[info['city']]['name']}"})
+        return
+    if session is not None and bool(session.settings['native_programs']) != native_programs:
+        mode = 'native SUMO signal programs' if native_programs else 'TraCI signal control'
+        emit('session_error', {'message': f"Checkpoint '{name}' was saved with {mode}"})
+        return
+    if session is None:
+        overrides = dict(client_settings[request.sid]['overrides'], native_programs=native_programs)
+        try:
+            session = sessions.create(session_settings(overrides, info['city']))
+        except SessionLimitError as e:
+            emit('session_error', {'message': str(e)})
+            return
+        open_session_streams(session)
+        join_client_session(request.sid, session)
+    
+    print(f"💾 Restoring session {session.id} from {name} ({info['simulation_time']:.0f}s)...")
+    reset_session_streams(session)
+    # Only this start resumes from the checkpoint; a later restart begins at t=0
+    session.settings['checkpoint'] = path
+    session.start()
+    del session.settings['checkpoint']
+    emit('session_joined', session_info(session), to=session.id)
+
+@socketio.on('request_diagnostics')
+def handle_request_diagnostics():
+    """Stage timing percentiles and step / frame / byte rates of the client's session"""
+    session = client_session()
+    if session is None:
+        emit('diagnostics', {'session': None})
+        return
+    emit('diagnostics', dict(session_timing(session), session=session.id, city=session.settings['city']))
+
+@socketio.on('request_power_topology')
+def handle_request_power_topology(data=None):
+    """Send the static grid topology unless the client's cached ETag is current"""
+    session = client_session()
+    topology = session.state.get('topology') if session else None
+    if topology is None:
+        return
+    
+    if (data or {}).get('etag') == topology['etag']:
+        emit('power_topology', {'etag': topology['etag'], 'version': topology['version'], 'not_modified': True})
+    else:
+        emit('power_topology', topology)
+
 @socketio.on('request_power_update')
 def handle_request_power_update():
-    """Send latest power network data on request"""
-    if power_grid and power_grid.network:
-        power_network_data = power_grid.get_power_network_data()
-        emit('power_network_update', {'power_network': power_network_data})
+    """Send latest power network data on request (answered by the session's worker)"""
+    session = client_session()
+    if session is not None:
+        session.send('power_network', request.sid)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/sessions')
+def session_status():
+    """Running sessions with CPU and memory of their worker processes, per city and private"""
+    return jsonify({'cities': supervisor.stats(), 'sessions': sessions.stats()})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage timing summaries and counters of every session in Prometheus text format"""
+    entries = [({'session': session.id, 'city': session.settings['city']}, session_timing(session))
+               for session in list(sessions.sessions.values()) if 'timer' in session.state]
+    return Response(prometheus_text(entries), mimetype='text/plain; version=0.0.4')
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SUMOxPyPSA Manhattan grid web server")
+    parser.add_argument("--record", action="store_true",
+                        help="record every session's frames under RECORDINGS_DIR (see config.py)")
+    parser.add_argument("--replay", metavar="RECORDING",
+                        help="stream a recording directory to clients instead of running SUMO")
+    parser.add_argument("--timing", action="store_true",
+                        help="time every simulation loop stage (GET /metrics, 'request_diagnostics' event)")
+    args = parser.parse_args()
+    if args.record:
+        RECORD_FRAMES = True
+    if args.timing:
+        STAGE_TIMING = True
+    if args.replay:
+        recording = FrameRecording(args.replay)
+        replay = {'path': os.path.abspath(args.replay), 'city': recording.meta['city'],
+                  'start': recording.start_time, 'end': recording.end_time, 'frames': len(recording)}
+    
     print("=" * 80)
     print("🏙️  SUMOxPyPSA MANHATTAN GRID SYSTEM")
     print("⚡ ULTRA-REALISTIC POWER NETWORK")
@@ -869,6 +727,19 @@ if __name__ == "__main__":
     print("📊 Features: Real-time power flow, violation detection, renewable integration")
     print("=" * 80)
     print(f"🌐 Server: http://{HOST}:{PORT}")
+    if replay is not None:
+        print(f"🎞️ Replay: {replay['path']} ({replay['frames']} frames, "
+              f"{replay['start']:.0f}-{replay['end']:.0f}s, no SUMO)")
+    elif RECORD_FRAMES:
+        print(f"🎞️ Recording sessions to {RECORDINGS_DIR}")
+    if STAGE_TIMING:
+        print(f"⏱️ Stage timing on: http://{HOST}:{PORT}/metrics")
     print("=" * 80)
     
+    # The debug reloader runs this block in a watcher process too; start city workers
+    # only in the process that serves
+    if AUTOSTART_CITIES and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        supervisor.start([city for city in AUTOSTART_CITIES if city_available(city)])
+        supervisor.start_reporting()
+    
     socketio.run(app, debug=True, host=HOST, port=PORT)
\ No newline at end of file
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Headless batch runner for the Manhattan coupled simulation
+Runs the same traffic light controller, EV network and PowerGridManager as the
+web app, with no web server and no sleeps, for a fixed simulated horizon. EV
+charging is processed every 5 steps like the app's frame cadence; the power flow
+runs and a row is written every --record-interval simulated seconds. The power
+load profiles follow the simulated clock from --start instead of the wall clock.
+
+Rows are written and flushed to the CSV as they are produced, so an interrupted
+run keeps everything recorded before the interruption. Long studies can be split:
+--checkpoint-every saves a checkpoint (SUMO state plus controller, EV and power
+state); --resume continues from one, keeping the rows recorded up to it and
+appending after them.
+
+A run whose demand (the route files) ends before the horizon stops there and
+exits non-zero, keeping the rows it wrote.
+
+Usage:
+    python batch_runner.py --hours 24 --start 2024-06-03T00:00 --output nyc_24h.csv
+    python batch_runner.py --seconds 600 --backend libsumo --native
+    python batch_runner.py --hours 24 --checkpoint-every 3600 --output nyc_24h.csv
+    python batch_runner.py --hours 24 --resume nyc_24h_checkpoints/t043200 --output nyc_24h.csv
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from config import SUMO_PATH
+
+COLUMNS = [
+    'sim_time', 'clock', 'vehicles', 'evs', 'charging_evs', 'ev_mw', 'total_load_mw',
+    'traffic_mw', 'load_factor', 'renewable_percent', 'thermal_violations',
+    'voltage_violations', 'lights_green', 'lights_yellow', 'lights_red'
+]
+
+FRAME_EVERY = 5  # steps between EV charging updates, as in the app loop
+
+
+def parse_start(value):
+    """ISO datetime, or HH:MM on today's date"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        clock = datetime.strptime(value, "%H:%M")
+        return datetime.now().replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+
+
+def record_row(frame, power_data, start_time):
+    """One time series row from a frame and its power flow result"""
+    green, yellow, red = frame['light_colors']
+    sim_time = frame['simulation_time']
+    return {
+        'sim_time': round(sim_time, 1),
+        'clock': (start_time + timedelta(seconds=sim_time)).isoformat(timespec='seconds'),
+        'vehicles': len(frame['vehicles']),
+        'evs': frame['total_evs'],
+        'charging_evs': frame['charging_evs'],
+        'ev_mw': round(power_data['ev_charging_mw'], 4),
+        'total_load_mw': round(power_data['total_load_mw'], 3),
+        'traffic_mw': round(power_data['traffic_infrastructure_mw'], 4),
+        'load_factor': round(power_data['load_factor'], 2),
+        'renewable_percent': round(power_data['renewable_percent'], 2),
+        'thermal_violations': power_data['violations']['thermal'],
+        'voltage_violations': power_data['violations']['voltage'],
+        'lights_green': green,
+        'lights_yellow': yellow,
+        'lights_red': red
+    }
+
+
+def open_series(output, rows=()):
+    """Start the CSV with ``rows`` already in it; returns (file, writer) for appending"""
+    f = open(output, 'w', newline='')
+    writer = csv.DictWriter(f, fieldnames=COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    f.flush()
+    return f, writer
+
+
+def read_rows(output, until):
+    """Rows of an earlier (interrupted) run up to simulated second ``until``"""
+    if not os.path.exists(output):
+        return []
+    with open(output, newline='') as f:
+        return [row for row in csv.DictReader(f) if float(row['sim_time']) <= until]
+
+
+def run_batch(horizon_s, start_time, output, record_interval=60.0, native_programs=False,
+              city="newyork", sumo_binary=None, checkpoint_every=None, checkpoint_dir=None, resume=None,
+              timing=False):
+    """Run the coupled simulation for ``horizon_s`` simulated seconds as fast as possible"""
+    from manhattan_core import ManhattanSimulation, read_checkpoint_info
+    from simulation_backend import traci, backend_name
+    from stage_timing import StageTimer, print_stages
+
+    sumo_binary = sumo_binary or os.path.join(SUMO_PATH, "bin/sumo")
+    if resume:
+        info = read_checkpoint_info(resume)
+        if info is None:
+            raise SystemExit(f"❌ {resume} is not a checkpoint")
+        city = info['city']
+        # Native tlLogic programs are part of the saved SUMO state: the checkpoint sets the mode
+        if native_programs and not info.get('native_programs'):
+            raise SystemExit(f"❌ {resume} was saved with TraCI signal control; drop --native to resume it")
+        native_programs = bool(info.get('native_programs'))
+        if info['start_time']:
+            start_time = datetime.fromisoformat(info['start_time'])
+    simulation = ManhattanSimulation(city, start_time=start_time)
+    simulation.timer = StageTimer(timing)
+    checkpoint_dir = checkpoint_dir or os.path.splitext(output)[0] + "_checkpoints"
+
+    print("=" * 80)
+    print(f"🧮 BATCH RUN: {horizon_s / 3600:.2f} h simulated from {start_time:%Y-%m-%d %H:%M} "
+          f"({backend_name(traci)} backend)")
+    print("=" * 80)
+
+    series = None
+    row_count = 0
+    last_row = None
+    steps = 0
+    wall_start = time.perf_counter()
+    try:
+        simulation.start(sumo_binary, native_programs=native_programs,
+                         sumo_args=("--no-step-log", "true", "--no-warnings", "true"))
+        next_record = 0.0
+        earlier = []
+        if resume:
+            resumed_at = simulation.restore_checkpoint(resume)['simulation_time']
+            earlier = read_rows(output, resumed_at)
+            next_record = float(earlier[-1]['sim_time']) + record_interval if earlier else resumed_at
+            print(f"💾 Resumed at {resumed_at / 3600:.2f} h with {len(earlier)} earlier rows")
+        # Rows past the checkpoint came from the interrupted run and are dropped here
+        series, writer = open_series(output, earlier)
+        row_count = len(earlier)
+        last_row = earlier[-1] if earlier else None
+        next_checkpoint = (traci.simulation.getTime() // checkpoint_every + 1) * checkpoint_every \
+            if checkpoint_every else float('inf')
+        setup_s = time.perf_counter() - wall_start
+        loop_start = time.perf_counter()
+        start_steps, start_sim = simulation.step_counter, traci.simulation.getTime()
+        next_progress = loop_start + 10
+
+        while simulation.running():
+            steps = simulation.step()
+            if steps % FRAME_EVERY:
+                continue
+
+            sim_time = traci.simulation.getTime()
+            if sim_time < next_record and sim_time < horizon_s:
+                # Keep EV routing and charging sessions on the app's cadence
+                simulation.capture_frame()
+                continue
+
+            frame = simulation.capture_frame()
+            last_row = record_row(frame, simulation.couple_power(frame), start_time)
+            writer.writerow(last_row)
+            series.flush()
+            row_count += 1
+            next_record += record_interval
+
+            now = time.perf_counter()
+            if now >= next_progress:
+                rate = (steps - start_steps) / (now - loop_start)
+                print(f"  ⏱️ {sim_time / 3600:6.2f} h | {rate:8.1f} steps/s | "
+                      f"{len(frame['vehicles'])} vehicles | {last_row['total_load_mw']:.1f} MW")
+                next_progress = now + 10
+
+            if sim_time >= horizon_s:
+                break
+
+            if sim_time >= next_checkpoint:
+                path = os.path.join(checkpoint_dir, f"t{int(sim_time):06d}")
+                simulation.save_checkpoint(path)
+                print(f"  💾 Checkpoint at {sim_time / 3600:.2f} h -> {path}")
+                next_checkpoint += checkpoint_every
+        end_sim = traci.simulation.getTime()
+    finally:
+        if series is not None:
+            series.close()
+        simulation.close()
+
+    elapsed = time.perf_counter() - loop_start
+    steps -= start_steps
+
+    sim_seconds = float(last_row['sim_time']) - start_sim if last_row else 0.0
+    print("=" * 80)
+    print(f"   Steps:           {steps}")
+    print(f"   Setup:           {setup_s:9.1f} s")
+    print(f"   Loop:            {elapsed:9.1f} s wall for {sim_seconds:.0f} s simulated "
+          f"({sim_seconds / max(elapsed, 1e-9):.1f}x real time)")
+    print(f"   Throughput:      {steps / max(elapsed, 1e-9):9.1f} steps/s")
+    print(f"   Time series:     {row_count} rows -> {output}")
+    if timing:
+        print_stages(simulation.timer.summary())
+    print("=" * 80)
+
+    if end_sim < horizon_s:
+        # SUMO ran out of vehicles (route files only cover part of the horizon)
+        raise SystemExit(f"❌ Demand ran out at {end_sim / 3600:.2f} h, before the {horizon_s / 3600:.2f} h "
+                         f"horizon; {output} stops there")
+    return row_count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Manhattan traffic/EV/power simulation headless")
+    horizon = parser.add_mutually_exclusive_group()
+    horizon.add_argument("--hours", type=float, default=1.0, help="simulated horizon in hours (default 1)")
+    horizon.add_argument("--seconds", type=float, help="simulated horizon in seconds")
+    parser.add_argument("--start", default="08:00",
+                        help="simulated clock at t=0: ISO datetime or HH:MM today (default 08:00)")
+    parser.add_argument("--record-interval", type=float, default=60.0,
+                        help="simulated seconds between power flows / time series rows (default 60)")
+    parser.add_argument("--output", default="batch_timeseries.csv", help="CSV file for the time series")
+    parser.add_argument("--backend", choices=("traci", "libsumo"),
+                        help="SUMO control backend (default: SIMULATION_BACKEND in config.py)")
+    parser.add_argument("--native", action="store_true", help="compile the signal plan into native SUMO programs")
+    parser.add_argument("--sumo-binary", help="path to the sumo binary (default: SUMO_PATH/bin/sumo)")
+    parser.add_argument("--checkpoint-every", type=float,
+                        help="simulated seconds between checkpoints (default: none)")
+    parser.add_argument("--checkpoint-dir", help="checkpoint directory (default: <output>_checkpoints)")
+    parser.add_argument("--resume", metavar="CHECKPOINT",
+                        help="continue from a checkpoint directory (its clock replaces --start, its signal mode --native)")
+    parser.add_argument("--timing", action="store_true", help="print per-stage timing percentiles at the end")
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        # Read by simulation_backend at import time
+        os.environ['SUMO_BACKEND'] = args.backend
+
+    horizon_s = args.seconds if args.seconds is not None else args.hours * 3600
+    run_batch(horizon_s, parse_start(args.start), args.output, args.record_interval,
+              native_programs=args.native, sumo_binary=args.sumo_binary,
+              checkpoint_every=args.checkpoint_every, checkpoint_dir=args.checkpoint_dir, resume=args.resume,
+              timing=args.timing)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Clip regions in SUMO network coordinates
+A WGS84 bounding box or polygon is projected once into the network's XY frame so
+vehicles can be filtered before any projection or per-vehicle TraCI call
+"""
+
+import numpy as np
+
+
+class ClipRegion:
+    """Polygon in SUMO XY coordinates with a vectorized containment test"""
+
+    def __init__(self, polygon_xy):
+        polygon = np.asarray(polygon_xy, dtype=np.float64)
+        if polygon.ndim != 2 or polygon.shape[0] < 3:
+            raise ValueError("A clip region needs at least three vertices")
+
+        self.polygon = polygon
+        self.xmin, self.ymin = polygon.min(axis=0)
+        self.xmax, self.ymax = polygon.max(axis=0)
+
+        # Anchor for server-side context subscriptions
+        self.center = ((self.xmin + self.xmax) / 2.0, (self.ymin + self.ymax) / 2.0)
+        self.radius = float(np.max(np.hypot(polygon[:, 0] - self.center[0],
+                                            polygon[:, 1] - self.center[1])))
+
+        # Edge vectors for the ray-casting test
+        self._x0 = polygon[:, 0]
+        self._y0 = polygon[:, 1]
+        self._x1 = np.roll(self._x0, -1)
+        self._y1 = np.roll(self._y0, -1)
+
+    @classmethod
+    def from_geo_polygon(cls, projection, lonlat):
+        """Build a region from a (lon, lat) polygon"""
+        lonlat = np.asarray(lonlat, dtype=np.float64)
+        x, y = projection.to_xy(lonlat[:, 0], lonlat[:, 1])
+        return cls(np.column_stack([x, y]))
+
+    @classmethod
+    def from_geo_bounds(cls, projection, bounds, points_per_edge=16):
+        """Build a region from a lat/lon box.
+
+        Box edges are densified before projection because lines of constant
+        latitude are not straight in the transverse Mercator plane.
+        """
+        t = np.linspace(0.0, 1.0, points_per_edge, endpoint=False)
+        lon_min, lon_max = bounds['lon_min'], bounds['lon_max']
+        lat_min, lat_max = bounds['lat_min'], bounds['lat_max']
+
+        lons = np.concatenate([
+            lon_min + t * (lon_max - lon_min),
+            np.full_like(t, lon_max),
+            lon_max - t * (lon_max - lon_min),
+            np.full_like(t, lon_min)
+        ])
+        lats = np.concatenate([
+            np.full_like(t, lat_min),
+            lat_min + t * (lat_max - lat_min),
+            np.full_like(t, lat_max),
+            lat_max - t * (lat_max - lat_min)
+        ])
+        return cls.from_geo_polygon(projection, np.column_stack([lons, lats]))
+
+    def contains(self, x, y):
+        """Boolean mask of the points that fall inside the region.
+
+        Edges are half-open like the ray-casting test: a point on the left or
+        bottom edge of a box is inside, on the right or top edge outside, so
+        regions sharing an edge never both claim a point.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        mask = (x >= self.xmin) & (x <= self.xmax) & (y >= self.ymin) & (y <= self.ymax)
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return mask
+
+        px = x[candidates][:, None]
+        py = y[candidates][:, None]
+        crosses = (self._y0 > py) != (self._y1 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = self._x0 + (py - self._y0) * (self._x1 - self._x0) / (self._y1 - self._y0)
+        inside = np.count_nonzero(crosses & (px < x_cross), axis=1) % 2 == 1
+
+        mask[candidates] = inside
+        return mask
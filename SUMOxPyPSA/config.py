@@ -12,33 +12,110 @@ HOST = "0.0.0.0"  # Allow external connections
 PORT = 8080       # Web server port
 
 # Simulation Configuration
-SIMULATION_SPEED = 0.025  # Reduced for smoother movement
+# Target simulated seconds per wall-clock second (0 = as fast as possible);
+# adjustable at runtime from the control panel
+SIMULATION_RATIO = 4.0
 UPDATE_FREQUENCY = 2     # Update every 2 frames for smoother movement
 
+# SUMO control backend: "traci" (socket, works with sumo-gui) or
+# "libsumo" (in-process, fastest for headless and batch runs)
+SIMULATION_BACKEND = "traci"
+
+# Simulation sessions: each runs in its own worker process with its own SUMO
+# instance and power network. At most MAX_SESSIONS run at once; sessions
+# without clients for SESSION_IDLE_TIMEOUT seconds are stopped
+MAX_SESSIONS = 4
+SESSION_IDLE_TIMEOUT = 300
+
+# Compile the Manhattan signal plan into native SUMO programs instead of
+# writing every phase change from Python
+NATIVE_SIGNAL_PROGRAMS = False
+
+# Manhattan focus area (WGS84)
+MANHATTAN_BOUNDS = {
+    'lat_min': 40.700,
+    'lat_max': 40.800,
+    'lon_min': -74.020,
+    'lon_max': -73.930
+}
+
+# Viewport streaming: clients only receive vehicles/lights inside their map view.
+# Views are snapped to a VIEWPORT_GRID_CELLS x VIEWPORT_GRID_CELLS grid over the
+# bounds above, padded by VIEWPORT_MARGIN of their size; beyond MAX_VIEWPORT_ROOMS
+# distinct views new clients get the whole-city stream
+VIEWPORT_GRID_CELLS = 64
+VIEWPORT_MARGIN = 0.25
+MAX_VIEWPORT_ROOMS = 32
+
+# Level of detail: below this map zoom clients get vehicle density on a
+# LOD_GRID_CELLS x LOD_GRID_CELLS grid instead of individual vehicles
+LOD_ZOOM_THRESHOLD = 14
+LOD_GRID_CELLS = 48
+
 # City paths are relative to the config file location
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 NYC_PATH = os.path.join(BASE_DIR, "new_york")
 MIAMI_PATH = os.path.join(BASE_DIR, "miami")
 LA_PATH = os.path.join(BASE_DIR, "los_angeles")
 
-# City configurations
+# City configurations. "bounds" is the simulated focus area (WGS84); only cities
+# with "power_network" have a power grid model (the Manhattan network)
 CITY_CONFIGS = {
     "newyork": {
         "cfg_file": os.path.join(NYC_PATH, "osm.sumocfg"),
         "name": "New York, USA",
-        "working_dir": NYC_PATH
+        "working_dir": NYC_PATH,
+        "bounds": MANHATTAN_BOUNDS,
+        "power_network": True
     },
     "miami": {
         "cfg_file": os.path.join(MIAMI_PATH, "osm.sumocfg"),
         "name": "Miami, USA",
-        "working_dir": MIAMI_PATH
+        "working_dir": MIAMI_PATH,
+        "bounds": {'lat_min': 25.760668, 'lat_max': 25.819081, 'lon_min': -80.270066, 'lon_max': -80.179088},
+        "power_network": False
     },
     "losangeles": {
         "cfg_file": os.path.join(LA_PATH, "osm.sumocfg"),
         "name": "Los Angeles, USA",
-        "working_dir": LA_PATH
+        "working_dir": LA_PATH,
+        "bounds": {'lat_min': 34.022883, 'lat_max': 34.065184, 'lon_min': -118.276133, 'lon_max': -118.218884},
+        "power_network": False
     }
 }
 
+# Cities whose shared simulation starts with the web server (one worker
+# process each); other cities start when the first client selects them
+AUTOSTART_CITIES = []
+
+# Frame recording (python app.py --record): every session writes its frames to
+# RECORDINGS_DIR/<city>_<session>_<time>/, replayable with python app.py --replay <dir>
+RECORD_FRAMES = False
+RECORDINGS_DIR = os.path.join(BASE_DIR, "recordings")
+
+# Checkpoints (SUMO state + controller, EV and power state) saved from the
+# control panel go to CHECKPOINTS_DIR/<city>_<session>_<timestamp>/
+CHECKPOINTS_DIR = os.path.join(BASE_DIR, "checkpoints")
+
+# Pre-warmed start snapshots (python snapshot_library.py): each city run to
+# steady state for these times of day, saved to SNAPSHOTS_DIR/<city>/<name>/.
+# With USE_START_SNAPSHOTS, new sessions start from the snapshot closest to
+# the current time of day instead of an empty network
+SNAPSHOTS_DIR = os.path.join(BASE_DIR, "snapshots")
+SNAPSHOT_TIMES = {"morning_rush": "08:00", "midday": "12:30", "night": "23:00"}
+# Traffic demand by hour of day relative to the route files (SUMO --scale): a
+# snapshot warms up, and a session started from it runs, at its hour's factor
+DEMAND_SCALE_BY_HOUR = [
+    0.30, 0.25, 0.20, 0.20, 0.25, 0.40, 0.70, 1.00,   # 00-07
+    1.00, 0.90, 0.80, 0.80, 0.85, 0.85, 0.85, 0.90,   # 08-15
+    1.00, 1.00, 0.95, 0.80, 0.65, 0.55, 0.45, 0.35    # 16-23
+]
+USE_START_SNAPSHOTS = True
+
+# Per-stage timing of the simulation loop (python app.py --timing): rolling
+# p50/p95/p99 per stage on GET /metrics (Prometheus) and the 'diagnostics'
+# Socket.IO event. Step, frame and byte counters are always kept
+STAGE_TIMING = False
+
 # Default city
 DEFAULT_CITY = "newyork" 
\ No newline at end of file
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Delta encoding for the Socket.IO 'update' stream
+A keyframe carries the full vehicle, traffic light and EV station lists; the
+frames in between only carry added/removed/changed vehicles, lights whose colour
+flipped and stations whose occupancy moved. Every message has a sequence number
+and deltas name the frame they apply to, so clients can detect gaps and ask for
+a fresh keyframe.
+"""
+
+import itertools
+import time
+from collections import deque
+
+KEYFRAME = 'keyframe'
+DELTA = 'delta'
+
+# Distinguishes streams so a client switching rooms never applies a delta to another stream's state
+_stream_ids = itertools.count(1)
+
+# Vehicle fields compared between frames ('id' is the key)
+VEHICLE_FIELDS = ('x', 'y', 'angle', 'speed', 'type', 'is_ev', 'charging')
+
+
+def _station_occupancy(station):
+    return station['evs_charging'], tuple(station.get('vehicles_charging', ()))
+
+
+class DeltaEncoder:
+    """Turns full frame payloads into keyframes and deltas against the last message"""
+
+    def __init__(self, keyframe_interval=50, stream_id=0):
+        self.keyframe_interval = keyframe_interval
+        self.stream_id = stream_id
+        self.reset()
+
+    def reset(self):
+        """Forget the last frame; the next message is a keyframe"""
+        self.seq = 0
+        self.frames_since_keyframe = 0
+        self.force_keyframe = True
+        self.vehicles = {}       # id -> last sent vehicle dict
+        self.light_colors = {}   # id -> last sent colour
+        self.stations = {}       # id -> last sent occupancy
+
+    def request_keyframe(self):
+        """Make the next message a keyframe (new client, or a gap downstream)"""
+        self.force_keyframe = True
+
+    def encode(self, payload):
+        """Message for ``payload`` (a full frame dict with vehicles/traffic_lights/ev_stations)"""
+        self.seq += 1
+        keyframe = self.force_keyframe or self.frames_since_keyframe >= self.keyframe_interval
+
+        if keyframe:
+            message = self._keyframe(payload)
+        else:
+            message = self._delta(payload)
+
+        # Everything else (power, metrics, time, and vehicles on keyframes) is sent in full
+        for key, value in payload.items():
+            if key not in message:
+                message[key] = value
+        return message
+
+    def _keyframe(self, payload):
+        self.force_keyframe = False
+        self.frames_since_keyframe = 0
+        self.vehicles = {v['id']: v for v in payload.get('vehicles', ())}
+        self.light_colors = {light['id']: light['color'] for light in payload['traffic_lights']}
+        self.stations = {s['id']: _station_occupancy(s) for s in payload['ev_stations']}
+
+        return {
+            'type': KEYFRAME,
+            'stream': self.stream_id,
+            'seq': self.seq,
+            'traffic_lights': payload['traffic_lights'],
+            'ev_stations': payload['ev_stations']
+        }
+
+    def _delta(self, payload):
+        self.frames_since_keyframe += 1
+
+        message = {
+            'type': DELTA,
+            'stream': self.stream_id,
+            'seq': self.seq,
+            'base_seq': self.seq - 1
+        }
+
+        # Vehicles: new ones in full, moved ones with just the fields that changed
+        # (absent when the stream sends vehicles in another encoding)
+        if 'vehicles' in payload:
+            previous = self.vehicles
+            current = {}
+            added, changed = [], []
+            for vehicle in payload['vehicles']:
+                vid = vehicle['id']
+                current[vid] = vehicle
+                old = previous.get(vid)
+                if old is None:
+                    added.append(vehicle)
+                    continue
+                diff = {field: vehicle[field] for field in VEHICLE_FIELDS if vehicle[field] != old[field]}
+                if diff:
+                    diff['id'] = vid
+                    changed.append(diff)
+            removed = [vid for vid in previous if vid not in current]
+            self.vehicles = current
+            message['vehicles'] = {'added': added, 'changed': changed, 'removed': removed}
+
+        # Traffic lights: only colour flips
+        lights = []
+        colors = self.light_colors
+        for light in payload['traffic_lights']:
+            if colors.get(light['id']) != light['color']:
+                colors[light['id']] = light['color']
+                lights.append({'id': light['id'], 'color': light['color'], 'state': light['state']})
+
+        # EV stations: only occupancy changes
+        stations = []
+        for station in payload['ev_stations']:
+            occupancy = _station_occupancy(station)
+            if self.stations.get(station['id']) != occupancy:
+                self.stations[station['id']] = occupancy
+                stations.append(station)
+
+        message['traffic_lights'] = {'changed': lights}
+        message['ev_stations'] = {'changed': stations}
+        return message
+
+
+class StreamMeter:
+    """Rolling bytes/s of the delta stream next to the full-frame equivalent.
+
+    Keyframes are full frames, so their size is measured directly; each delta
+    is compared with the size of the most recent keyframe.
+    """
+
+    def __init__(self, window=10.0):
+        self.window = window
+        self.samples = deque()   # (time, sent bytes, full-frame bytes)
+        self.last_full_bytes = 0
+        self.keyframes = 0
+        self.deltas = 0
+
+    def record(self, message_type, nbytes):
+        now = time.time()
+        if message_type == KEYFRAME:
+            self.keyframes += 1
+            self.last_full_bytes = nbytes
+        else:
+            self.deltas += 1
+
+        self.samples.append((now, nbytes, self.last_full_bytes))
+        while self.samples and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def stats(self):
+        count = len(self.samples)
+        if count < 2:
+            span = self.window
+        else:
+            # n frames cover n intervals, not n - 1
+            span = max(self.samples[-1][0] - self.samples[0][0], 1e-3) * count / (count - 1)
+        sent = sum(sample[1] for sample in self.samples)
+        full = sum(sample[2] for sample in self.samples)
+
+        return {
+            'bytes_per_sec': round(sent / span),
+            'full_bytes_per_sec': round(full / span),
+            'savings_percent': round(100 * (1 - sent / full), 1) if full else 0,
+            'keyframes': self.keyframes,
+            'deltas': self.deltas
+        }
+
+
+class FrameStream:
+    """One update stream (a Socket.IO room): delta state, byte meter and sequence tracking"""
+
+    def __init__(self, room, keyframe_interval=50, vehicle_encoder=None, viewport=None, lod=False):
+        self.room = room
+        self.encoder = DeltaEncoder(keyframe_interval, next(_stream_ids))
+        self.vehicle_encoder = vehicle_encoder  # binary vehicles when set, JSON otherwise
+        self.viewport = viewport                # grid cell range, None for the whole city
+        self.lod = lod                          # density cells instead of vehicles
+        self.clients = 0
+        self.meter = StreamMeter()
+        self.last_sent_seq = 0
+
+    def reset(self):
+        """Start a fresh stream (new simulation run)"""
+        self.encoder.reset()
+        if self.vehicle_encoder is not None:
+            self.vehicle_encoder.reset()
+        self.meter = StreamMeter()
+        self.last_sent_seq = 0
+
+    def request_keyframe(self):
+        self.encoder.request_keyframe()
+
+    def mark_sent(self, seq):
+        """Record a broadcast; a skipped sequence number means a frame was dropped"""
+        if seq != self.last_sent_seq + 1:
+            self.encoder.request_keyframe()
+        self.last_sent_seq = seq
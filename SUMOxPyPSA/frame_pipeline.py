@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Pipelined frame processing for the simulation loop
+Stages run in their own threads connected by bounded queues with an explicit
+overflow policy: 'block' applies back-pressure (no frame is lost), 'drop_oldest'
+discards the stalest frame so slow consumers never hold up the producer
+"""
+
+import threading
+import time
+from collections import deque
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+
+
+class FrameQueue:
+    """Bounded FIFO with a 'block' or 'drop_oldest' overflow policy"""
+
+    def __init__(self, maxsize, policy=BLOCK):
+        if policy not in (BLOCK, DROP_OLDEST):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.dropped = 0
+        self.high_water = 0
+        self.unfinished = 0  # queued or being handled, as in queue.Queue
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item, stop_event=None):
+        """Enqueue ``item``; returns False if a blocking put was interrupted by ``stop_event``"""
+        with self._cond:
+            if self.policy == DROP_OLDEST:
+                while len(self._items) >= self.maxsize:
+                    self._items.popleft()
+                    self.dropped += 1
+                    self.unfinished -= 1
+            else:
+                while len(self._items) >= self.maxsize:
+                    if stop_event is not None and stop_event.is_set():
+                        return False
+                    self._cond.wait(0.1)
+
+            self._items.append(item)
+            self.unfinished += 1
+            self.high_water = max(self.high_water, len(self._items))
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=0.1):
+        """Dequeue the oldest item, or None after ``timeout`` seconds"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+                if not self._items:
+                    return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def task_done(self):
+        """A dequeued item is fully handled (its result, if any, queued downstream)"""
+        with self._cond:
+            self.unfinished -= 1
+            self._cond.notify_all()
+
+    def wait_done(self, timeout):
+        """Wait until every item put so far is handled; False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.unfinished <= 0, timeout)
+
+    def clear(self):
+        with self._cond:
+            self.unfinished -= len(self._items)
+            self._items.clear()
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class PipelineStage(threading.Thread):
+    """Worker thread applying ``handler`` to every frame of its inbox"""
+
+    def __init__(self, name, handler, inbox, stop_event):
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self.stage_name = name
+        self.handler = handler
+        self.inbox = inbox
+        self.outbox = None
+        self.stop_event = stop_event
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            frame = self.inbox.get()
+            if frame is None:
+                continue
+            try:
+                self.handle(frame)
+            finally:
+                # Only once the result is queued downstream, so drain() finds it there
+                self.inbox.task_done()
+
+    def handle(self, frame):
+        start = time.perf_counter()
+        try:
+            result = self.handler(frame)
+        except Exception as e:
+            self.errors += 1
+            print(f"❌ Pipeline stage '{self.stage_name}' failed: {e}")
+            return
+        finally:
+            self.busy_seconds += time.perf_counter() - start
+
+        self.processed += 1
+        if result is not None and self.outbox is not None:
+            self.outbox.put(result, self.stop_event)
+
+
+class FramePipeline:
+    """Chain of stages; the producer submits frames into the first queue"""
+
+    def __init__(self, stop_event):
+        self.stop_event = stop_event
+        self.stages = []
+
+    def add_stage(self, name, handler, maxsize=2, policy=BLOCK):
+        """Append a stage fed by a queue of ``maxsize`` frames with ``policy``"""
+        stage = PipelineStage(name, handler, FrameQueue(maxsize, policy), self.stop_event)
+        if self.stages:
+            self.stages[-1].outbox = stage.inbox
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def submit(self, frame):
+        """Hand a frame to the first stage (honours that queue's policy)"""
+        return self.stages[0].inbox.put(frame, self.stop_event)
+
+    def drain(self, timeout=2.0):
+        """Wait until every submitted frame has left the pipeline; False on timeout"""
+        deadline = time.perf_counter() + timeout
+        for stage in self.stages:
+            if not stage.inbox.wait_done(max(0.0, deadline - time.perf_counter())):
+                return False
+        return True
+
+    def join(self, timeout=2.0):
+        for stage in self.stages:
+            stage.join(timeout)
+        for stage in self.stages:
+            stage.inbox.clear()
+
+    def stats(self):
+        """Per-stage queue depth, drops and throughput"""
+        return {
+            stage.stage_name: {
+                'depth': len(stage.inbox),
+                'capacity': stage.inbox.maxsize,
+                'policy': stage.inbox.policy,
+                'dropped': stage.inbox.dropped,
+                'high_water': stage.inbox.high_water,
+                'processed': stage.processed,
+                'errors': stage.errors
+            }
+            for stage in self.stages
+        }
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Chunked columnar recording of simulation frames, and its replay
+A recording is a directory: ``recording.json`` (city, bounds, chunk index),
+``network.json`` and ``topology_v<N>.json`` (the power grid as sent to clients)
+and ``chunk_<N>.npz`` files of ``chunk_frames`` frames each. Inside a chunk every
+vehicle and light field is one array for all of its frames, with an offsets
+array marking where each frame's rows start; power flow arrays are stored the
+same way. Small nested parts (power summary, stations, metrics) are one JSON
+string per frame. Chunks are zlib-compressed (np.savez_compressed) as soon as
+they fill up and the index is rewritten after each one, so a crashed run keeps
+every finished chunk.
+
+FrameRecording reads a recording back as frames shaped like the live ones and
+finds frames by simulation time for seeking. Neither needs SUMO or the power
+network.
+"""
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+FORMAT_VERSION = 1
+CHUNK_FRAMES = 100  # ~10 s of a live session at 10 frames/s
+INDEX_FILE = "recording.json"
+
+# Row fields sharing one offsets array: group -> {array name: dtype}
+ROW_GROUPS = {
+    'vehicles': {'v_id': str, 'v_type': str, 'v_lon': np.float64, 'v_lat': np.float64,
+                 'v_angle': np.float64, 'v_speed': np.float64, 'v_slot': np.int32,
+                 'v_is_ev': bool, 'v_charging': bool},
+    'lights': {'l_id': str, 'l_x': np.float64, 'l_y': np.float64, 'l_state': str,
+               'l_color': str, 'l_pattern': str},
+    'line_flow': {'line_flow': np.float64},
+    'line_utilization': {'line_utilization': np.float64},
+    'generator_output': {'generator_output': np.float64},
+    'station_utilization': {'station_utilization': np.float64}
+}
+FLOW_FIELDS = ('line_flow', 'line_utilization', 'generator_output', 'station_utilization')
+METRIC_SECTIONS = ('vehicles', 'power', 'traffic_lights', 'grid')
+
+
+def _json_default(value):
+    """numpy scalars and arrays inside power results"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def frame_rows(frame, metrics=None):
+    """Per-frame arrays and JSON part of a frame, detached from the live objects"""
+    vehicles = frame['vehicles']
+    columns = frame['vehicle_columns']
+    lights = frame['traffic_lights']
+    flows = frame.get('power_flows')
+    metrics = metrics or {}
+
+    rows = {
+        'step': frame['step'],
+        'time': frame['simulation_time'],
+        'light_colors': tuple(frame['light_colors']),
+        'total_evs': frame['total_evs'],
+        'charging_evs': frame['charging_evs'],
+        'total_ev_power_mw': frame['total_ev_power_mw'],
+        'v_id': list(columns['ids']),
+        'v_type': list(columns['type']),
+        'v_lon': columns['lon'],
+        'v_lat': columns['lat'],
+        'v_angle': columns['angle'],
+        'v_speed': columns['speed'],
+        'v_slot': columns['slot'],
+        'v_is_ev': [vehicle['is_ev'] for vehicle in vehicles],
+        'v_charging': [vehicle['charging'] for vehicle in vehicles],
+        'l_id': [light['id'] for light in lights],
+        'l_x': [light['x'] for light in lights],
+        'l_y': [light['y'] for light in lights],
+        'l_state': [light['state'] for light in lights],
+        'l_color': [light['color'] for light in lights],
+        'l_pattern': [str(light['pattern']) for light in lights],
+        'json': json.dumps({
+            'power': frame.get('power') or {},
+            'ev_stations': frame['ev_stations'],
+            'metrics': {section: metrics[section] for section in METRIC_SECTIONS if section in metrics},
+            'flows': None if flows is None else {key: flows[key] for key in ('version', 'etag', 'metrics')}
+        }, separators=(',', ':'), default=_json_default)
+    }
+    for field in FLOW_FIELDS:
+        rows[field] = flows[field] if flows is not None else []
+    return rows
+
+
+def pack_chunk(frames):
+    """Column arrays of a list of frame_rows() dicts"""
+    arrays = {
+        'step': np.array([rows['step'] for rows in frames], dtype=np.int64),
+        'time': np.array([rows['time'] for rows in frames], dtype=np.float64),
+        'light_colors': np.array([rows['light_colors'] for rows in frames], dtype=np.int32).reshape(-1, 3),
+        'total_evs': np.array([rows['total_evs'] for rows in frames], dtype=np.int32),
+        'charging_evs': np.array([rows['charging_evs'] for rows in frames], dtype=np.int32),
+        'total_ev_power_mw': np.array([rows['total_ev_power_mw'] for rows in frames], dtype=np.float64),
+        'json': np.array([rows['json'] for rows in frames], dtype=str)
+    }
+    for group, fields in ROW_GROUPS.items():
+        counts = [len(rows[next(iter(fields))]) for rows in frames]
+        arrays[f"{group}_offsets"] = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        for name, dtype in fields.items():
+            parts = [np.asarray(rows[name], dtype=dtype) for rows in frames]
+            arrays[name] = np.concatenate(parts) if parts else np.array([], dtype=dtype)
+    return arrays
+
+
+class FrameRecorder:
+    """Buffers frames and writes them to a recording directory in compressed chunks"""
+
+    def __init__(self, path, meta, chunk_frames=CHUNK_FRAMES):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.meta = dict(meta, version=FORMAT_VERSION, chunk_frames=chunk_frames,
+                         created=datetime.now().isoformat(timespec='seconds'),
+                         frames=0, start_time=None, end_time=None, chunks=[])
+        self.buffer = []
+        self.topology_versions = set()
+        self.bytes_written = 0
+        self._write_index()
+
+    def _write_json(self, name, data):
+        # Written aside and renamed so readers never see half a file
+        target = os.path.join(self.path, name)
+        with open(target + ".tmp", 'w') as f:
+            json.dump(data, f, separators=(',', ':'), default=_json_default)
+        os.replace(target + ".tmp", target)
+
+    def _write_index(self):
+        self._write_json(INDEX_FILE, self.meta)
+
+    def set_network(self, network_data):
+        """Full power network (the 'power_network_update' payload) for replay clients"""
+        self._write_json("network.json", network_data)
+
+    def set_topology(self, topology):
+        """Store each grid topology version once; frames refer to it by version"""
+        if topology['version'] not in self.topology_versions:
+            self.topology_versions.add(topology['version'])
+            self._write_json(f"topology_v{topology['version']}.json", topology)
+
+    def record(self, frame, metrics=None):
+        self.buffer.append(frame_rows(frame, metrics))
+        if len(self.buffer) >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """Compress the buffered frames into the next chunk file"""
+        if not self.buffer:
+            return
+        chunks = self.meta['chunks']
+        name = f"chunk_{len(chunks):05d}.npz"
+        filename = os.path.join(self.path, name)
+        np.savez_compressed(filename, **pack_chunk(self.buffer))
+        self.bytes_written += os.path.getsize(filename)
+
+        chunks.append({'file': name, 'frames': len(self.buffer),
+                       'start': self.buffer[0]['time'], 'end': self.buffer[-1]['time']})
+        self.meta['frames'] += len(self.buffer)
+        if self.meta['start_time'] is None:
+            self.meta['start_time'] = self.buffer[0]['time']
+        self.meta['end_time'] = self.buffer[-1]['time']
+        self.buffer = []
+        self._write_index()
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'frames': self.meta['frames'] + len(self.buffer),
+            'chunks': len(self.meta['chunks']),
+            'bytes': self.bytes_written
+        }
+
+
+class FrameRecording:
+    """Read-only view of a recording; frames are rebuilt one chunk at a time"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported recording format {self.meta.get('version')} in {path}")
+        self.path = path
+        self.chunks = self.meta['chunks']
+        self.chunk_starts = np.cumsum([0] + [chunk['frames'] for chunk in self.chunks])
+        self.chunk_times = np.array([chunk['start'] for chunk in self.chunks], dtype=np.float64)
+        self._cached = (None, None)
+
+    def __len__(self):
+        return int(self.chunk_starts[-1])
+
+    @property
+    def start_time(self):
+        return self.meta['start_time'] or 0.0
+
+    @property
+    def end_time(self):
+        return self.meta['end_time'] or 0.0
+
+    def _json(self, name):
+        filename = os.path.join(self.path, name)
+        if not os.path.exists(filename):
+            return None
+        with open(filename) as f:
+            return json.load(f)
+
+    def network(self):
+        return self._json("network.json")
+
+    def topology(self, version):
+        return self._json(f"topology_v{version}.json")
+
+    def _chunk(self, chunk_index):
+        cached_index, arrays = self._cached
+        if cached_index != chunk_index:
+            with np.load(os.path.join(self.path, self.chunks[chunk_index]['file'])) as data:
+                arrays = {name: data[name] for name in data.files}
+            self._cached = (chunk_index, arrays)
+        return arrays
+
+    def index_at(self, sim_time):
+        """Index of the last frame at or before ``sim_time`` (first frame if earlier)"""
+        if not len(self):
+            return 0
+        chunk_index = max(0, int(np.searchsorted(self.chunk_times, sim_time, side='right')) - 1)
+        times = self._chunk(chunk_index)['time']
+        row = max(0, int(np.searchsorted(times, sim_time, side='right')) - 1)
+        return int(self.chunk_starts[chunk_index]) + row
+
+    def frame(self, index):
+        """Frame ``index`` with the keys of a live frame after the power stage"""
+        chunk_index = int(np.searchsorted(self.chunk_starts, index, side='right')) - 1
+        arrays = self._chunk(chunk_index)
+        i = index - int(self.chunk_starts[chunk_index])
+
+        def rows(group):
+            offsets = arrays[f"{group}_offsets"]
+            return slice(int(offsets[i]), int(offsets[i + 1]))
+
+        v = rows('vehicles')
+        columns = {
+            'ids': arrays['v_id'][v].tolist(),
+            'type': arrays['v_type'][v].tolist(),
+            'lon': arrays['v_lon'][v],
+            'lat': arrays['v_lat'][v],
+            'angle': arrays['v_angle'][v],
+            'speed': arrays['v_speed'][v],
+            'slot': arrays['v_slot'][v]
+        }
+        xs, ys = columns['lon'].tolist(), columns['lat'].tolist()
+        angles, speeds = columns['angle'].tolist(), columns['speed'].tolist()
+        is_ev, charging = arrays['v_is_ev'][v].tolist(), arrays['v_charging'][v].tolist()
+        vehicles = [{
+            'id': vid, 'x': xs[j], 'y': ys[j], 'angle': angles[j], 'speed': speeds[j],
+            'type': columns['type'][j], 'is_ev': is_ev[j], 'charging': charging[j]
+        } for j, vid in enumerate(columns['ids'])]
+
+        lights = rows('lights')
+        traffic_lights = [{
+            'id': light_id, 'x': x, 'y': y, 'state': state, 'color': color, 'pattern': pattern
+        } for light_id, x, y, state, color, pattern in zip(
+            arrays['l_id'][lights].tolist(), arrays['l_x'][lights].tolist(), arrays['l_y'][lights].tolist(),
+            arrays['l_state'][lights].tolist(), arrays['l_color'][lights].tolist(),
+            arrays['l_pattern'][lights].tolist())]
+
+        extra = json.loads(str(arrays['json'][i]))
+        power_flows = extra['flows']
+        if power_flows is not None:
+            for field in FLOW_FIELDS:
+                power_flows[field] = arrays[field][rows(field)].tolist()
+
+        return {
+            'step': int(arrays['step'][i]),
+            'simulation_time': float(arrays['time'][i]),
+            'vehicles': vehicles,
+            'vehicle_columns': columns,
+            'traffic_lights': traffic_lights,
+            'light_colors': tuple(arrays['light_colors'][i].tolist()),
+            'ev_stations': extra['ev_stations'],
+            'total_evs': int(arrays['total_evs'][i]),
+            'charging_evs': int(arrays['charging_evs'][i]),
+            'total_ev_power_mw': float(arrays['total_ev_power_mw'][i]),
+            'power': extra['power'],
+            'power_flows': power_flows,
+            'metrics': extra['metrics']
+        }
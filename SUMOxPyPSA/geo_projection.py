@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Vectorized SUMO-XY <-> WGS84 projection
+Reads the <location> element (netOffset/projParameter) of a SUMO network once and
+converts whole NumPy arrays of coordinates, replacing per-point traci.simulation.convertGeo
+"""
+
+import gzip
+import math
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+# Ellipsoid parameters (semi-major axis, inverse flattening)
+ELLIPSOIDS = {
+    'WGS84': (6378137.0, 298.257223563),
+    'GRS80': (6378137.0, 298.257222101)
+}
+
+UTM_SCALE_FACTOR = 0.9996
+UTM_FALSE_EASTING = 500000.0
+UTM_FALSE_NORTHING_SOUTH = 10000000.0
+
+
+class NetworkProjection:
+    """Transverse Mercator (UTM) projection matching SUMO's netOffset/projParameter"""
+
+    def __init__(self, net_offset, proj_parameter):
+        self.net_offset = (float(net_offset[0]), float(net_offset[1]))
+        self.proj_parameter = proj_parameter
+
+        params = self._parse_proj_parameter(proj_parameter)
+        if params.get('proj') != 'utm' or 'zone' not in params:
+            raise ValueError(f"Unsupported projection: {proj_parameter}")
+
+        ellps = params.get('ellps', params.get('datum', 'WGS84'))
+        if ellps not in ELLIPSOIDS:
+            raise ValueError(f"Unsupported ellipsoid: {ellps}")
+
+        self.zone = int(params['zone'])
+        self.south = 'south' in params
+        self.lon0 = math.radians(-183.0 + 6.0 * self.zone)
+        self.false_northing = UTM_FALSE_NORTHING_SOUTH if self.south else 0.0
+
+        a, inv_f = ELLIPSOIDS[ellps]
+        self._init_series(a, 1.0 / inv_f)
+
+    @classmethod
+    def from_net_file(cls, net_file):
+        """Read the <location> element from a (gzipped) SUMO network file"""
+        opener = gzip.open if net_file.endswith('.gz') else open
+        with opener(net_file, 'rb') as f:
+            for _, elem in ET.iterparse(f, events=('start',)):
+                if elem.tag == 'location':
+                    offset = [float(v) for v in elem.get('netOffset', '0,0').split(',')]
+                    return cls(offset, elem.get('projParameter', ''))
+        raise ValueError(f"No <location> element found in {net_file}")
+
+    @staticmethod
+    def _parse_proj_parameter(proj_parameter):
+        params = {}
+        for token in re.findall(r'\+(\S+)', proj_parameter):
+            key, _, value = token.partition('=')
+            params[key] = value
+        return params
+
+    def _init_series(self, a, f):
+        """Precompute the Krueger series coefficients (6th order in n)"""
+        n = f / (2.0 - f)
+        n2, n3, n4, n5, n6 = n**2, n**3, n**4, n**5, n**6
+
+        self.e = 2.0 * math.sqrt(n) / (1.0 + n)
+        self.k0A = UTM_SCALE_FACTOR * a / (1.0 + n) * (1.0 + n2 / 4.0 + n4 / 64.0 + n6 / 256.0)
+
+        self.alpha = np.array([
+            n / 2 - 2 * n2 / 3 + 5 * n3 / 16 + 41 * n4 / 180 - 127 * n5 / 288 + 7891 * n6 / 37800,
+            13 * n2 / 48 - 3 * n3 / 5 + 557 * n4 / 1440 + 281 * n5 / 630 - 1983433 * n6 / 1935360,
+            61 * n3 / 240 - 103 * n4 / 140 + 15061 * n5 / 26880 + 167603 * n6 / 181440,
+            49561 * n4 / 161280 - 179 * n5 / 168 + 6601661 * n6 / 7257600,
+            34729 * n5 / 80640 - 3418889 * n6 / 1995840,
+            212378941 * n6 / 319334400
+        ])
+        self.beta = np.array([
+            n / 2 - 2 * n2 / 3 + 37 * n3 / 96 - n4 / 360 - 81 * n5 / 512 + 96199 * n6 / 604800,
+            n2 / 48 + n3 / 15 - 437 * n4 / 1440 + 46 * n5 / 105 - 1118711 * n6 / 3870720,
+            17 * n3 / 480 - 37 * n4 / 840 - 209 * n5 / 4480 + 5569 * n6 / 90720,
+            4397 * n4 / 161280 - 11 * n5 / 504 - 830251 * n6 / 7257600,
+            4583 * n5 / 161280 - 108847 * n6 / 3991680,
+            20648693 * n6 / 638668800
+        ])
+        self._j2 = 2.0 * np.arange(1, 7).reshape(-1, 1)
+
+    def to_geo(self, x, y):
+        """Convert SUMO network coordinates to (lon, lat) arrays in degrees"""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        shape = np.broadcast(x, y).shape
+        x = x.reshape(-1)
+        y = y.reshape(-1)
+
+        xi = (y - self.net_offset[1] - self.false_northing) / self.k0A
+        eta = (x - self.net_offset[0] - UTM_FALSE_EASTING) / self.k0A
+
+        j2xi = self._j2 * xi
+        j2eta = self._j2 * eta
+        xi_p = xi - np.sum(self.beta[:, None] * np.sin(j2xi) * np.cosh(j2eta), axis=0)
+        eta_p = eta - np.sum(self.beta[:, None] * np.cos(j2xi) * np.sinh(j2eta), axis=0)
+
+        sinh_eta_p = np.sinh(eta_p)
+        cos_xi_p = np.cos(xi_p)
+        tau_p = np.sin(xi_p) / np.hypot(sinh_eta_p, cos_xi_p)
+
+        # Newton iteration for the conformal -> geodetic latitude tangent
+        e = self.e
+        e2m = 1.0 - e * e
+        tau = tau_p / e2m
+        for _ in range(5):
+            sqrt1tau2 = np.sqrt(1.0 + tau * tau)
+            sigma = np.sinh(e * np.arctanh(e * tau / sqrt1tau2))
+            tau_i = tau * np.sqrt(1.0 + sigma * sigma) - sigma * sqrt1tau2
+            tau = tau + (tau_p - tau_i) / np.sqrt(1.0 + tau_i * tau_i) * \
+                (1.0 + e2m * tau * tau) / (e2m * sqrt1tau2)
+
+        lat = np.degrees(np.arctan(tau))
+        lon = np.degrees(self.lon0 + np.arctan2(sinh_eta_p, cos_xi_p))
+        return lon.reshape(shape), lat.reshape(shape)
+
+    def to_xy(self, lon, lat):
+        """Convert (lon, lat) in degrees to SUMO network coordinates"""
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        shape = np.broadcast(lon, lat).shape
+        lam = np.radians(lon).reshape(-1) - self.lon0
+        phi = np.radians(lat).reshape(-1)
+
+        e = self.e
+        sin_phi = np.sin(phi)
+        t = np.sinh(np.arctanh(sin_phi) - e * np.arctanh(e * sin_phi))
+        xi_p = np.arctan2(t, np.cos(lam))
+        eta_p = np.arctanh(np.sin(lam) / np.sqrt(1.0 + t * t))
+
+        j2xi = self._j2 * xi_p
+        j2eta = self._j2 * eta_p
+        xi = xi_p + np.sum(self.alpha[:, None] * np.sin(j2xi) * np.cosh(j2eta), axis=0)
+        eta = eta_p + np.sum(self.alpha[:, None] * np.cos(j2xi) * np.sinh(j2eta), axis=0)
+
+        x = UTM_FALSE_EASTING + self.k0A * eta + self.net_offset[0]
+        y = self.false_northing + self.k0A * xi + self.net_offset[1]
+        return x.reshape(shape), y.reshape(shape)
@@ -0,0 +1,1194 @@
+#!/usr/bin/env python3
+"""
+Manhattan coupled simulation core
+Traffic light controller, EV charging network and power grid manager driven by
+one SUMO run. Shared by the Flask/Socket.IO app (app.py) and the headless batch
+runner (batch_runner.py); nothing here knows about the web layer.
+"""
+
+import copy
+import json
+import math
+import os
+import pickle
+import random
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+from simulation_backend import traci, backend_name
+import traci.constants as tc
+from config import CITY_CONFIGS, MANHATTAN_BOUNDS
+from sumo_config import CITY_CONFIGS as SUMO_CITY_CONFIGS
+
+from manhattan_power_network import ManhattanPowerNetworkRealistic
+from vehicle_harvester import VehicleHarvester
+from network_index import NetworkIndex
+from clip_region import ClipRegion
+from phase_scheduler import PhaseScheduler
+from stage_timing import StageTimer
+from vehicle_registry import VehicleRegistry
+
+NATIVE_PROGRAM_ID = 'manhattan'
+SIGNAL_BUS_KV = 4.16  # traffic signals are fed from the secondary network stations
+CHECKPOINT_STATE_FILE = "checkpoint.pkl"     # controller, EV, power and registry state
+CHECKPOINT_SUMO_FILE = "sumo_state.xml.gz"   # traci.simulation.saveState
+CHECKPOINT_INFO_FILE = "checkpoint.json"     # city, time and fleet size, for listings
+
+class ManhattanTrafficController:
+    """Professional Manhattan traffic light controller with realistic patterns"""
+    
+    def __init__(self, bounds=MANHATTAN_BOUNDS):
+        self.lights = {}
+        self.manhattan_bounds = dict(bounds)
+        self.cycle_time = 0
+        self.avenue_sync_offset = 0
+        self.traffic_light_states = {}  # Store states for power network
+        self.scheduler = PhaseScheduler()  # Lights keyed on their next phase-change tick
+        self.color_counts = {'green': 0, 'yellow': 0, 'red': 0}
+        self.state_tables = {}  # (pattern, num_signals) -> six phase strings, shared between lights
+        self.native_programs = False  # SUMO runs the signal plan itself
+        self.native_start = 0.0  # Simulation second the native programs started at
+        self.tick_seconds = 1.0  # Simulation seconds per controller tick in native programs
+        self.overridden = set()  # Lights held by an event (e.g. power outage)
+        
+    def initialize_manhattan_lights(self, projection, net_index):
+        """Initialize traffic lights with Manhattan-specific patterns"""
+        self.lights = {}
+        self.traffic_light_states = {}
+        self.cycle_time = 0
+        self.scheduler.clear()
+        self.color_counts = {'green': 0, 'yellow': 0, 'red': 0}
+        self.state_tables = {}
+        self.native_programs = False
+        self.native_start = 0.0
+        self.tick_seconds = 1.0
+        self.overridden = set()
+        
+        try:
+            # Positions and link counts come from the offline network index
+            located = np.flatnonzero(np.isfinite(net_index.tls_xy[:, 0]) & (net_index.tls_link_count > 0))
+            candidate_ids = net_index.tls_ids[located].tolist()
+            link_counts = net_index.tls_link_count[located].tolist()
+            lons, lats = projection.to_geo(net_index.tls_xy[located, 0], net_index.tls_xy[located, 1])
+            
+            manhattan_lights = []
+            num_signals_by_id = {}
+            for tl_id, num_signals, lon, lat in zip(candidate_ids, link_counts, lons.tolist(), lats.tolist()):
+                if (self.manhattan_bounds['lat_min'] <= lat <= self.manhattan_bounds['lat_max'] and
+                    self.manhattan_bounds['lon_min'] <= lon <= self.manhattan_bounds['lon_max']):
+                    manhattan_lights.append((tl_id, (lon, lat)))
+                    num_signals_by_id[tl_id] = num_signals
+            
+            print(f"🚦 Found {len(manhattan_lights)} traffic lights in Manhattan")
+            
+            for i, (tl_id, gps) in enumerate(manhattan_lights):
+                is_avenue = (i % 3 == 0)
+                pattern = 'AVENUE' if is_avenue else 'STREET'
+                
+                if is_avenue:
+                    offset = int((gps[1] - self.manhattan_bounds['lat_min']) * 1000) % 60
+                else:
+                    offset = random.randint(0, 30)
+                
+                # Link count is captured once; every phase string is precompiled
+                num_signals = num_signals_by_id[tl_id]
+                
+                self.lights[tl_id] = {
+                    'pattern': pattern,
+                    'num_signals': num_signals,
+                    'states': self._state_table(pattern, num_signals),
+                    'phase': 0,
+                    'offset': offset,
+                    'green_time': 35 if is_avenue else 25,
+                    'yellow_time': 3,
+                    'all_red_time': 2,
+                    'position': gps,
+                    'state_history': []
+                }
+                
+                # The offset counts as time already spent in the first green
+                light_data = self.lights[tl_id]
+                light_data['next_change'] = self.scheduler.schedule(
+                    tl_id, self._phase_duration(light_data, 0) - offset)
+                
+                initial_state = self._generate_manhattan_state(tl_id, 0)
+                traci.trafficlight.setRedYellowGreenState(tl_id, initial_state)
+                self._cache_state(tl_id, initial_state)
+                traci.trafficlight.subscribe(tl_id, [tc.TL_RED_YELLOW_GREEN_STATE])
+            
+            return True
+            
+        except Exception as e:
+            print(f"Error initializing Manhattan lights: {e}")
+            return False
+    
+    def _state_table(self, pattern, num_signals):
+        """Interned phase-state table for a pattern and link count"""
+        key = (pattern, num_signals)
+        table = self.state_tables.get(key)
+        if table is None:
+            table = build_phase_states(pattern, num_signals)
+            self.state_tables[key] = table
+        return table
+    
+    def _generate_manhattan_state(self, tl_id, phase):
+        """Look up the precompiled state for a light's phase"""
+        try:
+            return self.lights[tl_id]['states'][phase]
+        except (KeyError, IndexError):
+            return 'rrrr'
+    
+    def _phase_duration(self, light_data, phase):
+        """Duration of a phase in controller ticks"""
+        if phase in [0, 3]:
+            return light_data['green_time']
+        elif phase in [1, 4]:
+            return light_data['yellow_time']
+        return light_data['all_red_time']
+    
+    def _cache_state(self, tl_id, state):
+        """Store a light's state and keep the colour tallies in step"""
+        old_state = self.traffic_light_states.get(tl_id)
+        if old_state == state:
+            return
+        
+        if old_state is not None:
+            self.color_counts[state_color(old_state)] -= 1
+        self.color_counts[state_color(state)] += 1
+        self.traffic_light_states[tl_id] = state
+    
+    def update_cycle(self):
+        """Advance one controller tick, touching only lights whose phase expires"""
+        self.cycle_time += 1
+        
+        for tl_id in self.scheduler.advance():
+            light_data = self.lights.get(tl_id)
+            if light_data is None:
+                continue
+            
+            try:
+                light_data['phase'] = (light_data['phase'] + 1) % 6
+                light_data['next_change'] = self.scheduler.schedule(
+                    tl_id, self._phase_duration(light_data, light_data['phase']))
+                
+                if tl_id in self.overridden:
+                    continue
+                
+                new_state = self._generate_manhattan_state(tl_id, light_data['phase'])
+                traci.trafficlight.setRedYellowGreenState(tl_id, new_state)
+                self._cache_state(tl_id, new_state)
+                
+                light_data['state_history'].append(new_state)
+                if len(light_data['state_history']) > 10:
+                    light_data['state_history'].pop(0)
+                
+            except:
+                continue
+    
+    def install_native_programs(self, tick_seconds):
+        """Compile every light's pattern, durations and offset into a SUMO program.
+        
+        After this SUMO switches the signals natively; update_cycle only keeps
+        the metrics current and Python intervenes through override_lights().
+        """
+        installed = 0
+        
+        for tl_id, light_data in self.lights.items():
+            try:
+                phases = [
+                    traci.trafficlight.Phase(self._phase_duration(light_data, phase) * tick_seconds,
+                                             light_data['states'][phase])
+                    for phase in range(6)
+                ]
+                logic = traci.trafficlight.Logic(NATIVE_PROGRAM_ID, 0, 0, phases)
+                traci.trafficlight.setCompleteRedYellowGreenDefinition(tl_id, logic)
+                traci.trafficlight.setProgram(tl_id, NATIVE_PROGRAM_ID)
+                traci.trafficlight.setPhase(tl_id, 0)
+                
+                # Same start as the Python controller: offset already spent in phase 0
+                remaining = self._native_phase_remaining(light_data)
+                traci.trafficlight.setPhaseDuration(tl_id, remaining * tick_seconds)
+                installed += 1
+            except traci.TraCIException as e:
+                print(f"Could not install native program for {tl_id}: {e}")
+        
+        self.scheduler.clear()
+        self.native_start = traci.simulation.getTime()
+        self.tick_seconds = tick_seconds
+        self.native_programs = True
+        print(f"🚦 Installed {installed} native Manhattan signal programs")
+        return installed
+    
+    def _native_phase_remaining(self, light_data):
+        """Ticks left in phase 0 when a native program starts (at least one)"""
+        return max(1, self._phase_duration(light_data, 0) - light_data['offset'])
+    
+    def native_plan_position(self, light_data, sim_time):
+        """(phase, seconds left in it) a light's native program is at by ``sim_time``"""
+        durations = [self._phase_duration(light_data, phase) * self.tick_seconds for phase in range(6)]
+        # Seconds into the cycle, counting the part of phase 0 already spent at install
+        spent = durations[0] - self._native_phase_remaining(light_data) * self.tick_seconds
+        position = (sim_time - self.native_start + spent) % sum(durations)
+        for phase, duration in enumerate(durations):
+            if position < duration:
+                return phase, duration - position
+            position -= duration
+        return 0, durations[0]
+    
+    def override_lights(self, tl_ids, state_char='O'):
+        """Take lights out of their plan (e.g. 'O' = signals dark during a power outage)"""
+        for tl_id in tl_ids:
+            light_data = self.lights.get(tl_id)
+            if light_data is None:
+                continue
+            
+            state = state_char * light_data['num_signals']
+            traci.trafficlight.setRedYellowGreenState(tl_id, state)
+            self._cache_state(tl_id, state)
+            self.overridden.add(tl_id)
+    
+    def restore_lights(self, tl_ids):
+        """Hand overridden lights back to their plan"""
+        for tl_id in tl_ids:
+            if tl_id not in self.overridden:
+                continue
+            self.overridden.discard(tl_id)
+            light_data = self.lights[tl_id]
+            
+            if self.native_programs:
+                # Rejoin the program where it would be had it kept running, so the
+                # light stays in step with its neighbours' offsets
+                phase, remaining = self.native_plan_position(light_data, traci.simulation.getTime())
+                traci.trafficlight.setProgram(tl_id, NATIVE_PROGRAM_ID)
+                traci.trafficlight.setPhase(tl_id, phase)
+                traci.trafficlight.setPhaseDuration(tl_id, remaining)
+                state = light_data['states'][phase]
+            else:
+                state = self._generate_manhattan_state(tl_id, light_data['phase'])
+                traci.trafficlight.setRedYellowGreenState(tl_id, state)
+            self._cache_state(tl_id, state)
+    
+    def refresh_states(self):
+        """Pull the latest signal states from the per-TLS subscriptions (no round-trips).
+        
+        Call right after a simulation step, before any state is written in that step.
+        """
+        for tl_id, values in traci.trafficlight.getAllSubscriptionResults().items():
+            state = values.get(tc.TL_RED_YELLOW_GREEN_STATE)
+            if state is not None and tl_id in self.lights:
+                self._cache_state(tl_id, state)
+    
+    def count_colors(self):
+        """Green/yellow/red tallies, maintained incrementally as states change"""
+        return self.color_counts['green'], self.color_counts['yellow'], self.color_counts['red']
+    
+    def get_traffic_light_states(self):
+        """Get current traffic light states for power network"""
+        return self.traffic_light_states
+    
+    def get_state(self):
+        """Plan position of every light (for checkpoints); phase tables are rebuilt on restore"""
+        return {
+            'cycle_time': self.cycle_time,
+            'tick': self.scheduler.tick,
+            'lights': {tl_id: {key: copy.copy(value) for key, value in light_data.items() if key != 'states'}
+                       for tl_id, light_data in self.lights.items()},
+            'traffic_light_states': dict(self.traffic_light_states),
+            'overridden': set(self.overridden),
+            'native_programs': self.native_programs,
+            'native_start': self.native_start,
+            'tick_seconds': self.tick_seconds
+        }
+    
+    def set_state(self, state):
+        """Resume the plan from get_state() once SUMO has loaded the matching state file"""
+        self.cycle_time = state['cycle_time']
+        self.scheduler.clear()
+        self.scheduler.tick = state['tick']
+        self.native_programs = state['native_programs']
+        self.native_start = state.get('native_start', 0.0)
+        self.tick_seconds = state.get('tick_seconds', 1.0)
+        self.overridden = set(state['overridden'])
+        
+        self.lights = {}
+        for tl_id, saved in state['lights'].items():
+            light_data = dict(saved, state_history=list(saved['state_history']))
+            light_data['states'] = self._state_table(light_data['pattern'], light_data['num_signals'])
+            if not self.native_programs:
+                light_data['next_change'] = self.scheduler.schedule(tl_id, saved['next_change'] - state['tick'])
+            self.lights[tl_id] = light_data
+        
+        self.traffic_light_states = {}
+        self.color_counts = {'green': 0, 'yellow': 0, 'red': 0}
+        for tl_id, tl_state in state['traffic_light_states'].items():
+            # Native programs come back with SUMO's state; Python-driven states are re-applied
+            if not self.native_programs or tl_id in self.overridden:
+                traci.trafficlight.setRedYellowGreenState(tl_id, tl_state)
+            self._cache_state(tl_id, tl_state)
+            # A state load drops the subscriptions refresh_states() reads
+            traci.trafficlight.subscribe(tl_id, [tc.TL_RED_YELLOW_GREEN_STATE])
+
+def build_phase_states(pattern, num_signals):
+    """Precompute the six phase state strings of a Manhattan pattern"""
+    states = []
+    
+    for phase in range(6):
+        if pattern == 'AVENUE':
+            if phase == 0:
+                state = 'GG' + 'r' * (num_signals - 2) if num_signals > 2 else 'GG'
+            elif phase == 1:
+                state = 'yy' + 'r' * (num_signals - 2) if num_signals > 2 else 'yy'
+            elif phase == 2:
+                state = 'r' * num_signals
+            elif phase == 3:
+                state = 'r' * 2 + 'G' * (num_signals - 2) if num_signals > 2 else 'GG'
+            elif phase == 4:
+                state = 'r' * 2 + 'y' * (num_signals - 2) if num_signals > 2 else 'yy'
+            else:
+                state = 'r' * num_signals
+        else:
+            if phase == 0:
+                state = 'G' * (num_signals // 2) + 'r' * (num_signals - num_signals // 2)
+            elif phase == 1:
+                state = 'y' * (num_signals // 2) + 'r' * (num_signals - num_signals // 2)
+            elif phase == 2:
+                state = 'r' * num_signals
+            elif phase == 3:
+                state = 'r' * (num_signals // 2) + 'G' * (num_signals - num_signals // 2)
+            elif phase == 4:
+                state = 'r' * (num_signals // 2) + 'y' * (num_signals - num_signals // 2)
+            else:
+                state = 'r' * num_signals
+        
+        if len(state) != num_signals:
+            state = state[:num_signals] if len(state) > num_signals else state + 'r' * (num_signals - len(state))
+        
+        states.append(state)
+    
+    return tuple(states)
+
+def state_color(state):
+    """Dominant display colour of a signal state string"""
+    if 'G' in state or 'g' in state:
+        return 'green'
+    elif 'y' in state or 'Y' in state:
+        return 'yellow'
+    return 'red'
+
+class ManhattanEVNetwork:
+    """EV charging network with smart routing"""
+    
+    MANHATTAN_STATION_NAMES = [
+        'Times Square Supercharger', 'Penn Station Hub', 'Grand Central Station',
+        'Columbus Circle', 'Lincoln Center Station', 'Union Square Station',
+        'Washington Square', 'Financial District', 'UN Plaza Station',
+        'Chelsea Market', 'Hudson Yards', 'Central Park South'
+    ]
+    
+    def __init__(self, bounds=MANHATTAN_BOUNDS):
+        self.bounds = dict(bounds)
+        # Landmark names only make sense in Manhattan; elsewhere stations are numbered
+        self.station_names = self.MANHATTAN_STATION_NAMES if bounds == MANHATTAN_BOUNDS else []
+        self.stations = []
+        self.charging_sessions = {}
+        self.charging_vehicles = {}  # Track which vehicles are charging at which station
+        self.total_energy_delivered = 0
+        self.peak_demand = 0
+        self.ev_share_percent = 30
+        self.ev_charging_bias_percent = 30
+        self.ev_vehicles = {}  # Track EV vehicles
+        self.projection = None  # Network projection for station placement
+        self.net_index = None  # Offline network index (edges, lanes)
+        
+    def create_manhattan_grid_stations(self, traffic_light_positions):
+        """Create EV stations WITHIN the traffic light grid area"""
+        if traffic_light_positions and len(traffic_light_positions) > 0:
+            sorted_lights = sorted(traffic_light_positions, key=lambda x: (x[1], x[0]))
+            
+            num_stations = min(12, len(sorted_lights) // 5)
+            step = len(sorted_lights) // num_stations if num_stations > 0 else 1
+            
+            station_names = self.station_names
+            
+            self.stations = []
+            for i in range(0, min(len(sorted_lights), num_stations * step), step):
+                if len(self.stations) >= 12:
+                    break
+                    
+                light_pos = sorted_lights[i]
+                station_lat = light_pos[1] + random.uniform(-0.0005, 0.0005)
+                station_lon = light_pos[0] + random.uniform(-0.0005, 0.0005)
+                
+                b = self.bounds
+                station_lat = max(b['lat_min'], min(b['lat_max'], station_lat))
+                station_lon = max(b['lon_min'], min(b['lon_max'], station_lon))
+                
+                self.stations.append({
+                    'id': f'ev_station_{len(self.stations)}',
+                    'lat': station_lat,
+                    'lon': station_lon,
+                    'name': station_names[len(self.stations)] if len(self.stations) < len(station_names) else f'Station {len(self.stations)}',
+                    'power': random.choice([150, 250, 350]),
+                    'capacity': random.randint(6, 12),
+                    'street': f'Near intersection {i}',
+                    'vehicles_charging': []
+                })
+        else:
+            # Fallback stations
+            self.stations = []
+            b = self.bounds
+            lat_step = (b['lat_max'] - b['lat_min']) / 4
+            lon_step = (b['lon_max'] - b['lon_min']) / 3
+            
+            station_names = self.station_names
+            
+            idx = 0
+            for lat_i in range(4):
+                for lon_i in range(3):
+                    if idx >= 12:
+                        break
+                    
+                    station_lat = b['lat_min'] + (lat_i + 0.4) * lat_step
+                    station_lon = b['lon_min'] + (lon_i + 1 / 3) * lon_step
+                    
+                    self.stations.append({
+                        'id': f'ev_station_{idx}',
+                        'lat': station_lat,
+                        'lon': station_lon,
+                        'name': station_names[idx] if idx < len(station_names) else f'Station {idx}',
+                        'power': random.choice([150, 250, 350]),
+                        'capacity': random.randint(6, 12),
+                        'street': f'Grid location {lat_i}-{lon_i}',
+                        'vehicles_charging': []
+                    })
+                    idx += 1
+        
+        for station in self.stations:
+            self.charging_sessions[station['id']] = {}
+        
+        print(f"⚡ Created {len(self.stations)} EV stations within Manhattan traffic grid")
+        return self.stations
+    
+    def route_ev_to_station(self, vehicle_id, vehicle_pos):
+        """Route an EV to the nearest available charging station"""
+        try:
+            # Find nearest available station
+            best_station = None
+            min_distance = float('inf')
+            
+            for station in self.stations:
+                # Check if station has capacity
+                if len(station['vehicles_charging']) < station['capacity']:
+                    # Calculate distance
+                    distance = math.sqrt((vehicle_pos[0] - station['lon'])**2 + 
+                                       (vehicle_pos[1] - station['lat'])**2)
+                    
+                    if distance < min_distance:
+                        min_distance = distance
+                        best_station = station
+            
+            if best_station and min_distance < 0.01:  # Within reasonable distance
+                # Convert GPS to SUMO coordinates
+                sumo_x, sumo_y = self.projection.to_xy(best_station['lon'], best_station['lat'])
+                sumo_pos = (float(sumo_x), float(sumo_y))
+                
+                # Get nearest edge to station
+                if self.net_index is not None and len(self.net_index.edge_ids):
+                    # Set new route to charging station
+                    nearest_edge = traci.simulation.convertRoad(sumo_pos[0], sumo_pos[1])[0]
+                    if nearest_edge:
+                        current_edge = traci.vehicle.getRoadID(vehicle_id)
+                        if current_edge and current_edge != nearest_edge:
+                            try:
+                                # Calculate route to charging station
+                                route = traci.simulation.findRoute(current_edge, nearest_edge)
+                                if route and route.edges:
+                                    traci.vehicle.setRoute(vehicle_id, list(route.edges))
+                                    return best_station
+                            except:
+                                pass
+        except Exception as e:
+            pass
+        
+        return None
+    
+    def process_ev_charging(self, vehicles, sim_time):
+        """Process EV charging with smart routing; session energy follows ``sim_time`` (seconds)"""
+        self.charging_vehicles = {}  # Reset each update
+        total_evs = 0
+        charging_count = 0
+        
+        try:
+            share = int(self.ev_share_percent)
+        except Exception:
+            share = 30
+        share = max(0, min(100, share))
+        
+        try:
+            bias = int(self.ev_charging_bias_percent)
+        except Exception:
+            bias = 30
+        bias = max(0, min(100, bias))
+        
+        # Dynamic capture radius
+        base_radius = 0.002
+        max_extra = 0.006
+        capture_radius = base_radius + (bias / 100.0) * max_extra
+        
+        for vehicle in vehicles:
+            vid = vehicle['id']
+            # Stable across processes (unlike hash()), so a restored run keeps its EVs
+            is_ev = (zlib.crc32(vid.encode()) % 100) < share
+            vehicle['is_ev'] = bool(is_ev)
+            
+            if not is_ev:
+                continue
+            
+            total_evs += 1
+            
+            # Check if EV needs charging
+            if vid not in self.ev_vehicles:
+                self.ev_vehicles[vid] = {
+                    'battery': random.uniform(20, 80),  # Battery percentage
+                    'charging': False,
+                    'target_station': None
+                }
+            
+            ev_data = self.ev_vehicles[vid]
+            speed = float(vehicle.get('speed', 0) or 0)
+            
+            # Decide if vehicle needs to charge
+            needs_charging = ev_data['battery'] < 30 or (ev_data['battery'] < 50 and random.random() < bias/100)
+            
+            if needs_charging and not ev_data['charging']:
+                # Route to nearest station
+                station = self.route_ev_to_station(vid, (vehicle['x'], vehicle['y']))
+                if station:
+                    ev_data['target_station'] = station['id']
+            
+            # Check if at charging station
+            for station in self.stations:
+                lat_diff = abs(vehicle['y'] - station['lat'])
+                lon_diff = abs(vehicle['x'] - station['lon'])
+                
+                if lat_diff < capture_radius and lon_diff < capture_radius:
+                    if station['id'] not in self.charging_vehicles:
+                        self.charging_vehicles[station['id']] = []
+                    
+                    if len(self.charging_vehicles[station['id']]) < station['capacity']:
+                        if speed < 2.0:  # Vehicle is stopped/slow
+                            self.charging_vehicles[station['id']].append(vid)
+                            charging_count += 1
+                            ev_data['charging'] = True
+                            vehicle['charging'] = True
+                            
+                            # Update battery
+                            ev_data['battery'] = min(100, ev_data['battery'] + 0.5)
+                            
+                            if vid not in self.charging_sessions[station['id']]:
+                                self.charging_sessions[station['id']][vid] = {
+                                    'start': sim_time,
+                                    'energy_kwh': 0
+                                }
+                            
+                            session = self.charging_sessions[station['id']][vid]
+                            duration_hours = (sim_time - session['start']) / 3600
+                            session['energy_kwh'] = min(station['power'] * duration_hours, 100)
+                            
+                            # If fully charged, leave
+                            if ev_data['battery'] >= 95:
+                                ev_data['charging'] = False
+                                ev_data['target_station'] = None
+                                vehicle['charging'] = False
+                            
+                            break
+        
+        # Update station occupancy
+        for station in self.stations:
+            station['vehicles_charging'] = self.charging_vehicles.get(station['id'], [])
+        
+        return total_evs, charging_count, self.charging_vehicles
+    
+    def get_state(self):
+        """Stations, EV fleet and charging sessions (session starts in simulation seconds)"""
+        return {
+            'stations': copy.deepcopy(self.stations),
+            'charging_sessions': copy.deepcopy(self.charging_sessions),
+            'charging_vehicles': copy.deepcopy(self.charging_vehicles),
+            'ev_vehicles': copy.deepcopy(self.ev_vehicles),
+            'total_energy_delivered': self.total_energy_delivered,
+            'peak_demand': self.peak_demand,
+            'ev_share_percent': self.ev_share_percent,
+            'ev_charging_bias_percent': self.ev_charging_bias_percent
+        }
+    
+    def set_state(self, state):
+        self.stations = copy.deepcopy(state['stations'])
+        # Older checkpoints timed sessions on the wall clock; those sessions start over
+        self.charging_sessions = {
+            station_id: {vid: dict(session) for vid, session in sessions.items() if 'start' in session}
+            for station_id, sessions in state['charging_sessions'].items()
+        }
+        self.charging_vehicles = copy.deepcopy(state['charging_vehicles'])
+        self.ev_vehicles = copy.deepcopy(state['ev_vehicles'])
+        self.total_energy_delivered = state['total_energy_delivered']
+        self.peak_demand = state['peak_demand']
+        self.ev_share_percent = state['ev_share_percent']
+        self.ev_charging_bias_percent = state['ev_charging_bias_percent']
+    
+    def evict_vehicles(self, vehicle_ids):
+        """Drop EV and charging-session state of vehicles that left the simulation"""
+        for vid in vehicle_ids:
+            self.ev_vehicles.pop(vid, None)
+            for sessions in self.charging_sessions.values():
+                sessions.pop(vid, None)
+
+class PowerGridManager:
+    """Advanced power grid management for Manhattan with ultra-realistic network"""
+    
+    def __init__(self):
+        self.network = None
+        self.history = []
+        self.peak_demand = 0
+        self.total_energy = 0
+        self.outage_version = 0  # bumped whenever the set of buses without power changes
+        
+    def initialize_nyc_grid(self):
+        """Initialize NYC power grid with ultra-realistic network"""
+        print("⚡ Initializing Ultra-Realistic Manhattan Power Grid...")
+        self.network = ManhattanPowerNetworkRealistic()
+        self.network.build_network()
+        
+        print(f"✅ NYC Power Grid initialized with {len(self.network.buses)} buses")
+        print(f"   {len(self.network.lines)} lines, {len(self.network.transformers)} transformers")
+        print(f"   {len(self.network.generators)} generators")
+        return self.network
+    
+    def get_power_network_data(self):
+        """Get comprehensive power network data for visualization"""
+        if not self.network:
+            return None
+        
+        # Use the new comprehensive network data method
+        return self.network.get_network_data()
+    
+    def get_power_topology(self):
+        """Static grid topology (sent once per connection)"""
+        if not self.network:
+            return None
+        return self.network.get_topology()
+    
+    def get_power_flow_data(self):
+        """Per-frame line flows, generator outputs and station utilization"""
+        if not self.network:
+            return None
+        return self.network.get_flow_data()
+    
+    @property
+    def outage_buses(self):
+        return self.network.outage_buses if self.network else set()
+    
+    def set_outage(self, bus_ids):
+        """Cut power to ``bus_ids`` (replacing any earlier outage; empty restores all); returns the buses out"""
+        if not self.network:
+            return set()
+        # A new set rather than an update: the power stage may be reading the old one
+        self.network.outage_buses = {bus for bus in bus_ids if bus in self.network.buses}
+        self.outage_version += 1
+        return self.network.outage_buses
+    
+    def signal_bus(self, lat, lon):
+        """Network station feeding a traffic signal at ``lat``/``lon``"""
+        return self.network._find_nearest_bus(lat, lon, voltage=SIGNAL_BUS_KV)
+    
+    def get_state(self):
+        """Load history and peak plus the network's outputs and SOC (None without a grid)"""
+        return {
+            'history': list(self.history),
+            'peak_demand': self.peak_demand,
+            'total_energy': self.total_energy,
+            'network': self.network.get_state() if self.network else None
+        }
+    
+    def set_state(self, state):
+        self.history = list(state['history'])
+        self.peak_demand = state['peak_demand']
+        self.total_energy = state['total_energy']
+        if self.network and state['network'] is not None:
+            self.network.set_state(state['network'])
+            self.outage_version += 1
+    
+    def calculate_real_time_load(self, traffic_data, ev_data, traffic_light_states):
+        """Calculate real-time power load using realistic network"""
+        # Update traffic loads in the network
+        self.network.update_traffic_loads(
+            traffic_data['vehicle_count'],
+            traffic_light_states,
+            ev_data.get('charging_vehicles', {})
+        )
+        
+        # Run power flow simulation
+        self.network.simulate_power_flow()
+        
+        # Get status
+        status = self.network.get_status()
+        
+        # Update history
+        self.history.append(status['total_load_mw'])
+        if len(self.history) > 100:
+            self.history.pop(0)
+        
+        # Update peak demand
+        if status['total_load_mw'] > self.peak_demand:
+            self.peak_demand = status['total_load_mw']
+        
+        self.total_energy += status['total_load_mw'] / 3600
+        
+        # Return formatted data for frontend
+        return {
+            'total_load_mw': status['total_load_mw'],
+            'base_load_mw': status['total_load_mw'] - status['traffic_light_load_mw'] - status['street_light_load_mw'] - status['ev_charging_load_mw'],
+            'traffic_infrastructure_mw': status['traffic_light_load_mw'] + status['street_light_load_mw'],
+            'ev_charging_mw': status['ev_charging_load_mw'],
+            'traffic_systems_mw': status['traffic_light_load_mw'],
+            'line_utilization': status['line_utilization'],
+            'load_factor': (status['total_load_mw'] / self.peak_demand * 100) if self.peak_demand > 0 else 0,
+            'renewable_percent': status['renewable_percent'],
+            'peak_demand_mw': self.peak_demand,
+            'total_energy_mwh': self.total_energy,
+            'trend': self._calculate_trend(),
+            'violations': status.get('violations', {'thermal': 0, 'voltage': 0})
+        }
+    
+    def _calculate_trend(self):
+        """Calculate load trend"""
+        if len(self.history) < 10:
+            return 'stable'
+        
+        recent = sum(self.history[-5:]) / 5
+        older = sum(self.history[-10:-5]) / 5
+        
+        if recent > older * 1.05:
+            return 'increasing'
+        elif recent < older * 0.95:
+            return 'decreasing'
+        else:
+            return 'stable'
+
+def read_checkpoint_info(path):
+    """checkpoint.json of a checkpoint directory, or None if it is not one"""
+    try:
+        with open(os.path.join(path, CHECKPOINT_INFO_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def create_manhattan_sumocfg(city, filename="manhattan.sumocfg"):
+    """Create SUMO config optimized for Manhattan"""
+    city_dir = CITY_CONFIGS[city]["working_dir"]
+    city_sumo_config = SUMO_CITY_CONFIGS[city.upper()]
+    
+    temp_path = os.path.join(city_dir, filename)
+    
+    with open(temp_path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<configuration>\n')
+        
+        f.write('    <input>\n')
+        f.write(f'        <net-file value="{os.path.basename(city_sumo_config["net-file"])}"/>\n')
+        f.write(f'        <route-files value="{os.path.basename(city_sumo_config["route-files"])}"/>\n')
+        
+        poly_file = "osm.poly.xml.gz"
+        if os.path.exists(os.path.join(city_dir, poly_file)):
+            f.write(f'        <additional-files value="{poly_file}"/>\n')
+        
+        f.write('    </input>\n')
+        
+        f.write('    <processing>\n')
+        f.write('        <ignore-route-errors value="true"/>\n')
+        f.write('        <time-to-teleport value="300"/>\n')
+        f.write('        <max-depart-delay value="900"/>\n')
+        f.write('        <routing-algorithm value="dijkstra"/>\n')
+        f.write('        <device.rerouting.probability value="0.5"/>\n')
+        f.write('        <device.rerouting.period value="60"/>\n')
+        f.write('        <scale value="0.3"/>\n')
+        f.write('        <lateral-resolution value="0.8"/>\n')
+        f.write('    </processing>\n')
+        
+        f.write('    <output>\n')
+        # Full position precision in checkpoints (traci.simulation.saveState)
+        f.write('        <save-state.precision value="6"/>\n')
+        f.write('        <save-state.rng value="true"/>\n')
+        f.write('    </output>\n')
+        
+        f.write('    <time>\n')
+        f.write('        <begin value="0"/>\n')
+        f.write('        <step-length value="0.1"/>\n')
+        f.write('    </time>\n')
+        
+        f.write('</configuration>\n')
+    
+    return temp_path
+
+class ManhattanSimulation:
+    """Lights, EV fleet and power grid coupled to one SUMO run, without any web layer"""
+    
+    def __init__(self, city="newyork", start_time=None):
+        self.city = city
+        self.bounds = CITY_CONFIGS[city].get('bounds', MANHATTAN_BOUNDS)
+        # Only cities with a grid model get a power network (see config.CITY_CONFIGS)
+        self.has_power_network = CITY_CONFIGS[city].get('power_network', False)
+        # Datetime of simulation second 0; None keeps the power profiles on the wall clock
+        self.start_time = start_time
+        self.traffic_controller = ManhattanTrafficController(self.bounds)
+        self.ev_network = ManhattanEVNetwork(self.bounds)
+        self.power_grid = PowerGridManager()
+        self.vehicle_harvester = VehicleHarvester()
+        self.vehicle_registry = VehicleRegistry()
+        self.vehicle_registry.add_arrival_listener(self.ev_network.evict_vehicles)
+        self.projection = None
+        self.net_index = None
+        self.temp_cfg = None
+        self.initial_state = None       # get_state() right after start(), for reload()
+        self.initial_state_file = None  # SUMO's own state at that point
+        self.step_counter = 0
+        self.timer = StageTimer()  # per-stage timing, off unless enabled (see stage_timing.py)
+        self.light_buses = None       # SUMO light id -> grid bus feeding it, built on the first outage
+        self.dark_lights = set()      # lights overridden because their bus has no power
+        self.outage_version = None    # power_grid.outage_version the lights were last matched to
+    
+    def start(self, sumo_binary, native_programs=False, sumo_args=(), port=None, label="default"):
+        """Write the SUMO config, launch SUMO and set up lights, stations and the grid.
+        
+        ``port``/``label`` give concurrent runs (one per session process) their own
+        TraCI connection and their own generated config file.
+        """
+        city_dir = CITY_CONFIGS[self.city]["working_dir"]
+        cfg_name = "manhattan.sumocfg" if label == "default" else f"manhattan_{label}.sumocfg"
+        self.temp_cfg = create_manhattan_sumocfg(self.city, cfg_name)
+        self.net_index = NetworkIndex.load(
+            os.path.join(city_dir, SUMO_CITY_CONFIGS[self.city.upper()]["net-file"]))
+        self.projection = self.net_index.projection()
+        self.ev_network.projection = self.projection
+        self.ev_network.net_index = self.net_index
+        self.vehicle_harvester.region = ClipRegion.from_geo_bounds(self.projection, self.bounds)
+        
+        traci.start([sumo_binary, "-c", self.temp_cfg, *sumo_args], port=port, label=label)
+        print(f"✅ SUMO started successfully ({backend_name(traci)} backend)")
+        
+        self.vehicle_registry.start()
+        self.vehicle_harvester.start()
+        self.traffic_controller.initialize_manhattan_lights(self.projection, self.net_index)
+        if native_programs:
+            # One controller tick is 10 simulation steps
+            self.traffic_controller.install_native_programs(traci.simulation.getDeltaT() * 10)
+        
+        traffic_light_positions = [light_data['position'] for light_data in self.traffic_controller.lights.values()]
+        self.ev_network.create_manhattan_grid_stations(traffic_light_positions)
+        if self.has_power_network:
+            self.power_grid.initialize_nyc_grid()
+        self.step_counter = 0
+        self.light_buses = None
+        self.dark_lights = set()
+        self.initial_state_file = os.path.splitext(os.path.abspath(self.temp_cfg))[0] + "_t0.xml.gz"
+        traci.simulation.saveState(self.initial_state_file)
+        self.initial_state = self.get_state()
+    
+    def get_state(self):
+        """Controller, EV, power and registry state plus step counter and clock"""
+        return {
+            'step_counter': self.step_counter,
+            'start_time': self.start_time,
+            'traffic_controller': self.traffic_controller.get_state(),
+            'ev_network': self.ev_network.get_state(),
+            'power_grid': self.power_grid.get_state(),
+            'vehicle_slots': self.vehicle_registry.get_state()
+        }
+    
+    def set_state(self, state, restore_clock=True):
+        """Put get_state() back once SUMO holds the matching fleet and signal programs"""
+        # Vehicles were replaced wholesale: re-register the fleet with its saved slots
+        self.vehicle_registry.start()
+        self.vehicle_registry.set_state(state['vehicle_slots'])
+        self.vehicle_harvester.resync()
+        
+        self.traffic_controller.set_state(state['traffic_controller'])
+        self.ev_network.set_state(state['ev_network'])
+        self.power_grid.set_state(state['power_grid'])
+        # The restored controller holds the dark lights; the next step matches them to the restored outage
+        self.dark_lights = set(self.traffic_controller.overridden)
+        self.outage_version = None
+        self.step_counter = state['step_counter']
+        if restore_clock and state['start_time'] is not None:
+            self.start_time = state['start_time']
+    
+    def reload(self):
+        """Back to t=0 on the running SUMO: no new process, TLS queries or grid rebuild.
+        
+        SUMO loads the state it saved at the end of start() (traci.load would parse
+        the network again, which takes seconds for Manhattan), and the controller,
+        EV network and power network are reset in place from the matching copies.
+        The client's EV share and charging propensity are kept.
+        """
+        ev_network = self.ev_network
+        ev_share, charging_bias = ev_network.ev_share_percent, ev_network.ev_charging_bias_percent
+        
+        traci.simulation.loadState(self.initial_state_file)
+        self.set_state(self.initial_state)
+        ev_network.ev_share_percent, ev_network.ev_charging_bias_percent = ev_share, charging_bias
+    
+    def running(self):
+        """True while SUMO still has vehicles loaded or waiting to depart"""
+        return traci.simulation.getMinExpectedNumber() > 0
+    
+    def step(self):
+        """Advance SUMO one step and keep the registry, harvester and lights in sync"""
+        timer = self.timer
+        with timer.stage('simulation_step'):
+            traci.simulationStep()
+        with timer.stage('vehicle_registry'):
+            self.vehicle_registry.step()
+            self.vehicle_harvester.step(self.vehicle_registry.departed)
+        self.step_counter += 1
+        
+        # Fresh subscription results first, then our own state writes on top
+        if self.step_counter % 5 == 0:
+            with timer.stage('refresh_states'):
+                self.traffic_controller.refresh_states()
+        
+        if self.step_counter % 10 == 0:
+            with timer.stage('update_cycle'):
+                self.traffic_controller.update_cycle()
+        
+        if self.power_grid.outage_version != self.outage_version:
+            self.apply_power_outages()
+        
+        return self.step_counter
+    
+    def apply_power_outages(self):
+        """Dark signals where the grid has no power, back to their plan where it returned.
+        
+        Runs on the TraCI thread (from step()); PowerGridManager.set_outage only
+        records the outage, so it may be called from anywhere.
+        """
+        power_grid = self.power_grid
+        self.outage_version = power_grid.outage_version
+        if power_grid.network is None:
+            return
+        controller = self.traffic_controller
+        if self.light_buses is None:
+            self.light_buses = {tl_id: power_grid.signal_bus(light['position'][1], light['position'][0])
+                                for tl_id, light in controller.lights.items()}
+        
+        outage = power_grid.outage_buses
+        dark = {tl_id for tl_id, bus in self.light_buses.items() if bus in outage}
+        controller.override_lights(dark - self.dark_lights)
+        controller.restore_lights(self.dark_lights - dark)
+        if dark != self.dark_lights:
+            print(f"🔌 Power outage on {len(outage)} buses: {len(dark)} traffic lights dark")
+        self.dark_lights = dark
+    
+    def save_checkpoint(self, path, info=None):
+        """Write SUMO's state file and our controller, EV, power and registry state to ``path``.
+        
+        Call between steps from the thread that drives TraCI. ``info`` adds fields to
+        checkpoint.json. Returns the checkpoint's simulation time.
+        """
+        os.makedirs(path, exist_ok=True)
+        simulation_time = traci.simulation.getTime()
+        traci.simulation.saveState(os.path.join(os.path.abspath(path), CHECKPOINT_SUMO_FILE))
+        
+        state = dict(
+            self.get_state(),
+            city=self.city,
+            simulation_time=simulation_time,
+            created=datetime.now().isoformat(timespec='seconds'),
+            # EV batteries and charging decisions draw from these
+            random=random.getstate(),
+            numpy_random=np.random.get_state()
+        )
+        state_file = os.path.join(path, CHECKPOINT_STATE_FILE)
+        with open(state_file + ".tmp", 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(state_file + ".tmp", state_file)
+        
+        with open(os.path.join(path, CHECKPOINT_INFO_FILE), 'w') as f:
+            json.dump({
+                'city': self.city,
+                'simulation_time': simulation_time,
+                'start_time': self.start_time.isoformat() if self.start_time else None,
+                'created': state['created'],
+                'vehicles': len(self.vehicle_registry),
+                'native_programs': self.traffic_controller.native_programs,
+                **(info or {})
+            }, f)
+        return simulation_time
+    
+    def restore_checkpoint(self, path, restore_clock=True):
+        """Resume a started simulation from save_checkpoint(); returns the restored state.
+        
+        SUMO loads its state file (time, vehicles, routes, signal programs), then
+        lights, EV fleet, charging sessions and power outputs are put back as saved.
+        With ``restore_clock=False`` the power profiles keep this run's start_time
+        (a start snapshot under a wall-clock session).
+        """
+        with open(os.path.join(path, CHECKPOINT_STATE_FILE), 'rb') as f:
+            state = pickle.load(f)
+        if state['city'] != self.city:
+            raise ValueError(f"Checkpoint {path} is for {state['city']}, not {self.city}")
+        
+        traci.simulation.loadState(os.path.join(os.path.abspath(path), CHECKPOINT_SUMO_FILE))
+        self.set_state(state, restore_clock)
+        random.setstate(state['random'])
+        np.random.set_state(state['numpy_random'])
+        return state
+    
+    def close(self):
+        """Stop SUMO and remove the generated config"""
+        try:
+            traci.close()
+        except Exception:
+            pass
+        for filename in (self.temp_cfg, self.initial_state_file):
+            if filename and os.path.exists(filename):
+                os.unlink(filename)
+        self.temp_cfg = None
+        self.initial_state_file = None
+    
+    def harvest_vehicles(self):
+        """Column arrays of the vehicles in Manhattan, with registry slots and lon/lat"""
+        columns = self.vehicle_harvester.harvest()
+        columns['slot'] = self.vehicle_registry.slots_for(columns['ids'])
+        columns['lon'], columns['lat'] = self.projection.to_geo(columns['x'], columns['y'])
+        return columns
+    
+    def get_vehicles(self, columns=None):
+        """Get vehicles in Manhattan area only (clipped in SUMO coordinates by the harvester)"""
+        if columns is None:
+            columns = self.harvest_vehicles()
+        
+        ids = columns['ids']
+        types = columns['type']
+        xs = columns['lon'].tolist()
+        ys = columns['lat'].tolist()
+        angles = columns['angle'].tolist()
+        speeds = columns['speed'].tolist()
+        
+        manhattan_vehicles = []
+        for i in range(len(ids)):
+            manhattan_vehicles.append({
+                'id': ids[i],
+                'x': xs[i],
+                'y': ys[i],
+                'angle': angles[i],
+                'speed': speeds[i],
+                'type': types[i],
+                'is_ev': False,
+                'charging': False
+            })
+        
+        return manhattan_vehicles
+    
+    def get_traffic_lights(self):
+        """Get traffic lights in Manhattan with proper states (from cached subscription results)"""
+        lights = []
+        states = self.traffic_controller.traffic_light_states
+        
+        for tl_id, light_data in self.traffic_controller.lights.items():
+            state = states.get(tl_id)
+            if state is None:
+                continue
+            
+            lights.append({
+                'id': tl_id,
+                'x': light_data['position'][0],
+                'y': light_data['position'][1],
+                'state': state,
+                'color': state_color(state),
+                'pattern': light_data['pattern']
+            })
+        
+        return lights
+    
+    def prepare_ev_station_data(self, charging_vehicles):
+        """Prepare EV station data for frontend"""
+        station_data = []
+        total_power_mw = 0
+        ev_charging_data = {}  # For power network update
+        
+        for station in self.ev_network.stations:
+            vehicles_at_station = charging_vehicles.get(station['id'], [])
+            num_charging = len(vehicles_at_station)
+            utilization = (num_charging / station['capacity']) * 100 if station['capacity'] > 0 else 0
+            power_output_mw = (num_charging * station['power']) / 1000
+            
+            total_power_mw += power_output_mw
+            
+            # Prepare data for power network
+            ev_charging_data[station['id']] = vehicles_at_station
+            
+            station_data.append({
+                'id': station['id'],
+                'lat': station['lat'],
+                'lon': station['lon'],
+                'name': station['name'],
+                'street': station['street'],
+                'power': station['power'],
+                'capacity': station['capacity'],
+                'evs_charging': num_charging,
+                'utilization': utilization,
+                'power_output_mw': power_output_mw,
+                'status': 'busy' if utilization > 80 else 'available',
+                'vehicles_charging': vehicles_at_station
+            })
+        
+        return station_data, total_power_mw, ev_charging_data
+    
+    def capture_frame(self):
+        """Snapshot the vehicles, EV charging, lights and stations of the current step"""
+        timer = self.timer
+        with timer.stage('harvest_vehicles'):
+            vehicle_columns = self.harvest_vehicles()
+            vehicles = self.get_vehicles(vehicle_columns)
+        simulation_time = traci.simulation.getTime()
+        with timer.stage('process_ev_charging'):
+            total_evs, charging_evs, charging_vehicles = self.ev_network.process_ev_charging(
+                vehicles, simulation_time)
+        with timer.stage('get_traffic_lights'):
+            traffic_lights = self.get_traffic_lights()
+        with timer.stage('ev_station_data'):
+            ev_stations, total_ev_power_mw, ev_charging_data = self.prepare_ev_station_data(charging_vehicles)
+        
+        return {
+            'step': self.step_counter,
+            'simulation_time': simulation_time,
+            'vehicles': vehicles,
+            'vehicle_columns': vehicle_columns,
+            'traffic_lights': traffic_lights,
+            'light_colors': self.traffic_controller.count_colors(),
+            'ev_stations': ev_stations,
+            'total_evs': total_evs,
+            'charging_evs': charging_evs,
+            'total_ev_power_mw': total_ev_power_mw,
+            'ev_charging_data': ev_charging_data,
+            # Copied so later cycles cannot change it while the power flow runs
+            'traffic_light_states': dict(self.traffic_controller.get_traffic_light_states())
+        }
+    
+    def couple_power(self, frame):
+        """Feed a frame's traffic and EV charging into the power network and run the power flow"""
+        if self.power_grid.network is None:
+            return None
+        traffic_data = {
+            'lights_count': len(frame['traffic_lights']),
+            'vehicle_count': len(frame['vehicles'])
+        }
+        ev_data = {
+            'total_power_mw': frame['total_ev_power_mw'],
+            'charging_vehicles': frame['ev_charging_data']
+        }
+        if self.start_time is not None:
+            self.power_grid.network.clock_time = self.start_time + timedelta(seconds=frame['simulation_time'])
+        with self.timer.stage('calculate_real_time_load'):
+            return self.power_grid.calculate_real_time_load(traffic_data, ev_data, frame['traffic_light_states'])
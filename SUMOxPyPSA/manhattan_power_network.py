@@ -8,6 +8,7 @@ Manhattan bounds: 40.700-40.800°N, -74.020--73.930°W
 import pandas as pd
 import numpy as np
 import json
+import hashlib
 import os
 from datetime import datetime
 import math
@@ -52,12 +53,24 @@ class ManhattanPowerNetworkRealistic:
         self.line_flows = {}
         self.voltage_violations = []
         self.contingencies = []
+        self.outage_buses = set()  # Buses without power; their traffic signals draw nothing
+        
+        # Static topology sent to clients once (see get_topology)
+        self.topology_version = 0
+        self._topology = None
+        
+        # Time the load/solar profiles follow; None = wall clock (set by batch runs)
+        self.clock_time = None
         
         # Power quality metrics
         self.frequency = 60.0  # Hz
         self.power_factor = 0.95
         self.voltage_regulation = 0.05  # ±5%
         
+    def now(self):
+        """Current profile time: the simulated clock if set, else wall clock"""
+        return self.clock_time if self.clock_time is not None else datetime.now()
+    
     def build_network(self):
         """Build the ultra-realistic Manhattan power network"""
         print("🏗️ Building Ultra-Realistic Manhattan Power Network...")
@@ -75,6 +88,7 @@ class ManhattanPowerNetworkRealistic:
         self._add_ev_infrastructure()
         self._add_critical_loads()
         self._add_protection_systems()
+        self.invalidate_topology()
         
         print("✅ Ultra-realistic network built successfully!")
         print(f"📊 Total components: {len(self.buses)} buses, {len(self.lines)} lines, {len(self.transformers)} transformers")
@@ -1138,7 +1152,9 @@ class ManhattanPowerNetworkRealistic:
             adaptive_factor = 1.0 + yellow_ratio * 0.15  # More power during transitions
             
             for tl_load in self.traffic_light_loads.values():
-                if tl_load.get('adaptive_control'):
+                if tl_load['bus'] in self.outage_buses:
+                    tl_load['current_mw'] = 0.0
+                elif tl_load.get('adaptive_control'):
                     tl_load['current_mw'] = tl_load['base_mw'] * adaptive_factor * 1.2
                 else:
                     tl_load['current_mw'] = tl_load['base_mw'] * adaptive_factor
@@ -1153,7 +1169,7 @@ class ManhattanPowerNetworkRealistic:
                     station['current_mw'] = station['capacity_mw'] * utilization * 0.85  # 85% average charging rate
         
         # Update street lighting based on time and traffic
-        current_hour = datetime.now().hour
+        current_hour = self.now().hour
         if 6 <= current_hour <= 18:  # Daytime
             dimming_factor = 0.0
         elif 18 <= current_hour <= 20:  # Dusk
@@ -1181,7 +1197,7 @@ class ManhattanPowerNetworkRealistic:
         self.total_load = 0
         
         # Base loads with realistic profiles
-        current_time = datetime.now()
+        current_time = self.now()
         hour = current_time.hour
         minute = current_time.minute
         day_of_week = current_time.weekday()
@@ -1292,7 +1308,7 @@ class ManhattanPowerNetworkRealistic:
             if gen['type'] in ['solar_pv', 'wind']:
                 # Calculate renewable output
                 if gen['type'] == 'solar_pv':
-                    hour = datetime.now().hour
+                    hour = self.now().hour
                     if 6 <= hour <= 18:
                         solar_curve = math.sin((hour - 6) * math.pi / 12)
                         gen['current_output'] = gen['capacity_mw'] * solar_curve * 0.85
@@ -1405,78 +1421,179 @@ class ManhattanPowerNetworkRealistic:
                 gen['current_soc'] = max(0.0, min(1.0, gen['current_soc']))
     
     def get_network_data(self):
-        """Get complete network data for visualization"""
+        """Get complete network data for visualization: the topology with the current flows merged in"""
+        topology = self.get_topology()
+        flows = self.get_flow_data()
+        
+        # Copies, so callers never touch the cached topology
         return {
-            'buses': [
-                {
-                    'id': bus_id,
-                    'lat': bus_data['lat'],
-                    'lon': bus_data['lon'],
-                    'voltage': bus_data['voltage'],
-                    'type': bus_data['type']
-                }
-                for bus_id, bus_data in self.buses.items()
-            ],
+            'buses': [dict(bus) for bus in topology['buses']],
             'lines': [
-                {
-                    'id': line_id,
-                    'from': line_data['from'],
-                    'to': line_data['to'],
-                    'voltage': line_data.get('voltage', 138),
-                    'capacity': line_data['capacity_mw'],
-                    'flow': line_data.get('current_flow', 0),
-                    'utilization': (line_data.get('current_flow', 0) / line_data['capacity_mw'] * 100) if line_data['capacity_mw'] > 0 else 0,
-                    'from_pos': [
-                        self.buses[line_data['from']]['lon'],
-                        self.buses[line_data['from']]['lat']
-                    ] if line_data['from'] in self.buses else [0, 0],
-                    'to_pos': [
-                        self.buses[line_data['to']]['lon'],
-                        self.buses[line_data['to']]['lat']
-                    ] if line_data['to'] in self.buses else [0, 0]
-                }
-                for line_id, line_data in self.lines.items()
+                dict(line, flow=flow, utilization=utilization)
+                for line, flow, utilization in zip(topology['lines'], flows['line_flow'], flows['line_utilization'])
             ],
             'generators': [
-                {
-                    'id': gen_id,
-                    'lat': gen_data['lat'],
-                    'lon': gen_data['lon'],
-                    'capacity': gen_data['capacity_mw'],
-                    'output': gen_data.get('current_output', 0),
-                    'type': gen_data['type'],
-                    'utilization': (gen_data.get('current_output', 0) / gen_data['capacity_mw'] * 100) if gen_data['capacity_mw'] > 0 else 0
-                }
-                for gen_id, gen_data in self.generators.items()
-            ],
-            'transformers': [
-                {
-                    'id': xfmr_id,
-                    'rating': xfmr_data['rating_mva'],
-                    'voltage_ratio': xfmr_data['voltage_ratio'],
-                    'type': xfmr_data['type']
-                }
-                for xfmr_id, xfmr_data in self.transformers.items()
+                dict(gen, output=output,
+                     utilization=(output / gen['capacity'] * 100) if gen['capacity'] > 0 else 0)
+                for gen, output in zip(topology['generators'], flows['generator_output'])
             ],
+            'transformers': [dict(xfmr) for xfmr in topology['transformers']],
             'ev_stations': [
-                {
-                    'id': station_id,
-                    'lat': station_data['lat'],
-                    'lon': station_data['lon'],
-                    'capacity': station_data['capacity_mw'],
-                    'utilization': station_data.get('utilization', 0) * 100,
-                    'type': station_data['type']
-                }
-                for station_id, station_data in self.ev_charging_loads.items()
+                dict(station, utilization=utilization)
+                for station, utilization in zip(topology['ev_stations'], flows['station_utilization'])
             ],
-            'metrics': {
-                'total_generation': round(self.total_generation, 2),
-                'total_load': round(self.total_load, 2),
-                'losses': round(self.total_generation - self.total_load, 2),
-                'renewable_generation': round(sum(g['current_output'] for g in self.generators.values() if g['type'] in ['solar_pv', 'wind']), 2),
-                'battery_output': round(sum(g['current_output'] for g in self.generators.values() if g['type'] == 'battery'), 2),
-                'num_violations': len(self.thermal_violations) + len(self.voltage_violations)
+            'metrics': flows['metrics']
+        }
+    
+    # Per-component values that change while simulating (or were drawn at random when built)
+    STATE_FIELDS = {
+        'generators': ('current_output', 'current_soc'),
+        'loads': ('current_mw',),
+        'lines': ('current_flow',),
+        'traffic_light_loads': ('current_mw',),
+        'street_light_loads': ('current_mw',),
+        'ev_charging_loads': ('current_mw', 'utilization', 'chargers', 'capacity_mw')
+    }
+    
+    def get_state(self):
+        """Generator outputs, battery SOC, loads and flows of the last power flow (for checkpoints)"""
+        components = {}
+        for group, fields in self.STATE_FIELDS.items():
+            components[group] = {
+                name: {field: item[field] for field in fields if field in item}
+                for name, item in getattr(self, group).items()
+            }
+        return {
+            'components': components,
+            'total_generation': self.total_generation,
+            'total_load': self.total_load,
+            'voltage_violations': list(self.voltage_violations),
+            'thermal_violations': list(getattr(self, 'thermal_violations', [])),
+            'clock_time': self.clock_time,
+            'outage_buses': sorted(self.outage_buses)
+        }
+    
+    def set_state(self, state):
+        """Restore get_state() onto a freshly built network"""
+        for group, items in state['components'].items():
+            current = getattr(self, group)
+            for name, values in items.items():
+                if name in current:
+                    current[name].update(values)
+        self.total_generation = state['total_generation']
+        self.total_load = state['total_load']
+        self.voltage_violations = list(state['voltage_violations'])
+        self.thermal_violations = list(state['thermal_violations'])
+        self.clock_time = state['clock_time']
+        self.outage_buses = set(state.get('outage_buses', ()))
+        # Charger counts are part of the topology clients cache
+        self.invalidate_topology()
+    
+    def _network_metrics(self):
+        return {
+            'total_generation': round(self.total_generation, 2),
+            'total_load': round(self.total_load, 2),
+            'losses': round(self.total_generation - self.total_load, 2),
+            'renewable_generation': round(sum(g['current_output'] for g in self.generators.values() if g['type'] in ['solar_pv', 'wind']), 2),
+            'battery_output': round(sum(g['current_output'] for g in self.generators.values() if g['type'] == 'battery'), 2),
+            'num_violations': len(self.thermal_violations) + len(self.voltage_violations)
+        }
+    
+    def invalidate_topology(self):
+        """Call after adding or removing components so clients fetch a new topology"""
+        self._topology = None
+    
+    def get_topology(self):
+        """Static network (buses, line endpoints, ratings, positions) with a version and ETag.
+        
+        The order of every list is the index order of get_flow_data's arrays.
+        """
+        if self._topology is None:
+            topology = {
+                'buses': [
+                    {
+                        'id': bus_id,
+                        'lat': bus_data['lat'],
+                        'lon': bus_data['lon'],
+                        'voltage': bus_data['voltage'],
+                        'type': bus_data['type']
+                    }
+                    for bus_id, bus_data in self.buses.items()
+                ],
+                'lines': [
+                    {
+                        'id': line_id,
+                        'from': line_data['from'],
+                        'to': line_data['to'],
+                        'voltage': line_data.get('voltage', 138),
+                        'capacity': line_data['capacity_mw'],
+                        'from_pos': [
+                            self.buses[line_data['from']]['lon'],
+                            self.buses[line_data['from']]['lat']
+                        ] if line_data['from'] in self.buses else [0, 0],
+                        'to_pos': [
+                            self.buses[line_data['to']]['lon'],
+                            self.buses[line_data['to']]['lat']
+                        ] if line_data['to'] in self.buses else [0, 0]
+                    }
+                    for line_id, line_data in self.lines.items()
+                ],
+                'generators': [
+                    {
+                        'id': gen_id,
+                        'lat': gen_data['lat'],
+                        'lon': gen_data['lon'],
+                        'capacity': gen_data['capacity_mw'],
+                        'type': gen_data['type']
+                    }
+                    for gen_id, gen_data in self.generators.items()
+                ],
+                'transformers': [
+                    {
+                        'id': xfmr_id,
+                        'rating': xfmr_data['rating_mva'],
+                        'voltage_ratio': xfmr_data['voltage_ratio'],
+                        'type': xfmr_data['type']
+                    }
+                    for xfmr_id, xfmr_data in self.transformers.items()
+                ],
+                'ev_stations': [
+                    {
+                        'id': station_id,
+                        'lat': station_data['lat'],
+                        'lon': station_data['lon'],
+                        'capacity': station_data['capacity_mw'],
+                        'type': station_data['type']
+                    }
+                    for station_id, station_data in self.ev_charging_loads.items()
+                ]
             }
+            
+            body = json.dumps(topology, sort_keys=True, separators=(',', ':'), default=float)
+            self.topology_version += 1
+            topology['version'] = self.topology_version
+            topology['etag'] = hashlib.sha1(body.encode()).hexdigest()[:16]
+            self._topology = topology
+        
+        return self._topology
+    
+    def get_flow_data(self):
+        """Per-frame values as flat arrays indexed like get_topology's lists"""
+        topology = self.get_topology()
+        
+        return {
+            'version': topology['version'],
+            'etag': topology['etag'],
+            'line_flow': [round(line.get('current_flow', 0), 2) for line in self.lines.values()],
+            'line_utilization': [
+                round(line.get('current_flow', 0) / line['capacity_mw'] * 100, 1) if line['capacity_mw'] > 0 else 0
+                for line in self.lines.values()
+            ],
+            'generator_output': [round(gen.get('current_output', 0), 2) for gen in self.generators.values()],
+            'station_utilization': [
+                round(station.get('utilization', 0) * 100, 1) for station in self.ev_charging_loads.values()
+            ],
+            'metrics': self._network_metrics()
         }
     
     def get_status(self):
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Offline network index for SUMO networks
+Stream-parses a city's osm.net.xml.gz once into compact NumPy arrays (edges, lane
+shapes, junction and traffic light positions, controlled-link counts, bounding
+boxes) cached as an .npz keyed by the file's content hash, so modules can load
+the static network in milliseconds instead of querying SUMO over TraCI
+"""
+
+import gzip
+import hashlib
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from geo_projection import NetworkProjection
+
+INDEX_VERSION = 1
+INDEX_PREFIX = "net_index_"
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-1 of a file's content"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _parse_shape(shape):
+    return [tuple(float(v) for v in point.split(',')[:2]) for point in shape.split()]
+
+
+def parse_network(net_file):
+    """Stream-parse a SUMO network into a dict of NumPy arrays"""
+    opener = gzip.open if net_file.endswith('.gz') else open
+
+    location = {}
+    edge_ids, edge_from, edge_to = [], [], []
+    lane_ids, lane_edge, lane_length, lane_speed = [], [], [], []
+    shape_offsets, shape_xy = [0], []
+    junction_ids, junction_xy, junction_type = [], [], []
+    tls_ids, tls_state_len = [], {}
+    tls_links = {}  # tl id -> {link index: incoming lane}
+
+    with opener(net_file, 'rb') as f:
+        for _, elem in ET.iterparse(f, events=('end',)):
+            tag = elem.tag
+
+            if tag == 'edge':
+                if elem.get('function') != 'internal':
+                    edge_index = len(edge_ids)
+                    edge_ids.append(elem.get('id'))
+                    edge_from.append(elem.get('from', ''))
+                    edge_to.append(elem.get('to', ''))
+
+                    for lane in elem.iter('lane'):
+                        lane_ids.append(lane.get('id'))
+                        lane_edge.append(edge_index)
+                        lane_length.append(float(lane.get('length', 0)))
+                        lane_speed.append(float(lane.get('speed', 0)))
+                        points = _parse_shape(lane.get('shape', ''))
+                        shape_xy.extend(points)
+                        shape_offsets.append(len(shape_xy))
+                elem.clear()
+
+            elif tag == 'junction':
+                if elem.get('type') != 'internal':
+                    junction_ids.append(elem.get('id'))
+                    junction_xy.append((float(elem.get('x', 0)), float(elem.get('y', 0))))
+                    junction_type.append(elem.get('type', ''))
+                elem.clear()
+
+            elif tag == 'tlLogic':
+                tl_id = elem.get('id')
+                if tl_id not in tls_state_len:
+                    tls_ids.append(tl_id)
+                    phase = elem.find('phase')
+                    tls_state_len[tl_id] = len(phase.get('state', '')) if phase is not None else 0
+                elem.clear()
+
+            elif tag == 'connection':
+                tl_id = elem.get('tl')
+                if tl_id is not None and elem.get('linkIndex') is not None:
+                    lane_id = f"{elem.get('from')}_{elem.get('fromLane')}"
+                    tls_links.setdefault(tl_id, {})[int(elem.get('linkIndex'))] = lane_id
+                elem.clear()
+
+            elif tag == 'location':
+                location = dict(elem.attrib)
+
+    lane_lookup = {lane_id: i for i, lane_id in enumerate(lane_ids)}
+    shape_xy = np.asarray(shape_xy, dtype=np.float64).reshape(-1, 2)
+    shape_offsets = np.asarray(shape_offsets, dtype=np.int64)
+
+    # Lane bounding boxes (xmin, ymin, xmax, ymax)
+    lane_bbox = np.zeros((len(lane_ids), 4), dtype=np.float32)
+    if len(lane_ids):
+        starts = shape_offsets[:-1]
+        nonempty = shape_offsets[1:] > starts
+        if nonempty.any():
+            idx = np.flatnonzero(nonempty)
+            lane_bbox[idx, 0:2] = np.minimum.reduceat(shape_xy, starts[idx], axis=0)
+            lane_bbox[idx, 2:4] = np.maximum.reduceat(shape_xy, starts[idx], axis=0)
+
+    # Controlled links per light, and the position SUMO's controlled-lane lookup gives:
+    # the end of the incoming lane of link 0
+    tls_link_count = np.zeros(len(tls_ids), dtype=np.int32)
+    tls_xy = np.full((len(tls_ids), 2), np.nan, dtype=np.float64)
+    for i, tl_id in enumerate(tls_ids):
+        links = tls_links.get(tl_id, {})
+        tls_link_count[i] = max(links) + 1 if links else tls_state_len.get(tl_id, 0)
+        if links:
+            lane = lane_lookup.get(links[min(links)])
+            if lane is not None and shape_offsets[lane + 1] > shape_offsets[lane]:
+                tls_xy[i] = shape_xy[shape_offsets[lane + 1] - 1]
+
+    conv_boundary = [float(v) for v in location.get('convBoundary', '0,0,0,0').split(',')]
+    net_offset = [float(v) for v in location.get('netOffset', '0,0').split(',')]
+
+    return {
+        'version': np.array(INDEX_VERSION, dtype=np.int32),
+        'net_offset': np.asarray(net_offset, dtype=np.float64),
+        'conv_boundary': np.asarray(conv_boundary, dtype=np.float64),
+        'proj_parameter': np.array(location.get('projParameter', '')),
+        'edge_ids': np.asarray(edge_ids, dtype=str),
+        'edge_from': np.asarray(edge_from, dtype=str),
+        'edge_to': np.asarray(edge_to, dtype=str),
+        'lane_ids': np.asarray(lane_ids, dtype=str),
+        'lane_edge': np.asarray(lane_edge, dtype=np.int32),
+        'lane_length': np.asarray(lane_length, dtype=np.float32),
+        'lane_speed': np.asarray(lane_speed, dtype=np.float32),
+        'lane_bbox': lane_bbox,
+        'lane_shape_offsets': shape_offsets,
+        'lane_shape_xy': shape_xy.astype(np.float32),
+        'junction_ids': np.asarray(junction_ids, dtype=str),
+        'junction_xy': np.asarray(junction_xy, dtype=np.float64).reshape(-1, 2),
+        'junction_type': np.asarray(junction_type, dtype=str),
+        'tls_ids': np.asarray(tls_ids, dtype=str),
+        'tls_link_count': tls_link_count,
+        'tls_xy': tls_xy
+    }
+
+
+class NetworkIndex:
+    """Read-only view over a cached network index"""
+
+    def __init__(self, arrays, source_hash=None):
+        self.source_hash = source_hash
+        for key, value in arrays.items():
+            setattr(self, key, value)
+        self._lane_lookup = None
+
+    @classmethod
+    def load(cls, net_file, cache_dir=None, rebuild=False):
+        """Load the index for ``net_file``, building and caching it if needed"""
+        digest = file_hash(net_file)
+        cache_dir = cache_dir or os.path.dirname(os.path.abspath(net_file))
+        cache_path = os.path.join(cache_dir, f"{INDEX_PREFIX}{digest[:16]}.npz")
+
+        if not rebuild and os.path.exists(cache_path):
+            with np.load(cache_path, allow_pickle=False) as data:
+                arrays = {key: data[key] for key in data.files}
+            if int(arrays.get('version', -1)) == INDEX_VERSION:
+                return cls(arrays, digest)
+
+        arrays = parse_network(net_file)
+        np.savez_compressed(cache_path, **arrays)
+        return cls(arrays, digest)
+
+    def projection(self):
+        """NetworkProjection for this network's <location>"""
+        return NetworkProjection(self.net_offset, str(self.proj_parameter))
+
+    def lane_index(self, lane_id):
+        """Row of a lane id (None when unknown)"""
+        if self._lane_lookup is None:
+            self._lane_lookup = {lane_id: i for i, lane_id in enumerate(self.lane_ids.tolist())}
+        return self._lane_lookup.get(lane_id)
+
+    def lane_shape(self, row):
+        """Shape of lane ``row`` as an (n, 2) array"""
+        return self.lane_shape_xy[self.lane_shape_offsets[row]:self.lane_shape_offsets[row + 1]]
+
+    @property
+    def bounds(self):
+        """Network boundary (xmin, ymin, xmax, ymax) in SUMO coordinates"""
+        return tuple(self.conv_boundary.tolist())
+
+
+def build_city_indexes(cities=None):
+    """Build (or refresh) the index of each city's network"""
+    from config import CITY_CONFIGS
+    from sumo_config import CITY_CONFIGS as SUMO_CITY_CONFIGS
+
+    for city in cities or CITY_CONFIGS:
+        net_file = os.path.join(CITY_CONFIGS[city]["working_dir"], SUMO_CITY_CONFIGS[city.upper()]["net-file"])
+        if not os.path.exists(net_file):
+            print(f"⚠️  {city}: {net_file} not found, skipping")
+            continue
+
+        start = time.perf_counter()
+        index = NetworkIndex.load(net_file, rebuild=True)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        NetworkIndex.load(net_file)
+        load_time = time.perf_counter() - start
+
+        print(f"✅ {city}: {len(index.edge_ids)} edges, {len(index.lane_ids)} lanes, "
+              f"{len(index.junction_ids)} junctions, {len(index.tls_ids)} traffic lights")
+        print(f"   Built in {build_time:.2f}s, loads in {load_time * 1000:.1f} ms "
+              f"(hash {index.source_hash[:16]})")
+
+
+if __name__ == "__main__":
+    build_city_indexes(sys.argv[1:] or None)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Timer-wheel scheduler for traffic light phase changes
+Each light is filed under the tick of its next phase change, so a controller
+cycle only touches the lights whose phase actually expires
+"""
+
+class PhaseScheduler:
+    """Hashed timer wheel: O(1) scheduling, O(expiring) work per tick"""
+
+    def __init__(self, wheel_size=64):
+        self.wheel_size = wheel_size
+        self.tick = 0
+        self.buckets = [[] for _ in range(wheel_size)]
+        self.pending = 0
+
+    def clear(self):
+        """Drop every scheduled entry and rewind to tick 0"""
+        self.tick = 0
+        self.buckets = [[] for _ in range(self.wheel_size)]
+        self.pending = 0
+
+    def schedule(self, key, delay):
+        """Fire ``key`` ``delay`` ticks from now (at least one tick ahead)"""
+        due = self.tick + max(1, int(delay))
+        self.buckets[due % self.wheel_size].append((due, key))
+        self.pending += 1
+        return due
+
+    def advance(self):
+        """Move to the next tick and return the keys due on it"""
+        self.tick += 1
+        index = self.tick % self.wheel_size
+        bucket = self.buckets[index]
+        if not bucket:
+            return []
+
+        tick = self.tick
+        due_now = [key for due, key in bucket if due <= tick]
+        if len(due_now) == len(bucket):
+            self.buckets[index] = []
+        else:
+            # Entries scheduled more than one wheel revolution ahead stay put
+            self.buckets[index] = [entry for entry in bucket if entry[0] > tick]
+
+        self.pending -= len(due_now)
+        return due_now
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Pool of isolated simulation sessions
+Every session runs in its own worker process (session_worker.py) with its own
+SUMO instance, TraCI port and power network, so one analyst's restart or EV
+share change never touches another's run. The pool caps the number of live
+sessions and stops sessions that have had no clients for ``idle_timeout``
+seconds. Each session has a relay thread in the web process that turns worker
+messages into callbacks.
+
+CitySupervisor keeps one shared, persistent session per city (newyork, miami,
+losangeles) so several cities run side by side on separate cores. The pool's
+monitor thread samples CPU and memory of every worker process (psutil when
+installed, /proc otherwise).
+"""
+
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+import uuid
+
+from session_worker import run_session_worker
+
+try:
+    import psutil
+except ImportError:  # Optional: /proc is read directly on Linux
+    psutil = None
+
+# Workers import SUMO/TraCI fresh instead of forking the threaded web server
+_context = multiprocessing.get_context('spawn')
+
+
+class SessionLimitError(RuntimeError):
+    """All session slots are in use"""
+
+
+def _proc_times(pid):
+    """(cpu seconds, resident MB) of a process from /proc, or None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu_s = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        rss_mb = int(fields[21]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+        return cpu_s, rss_mb
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ProcessUsage:
+    """CPU percent (of one core) and resident memory of a worker process between samples"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.process = psutil.Process(pid) if psutil is not None else None
+        self.last = None  # (wall, cpu seconds)
+
+    def sample(self):
+        now = time.time()
+        try:
+            if self.process is not None:
+                times = self.process.cpu_times()
+                cpu_s, rss_mb = times.user + times.system, self.process.memory_info().rss / 2 ** 20
+            else:
+                usage = _proc_times(self.pid)
+                if usage is None:
+                    return None
+                cpu_s, rss_mb = usage
+        except Exception:
+            return None
+
+        cpu_percent = None
+        if self.last is not None and now > self.last[0]:
+            cpu_percent = round((cpu_s - self.last[1]) / (now - self.last[0]) * 100, 1)
+        self.last = (now, cpu_s)
+        return {'cpu_percent': cpu_percent, 'rss_mb': round(rss_mb, 1)}
+
+
+class SimulationSession:
+    """Web-process handle of one session and its worker process"""
+
+    def __init__(self, session_id, settings, on_message, persistent=False):
+        self.id = session_id
+        self.settings = dict(settings)
+        self.on_message = on_message
+        self.persistent = persistent  # shared city sessions: not capped, never reaped
+        self.clients = set()          # Socket.IO sids
+        self.created = time.time()
+        self.idle_since = time.time()
+        self.process = None
+        self.commands = None
+        self.outbox = None
+        self.stop_event = None
+        self.relay = None
+        self.info = {}                # 'started' message of the current worker
+        self.usage = {}               # latest CPU / memory sample of the worker
+        self._usage_probe = None
+        self.state = {}               # app-side per-session state (streams, metrics, topology)
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        """Spawn a fresh worker process for this session"""
+        self.stop()
+        self.commands = _context.Queue()
+        self.outbox = _context.Queue(maxsize=4)
+        self.stop_event = _context.Event()
+        self.info = {}
+        self.usage = {}
+        self._usage_probe = None
+        self.process = _context.Process(
+            target=run_session_worker, name=f"session-{self.id}",
+            args=(self.id, self.settings, self.commands, self.outbox, self.stop_event), daemon=True)
+        self.process.start()
+        self.relay = threading.Thread(target=self._relay, args=(self.process, self.outbox),
+                                      name=f"relay-{self.id}", daemon=True)
+        self.relay.start()
+
+    def stop(self, timeout=5):
+        """Stop the worker (SUMO closes inside it) and wait for its relay to finish"""
+        if self.process is None:
+            return
+        self.stop_event.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        if self.relay is not None:
+            self.relay.join(timeout)
+        self.process = None
+        self.relay = None
+
+    def send(self, name, value=None):
+        """Queue a command for the worker; ignored when it is not running"""
+        if self.running:
+            self.commands.put((name, value))
+
+    def _relay(self, process, outbox):
+        """Forward worker messages until it reports 'stopped' or dies"""
+        while True:
+            try:
+                kind, payload = outbox.get(timeout=0.5)
+            except queue.Empty:
+                if not process.is_alive():
+                    break
+                continue
+
+            if kind == 'frame':
+                payload = pickle.loads(payload)
+            elif kind == 'started':
+                self.info = payload
+                self._usage_probe = ProcessUsage(payload['pid'])
+            try:
+                self.on_message(self, kind, payload)
+            except Exception as e:
+                print(f"❌ [{self.id}] Error handling '{kind}': {e}")
+            if kind == 'stopped':
+                break
+
+    def sample_usage(self):
+        probe = self._usage_probe
+        if probe is None or not self.running:
+            self.usage = {}
+            return self.usage
+        self.usage = probe.sample() or {}
+        return self.usage
+
+    def join(self, sid):
+        self.clients.add(sid)
+
+    def leave(self, sid):
+        self.clients.discard(sid)
+        if not self.clients:
+            self.idle_since = time.time()
+
+    def stats(self):
+        return {
+            'id': self.id,
+            'city': self.settings.get('city'),
+            'clients': len(self.clients),
+            'running': self.running,
+            'pid': self.info.get('pid'),
+            'port': self.info.get('port'),
+            'cpu_percent': self.usage.get('cpu_percent'),
+            'rss_mb': self.usage.get('rss_mb'),
+            'uptime_s': round(time.time() - self.created, 1),
+            'idle_s': 0.0 if self.clients else round(time.time() - self.idle_since, 1)
+        }
+
+
+class SessionPool:
+    """Capped set of sessions with idle cleanup"""
+
+    def __init__(self, max_sessions=4, idle_timeout=300, on_message=None, on_close=None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.on_message = on_message or (lambda session, kind, payload: None)
+        self.on_close = on_close or (lambda session: None)
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.reaper = None
+
+    def create(self, settings, session_id=None, persistent=False):
+        """New session (not started yet); raises SessionLimitError when the pool is full.
+        
+        Persistent sessions (one per city, see CitySupervisor) do not count against
+        ``max_sessions`` and are never closed for being idle.
+        """
+        with self.lock:
+            private = sum(1 for session in self.sessions.values() if not session.persistent)
+            if not persistent and private >= self.max_sessions:
+                raise SessionLimitError(f"All {self.max_sessions} simulation sessions are in use")
+            session = SimulationSession(session_id or uuid.uuid4().hex[:8], settings, self.on_message, persistent)
+            self.sessions[session.id] = session
+        self.start_reaper()
+        return session
+
+    def get(self, session_id):
+        return self.sessions.get(session_id)
+
+    def close(self, session_id):
+        """Stop a session and forget it"""
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.stop()
+            self.on_close(session)
+            print(f"🧹 Session {session.id} closed")
+
+    def reap_idle(self):
+        """Close sessions without clients for longer than idle_timeout"""
+        now = time.time()
+        with self.lock:
+            idle = [session.id for session in self.sessions.values()
+                    if not session.persistent and not session.clients
+                    and now - session.idle_since > self.idle_timeout]
+        for session_id in idle:
+            self.close(session_id)
+        return idle
+
+    def start_reaper(self, interval=10):
+        """Monitor thread: idle cleanup and CPU / memory samples every ``interval`` seconds"""
+        if self.reaper is not None:
+            return
+
+        def reap():
+            while True:
+                time.sleep(interval)
+                self.reap_idle()
+                for session in list(self.sessions.values()):
+                    session.sample_usage()
+
+        self.reaper = threading.Thread(target=reap, name="session-monitor", daemon=True)
+        self.reaper.start()
+
+    def close_all(self):
+        for session_id in list(self.sessions):
+            self.close(session_id)
+
+    def stats(self):
+        return [session.stats() for session in list(self.sessions.values())]
+
+
+class CitySupervisor:
+    """One shared worker process per city, run concurrently on top of a SessionPool"""
+
+    def __init__(self, pool, settings_for_city, on_open=None):
+        self.pool = pool
+        self.settings_for_city = settings_for_city   # city -> worker settings
+        self.on_open = on_open or (lambda session: None)
+        self.lock = threading.Lock()
+
+    def session(self, city):
+        """The city's session, created and started on first use"""
+        with self.lock:
+            session = self.pool.get(city)
+            if session is None:
+                session = self.pool.create(self.settings_for_city(city), session_id=city, persistent=True)
+                self.on_open(session)
+            if not session.running:
+                session.start()
+        return session
+
+    def start(self, cities):
+        return [self.session(city) for city in cities]
+
+    def stats(self):
+        """Per-city worker stats including CPU percent and resident memory"""
+        return {session.id: session.stats() for session in list(self.pool.sessions.values())
+                if session.persistent}
+
+    def start_reporting(self, interval=60):
+        """Print the per-city CPU / memory table every ``interval`` seconds"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                stats = self.stats()
+                if stats:
+                    print(f"\n🖥️ City workers ({len(stats)} running)")
+                    self.report()
+
+        threading.Thread(target=loop, name="city-report", daemon=True).start()
+
+    def report(self):
+        for city, stats in self.stats().items():
+            cpu = '-' if stats['cpu_percent'] is None else f"{stats['cpu_percent']:.0f}%"
+            rss = '-' if stats['rss_mb'] is None else f"{stats['rss_mb']:.0f} MB"
+            print(f"  🏙️ {city:12s} pid {stats['pid']} | CPU {cpu:>5s} | RSS {rss:>7s} | "
+                  f"{stats['clients']} clients")
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Simulation session worker process
+One session = one process running its own SUMO instance (own TraCI port and
+label), traffic light controller, EV network and power network. The loop is the
+former in-app simulation thread: step, pace, capture a frame every 5 steps, run
+the power flow on a pipeline stage, and publish the frame to the web process.
+With ``record_dir`` set, every frame is also written to a recording (see
+frame_recorder.py); with ``checkpoint`` set, the run resumes from a saved
+checkpoint instead of t=0, and with ``snapshot`` set it starts from a pre-warmed
+snapshot (snapshot_library.py) on its own clock. A 'restart' command resets the
+run in place (traci.simulation.loadState of the state saved at start) instead of
+respawning.
+ReplayWorker streams such a recording instead, with the same messages and no
+SUMO or power flow.
+
+Messages to the web process on ``outbox`` are ``(kind, payload)`` tuples:
+    'started'   {'pid', 'port', 'backend', 'power_network', 'recording', 'restored', 'snapshot' or 'replay'}
+    'frame'     pickled frame dict with 'power', 'power_flows' and 'metrics' ('timing' about once a second)
+    'topology'  static power grid topology, sent whenever its version changes
+    'restarted' {'seconds', 'snapshot'} after a 'restart' command reset the run in place
+    'reply'     (event, data, sid) answer to a command for one client
+    'stopped'   {'error': message or None}
+Commands from the web process on ``commands`` are ``(name, value)`` tuples.
+"""
+
+import os
+import pickle
+import queue
+import threading
+import time
+import traceback
+
+FRAME_EVERY = 5         # steps between frame captures
+FRAME_INTERVAL = 0.1    # minimum wall seconds between frames
+
+
+def new_metrics():
+    """Empty real-time metrics of one session"""
+    return {
+        'vehicles': {'total': 0, 'evs': 0, 'charging': 0, 'moving': 0, 'stopped': 0},
+        'power': {'total_mw': 0, 'ev_mw': 0, 'traffic_mw': 0, 'peak_mw': 0},
+        'traffic_lights': {'total': 0, 'green': 0, 'yellow': 0, 'red': 0},
+        'grid': {'efficiency': 0, 'load_factor': 0, 'renewable_percent': 0, 'violations': 0},
+        'pacing': {},    # target vs. achieved sim/wall ratio and lag, see sim_pacing.py
+        'pipeline': {},  # per-stage queue depth / drops, see frame_pipeline.py
+        'stream': {}     # delta stream bytes/s vs. full frames (filled in by the web process)
+    }
+
+
+class WorkerChannel:
+    """Queues between a worker process and the web process"""
+
+    def __init__(self, session_id, settings, commands, outbox, stop):
+        self.session_id = session_id
+        self.settings = settings
+        self.commands = commands
+        self.outbox = outbox
+        self.stop = stop
+        self.metrics = new_metrics()
+        self.frames_dropped = 0
+
+    def send(self, kind, payload):
+        """Control message to the web process (waits for room instead of dropping)"""
+        try:
+            self.outbox.put((kind, payload), timeout=5)
+        except queue.Full:
+            print(f"⚠️ [{self.session_id}] Web process not reading, '{kind}' message lost")
+
+    def handle_command(self, name, value):
+        pass
+
+    def drain_commands(self):
+        while True:
+            try:
+                name, value = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            self.handle_command(name, value)
+
+    def publish(self, frame, block=False):
+        """Hand a frame to the web process; dropped if the web side is behind unless ``block``"""
+        frame['metrics'] = self.metrics
+        # Pickled here, not later in the queue's feeder thread, so the stages
+        # can keep mutating metrics and the power network meanwhile
+        payload = pickle.dumps(frame, pickle.HIGHEST_PROTOCOL)
+        try:
+            if block:
+                self.outbox.put(('frame', payload), timeout=1)
+            else:
+                self.outbox.put_nowait(('frame', payload))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def close(self):
+        pass
+
+
+class SessionWorker(WorkerChannel):
+    """Simulation loop of one session, run inside its worker process"""
+
+    def __init__(self, session_id, settings, commands, outbox, stop):
+        from manhattan_core import ManhattanSimulation
+        from sim_pacing import PacingController
+        from stage_timing import StageTimer
+
+        super().__init__(session_id, settings, commands, outbox, stop)
+        self.simulation = ManhattanSimulation(settings.get('city', 'newyork'))
+        self.timer = self.simulation.timer = StageTimer(settings.get('timing'))
+        self.timing_sent = 0.0
+        self.simulation.ev_network.ev_share_percent = settings.get('ev_share_percent', 30)
+        self.simulation.ev_network.ev_charging_bias_percent = settings.get('ev_charging_bias_percent', 30)
+        self.pacer = PacingController(settings.get('ratio', 1.0))
+        self.topology_version = None
+        self.recorder = None
+        self.restart = None  # pending 'restart' command: {'snapshot': path or None}
+
+    def handle_command(self, name, value):
+        ev_network = self.simulation.ev_network
+        if name == 'set_ev_percentage':
+            ev_network.ev_share_percent = value
+        elif name == 'set_ev_charging_bias':
+            ev_network.ev_charging_bias_percent = value
+        elif name == 'set_ratio':
+            self.pacer.set_ratio(value)
+        elif name == 'power_outage':
+            # value = grid bus ids without power; the lights they feed go dark on the next step
+            self.settings['outage_buses'] = value
+            self.simulation.power_grid.set_outage(value)
+        elif name == 'restart':
+            # value = start snapshot path or None; carried out by the loop once frames are drained
+            self.restart = {'snapshot': value}
+        elif name == 'power_network':
+            # value = sid of the client asking for the full network
+            power_grid = self.simulation.power_grid
+            if power_grid.network:
+                self.send('reply', ('power_network_update',
+                                    {'power_network': power_grid.get_power_network_data()}, value))
+        elif name == 'checkpoint':
+            # value = (checkpoint directory, room to notify); we are between steps here
+            path, room = value
+            try:
+                simulation_time = self.simulation.save_checkpoint(path)
+            except Exception as e:
+                self.send('reply', ('session_error', {'message': f"Checkpoint failed: {e}"}, room))
+                return
+            print(f"💾 [{self.session_id}] Checkpoint at {simulation_time:.1f}s -> {path}")
+            self.send('reply', ('checkpoint_saved', {'checkpoint': os.path.basename(path),
+                                                     'simulation_time': simulation_time}, room))
+
+    def capture_frame(self):
+        """Snapshot everything a frame needs from SUMO (simulation loop only)"""
+        frame = self.simulation.capture_frame()
+        metrics = self.metrics
+        metrics['vehicles']['total'] = len(frame['vehicles'])
+        metrics['vehicles']['evs'] = frame['total_evs']
+        metrics['vehicles']['charging'] = frame['charging_evs']
+        metrics['traffic_lights']['total'] = len(frame['traffic_lights'])
+        green_count, yellow_count, red_count = frame['light_colors']
+        metrics['traffic_lights']['green'] = green_count
+        metrics['traffic_lights']['yellow'] = yellow_count
+        metrics['traffic_lights']['red'] = red_count
+        return frame
+
+    def power_stage(self, frame):
+        """Couple the frame to the power network and run the power flow"""
+        metrics = self.metrics
+        power_grid = self.simulation.power_grid
+
+        # Calculate power with ultra-realistic network
+        power_data = self.simulation.couple_power(frame)
+        if power_data is None:
+            # City without a power grid model: traffic and EV charging only
+            frame['power'] = {}
+            frame['power_flows'] = None
+            return frame
+
+        metrics['power']['total_mw'] = power_data['total_load_mw']
+        metrics['power']['ev_mw'] = power_data['ev_charging_mw']
+        metrics['power']['traffic_mw'] = power_data['traffic_infrastructure_mw']
+        metrics['grid']['load_factor'] = power_data['load_factor']
+        metrics['grid']['renewable_percent'] = power_data['renewable_percent']
+        metrics['grid']['violations'] = power_data['violations']['thermal'] + power_data['violations']['voltage']
+
+        # Flat per-frame arrays; the static topology is announced separately
+        with self.timer.stage('get_power_flow_data'):
+            power_flows = power_grid.get_power_flow_data()
+            topology = power_grid.get_power_topology()
+        if topology is not None and topology['version'] != self.topology_version:
+            self.topology_version = topology['version']
+            self.send('topology', topology)
+            if self.recorder is not None:
+                self.recorder.set_topology(topology)
+                self.recorder.set_network(power_grid.get_power_network_data())
+
+        if frame['step'] % 100 == 0:
+            depths = ', '.join(f"{name} {stats['depth']}/{stats['capacity']}"
+                               for name, stats in metrics.get('pipeline', {}).items())
+            print(f"\n📊 [{self.session_id}] Step {frame['step']} | Time: {frame['simulation_time']:.1f}s")
+            print(f"  🚗 Vehicles: {len(frame['vehicles'])} in {self.simulation.city} ({frame['total_evs']} EVs)")
+            print(f"  ⚡ Charging: {frame['charging_evs']} EVs at stations")
+            print(f"  🚦 Lights: {metrics['traffic_lights']['green']}G/{metrics['traffic_lights']['yellow']}Y/{metrics['traffic_lights']['red']}R")
+            print(f"  💡 Power: {power_data['total_load_mw']:.1f} MW (EV: {power_data['ev_charging_mw']:.3f} MW)")
+            print(f"  📊 Grid: {len(topology['buses'])} buses, {len(topology['lines'])} lines (topology v{topology['version']})")
+            print(f"  ⚠️ Violations: {power_data['violations']['thermal']} thermal, {power_data['violations']['voltage']} voltage")
+            print(f"  🧵 Queues: {depths} (dropped before web: {self.frames_dropped})")
+            pacing = metrics.get('pacing') or {}
+            if pacing:
+                target = 'max' if pacing['target_ratio'] == 0 else f"{pacing['target_ratio']:g}x"
+                print(f"  ⏱️ Pace: {pacing['achieved_ratio']:.1f}x (target {target}, lag {pacing['lag_ms']:.0f} ms)")
+
+        frame['power'] = power_data
+        frame['power_flows'] = power_flows
+        return frame
+
+    def record_stage(self, frame):
+        """Append every frame to the recording (blocking: a recording has no gaps)"""
+        self.recorder.record(frame, self.metrics)
+        self.metrics['recording'] = self.recorder.stats()
+        return frame
+
+    def publish_stage(self, frame):
+        """Hand the frame to the web process, dropping it if the web side is behind"""
+        # Only needed by the power stage; not worth pickling
+        del frame['traffic_light_states']
+        del frame['ev_charging_data']
+        now = time.time()
+        if now - self.timing_sent >= 1.0:
+            # Stage percentiles ride along about once a second (see stage_timing.py)
+            frame['timing'] = self.timer.summary()
+            self.timing_sent = now
+        with self.timer.stage('publish'):
+            self.publish(frame)
+        self.timer.count('frames')
+
+    def open_recorder(self, record_dir):
+        """New recording directory <record_dir>/<city>_<session>_<timestamp>"""
+        from frame_recorder import FrameRecorder
+
+        simulation = self.simulation
+        path = os.path.join(record_dir, f"{simulation.city}_{self.session_id}_{time.strftime('%Y%m%d_%H%M%S')}")
+        self.recorder = FrameRecorder(path, {'city': simulation.city, 'bounds': simulation.bounds,
+                                             'session': self.session_id})
+        print(f"🎞️ [{self.session_id}] Recording frames to {path}")
+        return path
+
+    def build_pipeline(self):
+        """Started power -> (record) -> publish pipeline"""
+        from frame_pipeline import FramePipeline, BLOCK, DROP_OLDEST
+
+        pipeline = FramePipeline(threading.Event())
+        pipeline.add_stage('power', self.power_stage, maxsize=4, policy=BLOCK)
+        if self.recorder is not None:
+            pipeline.add_stage('record', self.record_stage, maxsize=8, policy=BLOCK)
+        pipeline.add_stage('publish', self.publish_stage, maxsize=2, policy=DROP_OLDEST)
+        pipeline.start()
+        return pipeline
+
+    def restart_simulation(self, pipeline, snapshot=None):
+        """Back to t=0 (or a start snapshot) on the running SUMO instead of a new worker
+
+        Returns the pipeline to keep using: a new one if the old could not drain in time.
+        """
+        started = time.perf_counter()
+        # The power stage must not be mid-flow while the grid is reset under it
+        if not pipeline.drain():
+            # Stop the stages, wait for the one still running to return and drop
+            # the pre-restart frames left in the queues
+            print(f"⚠️ [{self.session_id}] Frames still in flight at restart, rebuilding the pipeline")
+            pipeline.stop_event.set()
+            pipeline.join(timeout=None)
+            pipeline = self.build_pipeline()
+        simulation = self.simulation
+        snapshot_info = None
+        if snapshot:
+            state = simulation.restore_checkpoint(snapshot, restore_clock=False)
+            snapshot_info = {'snapshot': os.path.basename(snapshot), 'simulation_time': state['simulation_time'],
+                             'vehicles': len(simulation.vehicle_registry)}
+        else:
+            simulation.reload()
+        # An outage outlives restarts, as the client's other settings do
+        simulation.power_grid.set_outage(self.settings.get('outage_buses', ()))
+        self.pacer.reset()
+        self.topology_version = None
+        if self.recorder is not None:
+            # A recording covers one run; simulation time starts over here
+            self.recorder.close()
+            self.open_recorder(self.settings['record_dir'])
+
+        seconds = time.perf_counter() - started
+        print(f"🔄 [{self.session_id}] Restarted in place in {seconds * 1000:.0f} ms"
+              f"{f' from snapshot {snapshot}' if snapshot else ''}")
+        self.send('restarted', {'seconds': round(seconds, 3), 'snapshot': snapshot_info})
+        return pipeline
+
+    def run(self, sumo_binary, native_programs=False):
+        from sumolib.miscutils import getFreeSocketPort
+        from simulation_backend import traci, backend_name
+        from manhattan_core import read_checkpoint_info
+        from snapshot_library import demand_args
+
+        simulation = self.simulation
+        port = getFreeSocketPort()
+        sumo_args = ()
+        if self.settings.get('snapshot') and not self.settings.get('checkpoint'):
+            # Keep departing at the snapshot's time-of-day demand
+            sumo_args = demand_args(read_checkpoint_info(self.settings['snapshot']))
+        simulation.start(sumo_binary, native_programs=native_programs, sumo_args=sumo_args,
+                         port=port, label=self.session_id)
+        step_length = traci.simulation.getDeltaT()
+        restored = None
+        if self.settings.get('checkpoint'):
+            state = simulation.restore_checkpoint(self.settings['checkpoint'])
+            restored = {'checkpoint': os.path.basename(self.settings['checkpoint']),
+                        'simulation_time': state['simulation_time']}
+            print(f"💾 [{self.session_id}] Resumed from {self.settings['checkpoint']} "
+                  f"at {state['simulation_time']:.1f}s")
+        snapshot = None
+        if self.settings.get('snapshot') and restored is None:
+            # Warm traffic and fleet, but the power profiles stay on this session's clock
+            started = time.perf_counter()
+            path = self.settings['snapshot']
+            state = simulation.restore_checkpoint(path, restore_clock=False)
+            snapshot = {'snapshot': os.path.basename(path), 'simulation_time': state['simulation_time'],
+                        'vehicles': len(simulation.vehicle_registry)}
+            print(f"🌅 [{self.session_id}] Started from snapshot {path} ({snapshot['vehicles']} vehicles, "
+                  f"{time.perf_counter() - started:.1f}s)")
+        if self.settings.get('outage_buses') is not None:
+            simulation.power_grid.set_outage(self.settings['outage_buses'])
+        record_dir = self.settings.get('record_dir')
+        recording = self.open_recorder(record_dir) if record_dir else None
+        self.send('started', {'pid': os.getpid(), 'port': port, 'backend': backend_name(traci),
+                              'power_network': simulation.power_grid.network is not None,
+                              'recording': recording, 'restored': restored, 'snapshot': snapshot})
+
+        pipeline = self.build_pipeline()
+
+        last_update_time = time.time()
+        timer = self.timer
+        try:
+            while simulation.running() and not self.stop.is_set():
+                step_counter = simulation.step()
+                timer.count('steps')
+
+                if step_counter % FRAME_EVERY == 0:
+                    self.drain_commands()
+                    if self.restart is not None:
+                        pipeline = self.restart_simulation(pipeline, **self.restart)
+                        self.restart = None
+                        continue
+                    current_time = time.time()
+
+                    if current_time - last_update_time >= FRAME_INTERVAL:
+                        # Everything that touches TraCI stays on this thread
+                        with timer.stage('capture_frame'):
+                            frame = self.capture_frame()
+                        pipeline.submit(frame)
+                        self.metrics['pipeline'] = pipeline.stats()
+                        self.metrics['pacing'] = self.pacer.stats()
+                        last_update_time = current_time
+
+                # Sleeps only what is left of this step's wall-time budget
+                self.pacer.pace(step_counter * step_length)
+        finally:
+            pipeline.stop_event.set()
+            pipeline.join()
+
+    def close(self):
+        self.simulation.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            stats = self.recorder.stats()
+            print(f"🎞️ [{self.session_id}] Recorded {stats['frames']} frames "
+                  f"({stats['bytes'] / 2 ** 20:.1f} MB) to {stats['path']}")
+
+
+class ReplayWorker(WorkerChannel):
+    """Streams a recording at any sim/wall ratio with seeking; no SUMO, no power flow"""
+
+    def __init__(self, session_id, settings, commands, outbox, stop):
+        from frame_recorder import FrameRecording
+
+        super().__init__(session_id, settings, commands, outbox, stop)
+        self.recording = FrameRecording(settings['replay'])
+        self.ratio = settings.get('ratio', 1.0)
+        self.position = self.recording.start_time   # simulation time being shown
+        self.anchor = None                          # (wall, sim time) the clock runs from
+        self.topology_version = None
+
+    def handle_command(self, name, value):
+        if name == 'set_ratio':
+            self.ratio = max(0.0, float(value))
+            self.anchor = None
+        elif name == 'seek':
+            self.position = min(max(float(value), self.recording.start_time), self.recording.end_time)
+            self.anchor = None
+        elif name == 'power_network':
+            network = self.recording.network()
+            if network is not None:
+                self.send('reply', ('power_network_update', {'power_network': network}, value))
+
+    def pacing_stats(self):
+        """Replay speed in the shape of PacingController.stats()"""
+        achieved = 0.0
+        if self.anchor is not None and time.perf_counter() > self.anchor[0]:
+            achieved = (self.position - self.anchor[1]) / (time.perf_counter() - self.anchor[0])
+        return {'target_ratio': self.ratio, 'achieved_ratio': round(achieved, 2), 'lag_ms': 0.0, 'slips': 0}
+
+    def replay_stats(self):
+        return {
+            'position': round(self.position, 1),
+            'start': self.recording.start_time,
+            'end': self.recording.end_time,
+            'ratio': self.ratio,
+            'frames': len(self.recording)
+        }
+
+    def next_index(self, index):
+        """Frame to show now: the one due on the replay clock (skipping frames at high
+        ratios), or simply the next one at max speed"""
+        now = time.perf_counter()
+        if self.anchor is None:
+            self.anchor = (now, self.position)
+            return self.recording.index_at(self.position)
+        if self.ratio <= 0:
+            return index + 1
+        wall, sim_time = self.anchor
+        return max(index, self.recording.index_at(sim_time + (now - wall) * self.ratio))
+
+    def run(self):
+        recording = self.recording
+        self.send('started', {'pid': os.getpid(), 'port': None, 'backend': 'replay',
+                              'power_network': recording.network() is not None,
+                              'replay': self.replay_stats()})
+
+        index = -1
+        while not self.stop.is_set():
+            self.drain_commands()
+            if self.anchor is None:
+                index = -1
+            next_index = self.next_index(index)
+            if next_index == index or next_index >= len(recording):
+                # Next frame not due yet, or the end of the recording (held until a seek)
+                time.sleep(FRAME_INTERVAL / 4)
+                continue
+
+            index = next_index
+            frame = recording.frame(index)
+            self.position = frame['simulation_time']
+            flows = frame['power_flows']
+            if flows is not None and flows['version'] != self.topology_version:
+                topology = recording.topology(flows['version'])
+                if topology is not None:
+                    self.topology_version = flows['version']
+                    self.send('topology', topology)
+
+            self.metrics.update(frame['metrics'])
+            self.metrics['replay'] = self.replay_stats()
+            self.metrics['pacing'] = self.pacing_stats()
+            # At max speed the web process sets the pace; otherwise skip what it cannot take
+            self.publish(frame, block=self.ratio <= 0)
+            if self.ratio > 0:
+                time.sleep(FRAME_INTERVAL)
+
+
+def run_session_worker(session_id, settings, commands, outbox, stop):
+    """Process entry point of a session (a replay session when settings has 'replay')"""
+    worker = None
+    error = None
+    try:
+        if settings.get('replay'):
+            worker = ReplayWorker(session_id, settings, commands, outbox, stop)
+            worker.run()
+        else:
+            worker = SessionWorker(session_id, settings, commands, outbox, stop)
+            worker.run(settings['sumo_binary'], settings.get('native_programs', False))
+    except Exception as e:
+        error = str(e)
+        print(f"❌ [{session_id}] Error: {e}")
+        traceback.print_exc()
+    finally:
+        if worker is not None:
+            worker.close()
+        try:
+            outbox.put(('stopped', {'error': error}), timeout=5)
+        except queue.Full:
+            pass
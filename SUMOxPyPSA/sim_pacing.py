@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Adaptive real-time pacing of the simulation loop
+Instead of a fixed sleep after every step, the loop targets a simulated-time /
+wall-time ratio (1x, 10x, ... or 0 = as fast as possible). Each call compares
+the simulated clock with the wall clock since the last anchor and sleeps only
+the remainder, so expensive steps eat into the sleep instead of adding to it.
+When the loop falls more than ``max_lag`` behind it re-anchors rather than
+bursting to catch up.
+"""
+
+import threading
+import time
+from collections import deque
+
+MAX_RATIO = 0  # ratio value meaning "no pacing"
+
+
+class PacingController:
+    """Sleeps the simulation loop to hold a target sim/wall time ratio"""
+
+    def __init__(self, ratio=1.0, max_lag=0.5, min_sleep=0.002, window=50):
+        self.ratio = float(ratio)
+        self.max_lag = max_lag        # wall seconds behind schedule before re-anchoring
+        self.min_sleep = min_sleep    # shorter remainders are carried to the next step
+        self.lock = threading.Lock()
+        self.anchor_wall = None
+        self.anchor_sim = None
+        self.lag = 0.0
+        self.slips = 0
+        self.samples = deque(maxlen=window)  # (wall, sim) for the achieved ratio
+
+    def set_ratio(self, ratio):
+        """Change the target ratio; takes effect from the next step (0 = max)"""
+        with self.lock:
+            self.ratio = max(0.0, float(ratio))
+            self.anchor_wall = None
+            self.samples.clear()
+
+    def reset(self):
+        with self.lock:
+            self.anchor_wall = None
+            self.lag = 0.0
+            self.slips = 0
+            self.samples.clear()
+
+    def pace(self, sim_time):
+        """Call once per step with the simulated time; sleeps until that time is due"""
+        now = time.perf_counter()
+        with self.lock:
+            self.samples.append((now, sim_time))
+            ratio = self.ratio
+            if ratio <= MAX_RATIO:
+                self.lag = 0.0
+                return 0.0
+            if self.anchor_wall is None:
+                self.anchor_wall, self.anchor_sim = now, sim_time
+                return 0.0
+
+            due = self.anchor_wall + (sim_time - self.anchor_sim) / ratio
+            remaining = due - now
+            self.lag = max(0.0, -remaining)
+            if self.lag > self.max_lag:
+                # Too far behind (steps cost more than the ratio allows): accept the
+                # slower pace from here instead of running flat out to catch up
+                self.anchor_wall, self.anchor_sim = now, sim_time
+                self.slips += 1
+
+        if remaining >= self.min_sleep:
+            time.sleep(remaining)
+            return remaining
+        return 0.0
+
+    def achieved_ratio(self):
+        """Sim seconds per wall second over the recent window"""
+        with self.lock:
+            if len(self.samples) < 2:
+                return 0.0
+            (wall0, sim0), (wall1, sim1) = self.samples[0], self.samples[-1]
+        return (sim1 - sim0) / (wall1 - wall0) if wall1 > wall0 else 0.0
+
+    def stats(self):
+        return {
+            'target_ratio': self.ratio,
+            'achieved_ratio': round(self.achieved_ratio(), 2),
+            'lag_ms': round(self.lag * 1000, 1),
+            'slips': self.slips
+        }
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Pluggable SUMO simulation backend
+TraCI drives a SUMO process over a socket; libsumo embeds SUMO in-process with the
+same Python API and no serialization. The backend is chosen with SIMULATION_BACKEND
+in config.py (or the SUMO_BACKEND environment variable) and every module imports
+``traci`` from here instead of importing the package directly.
+"""
+
+import importlib
+import os
+
+from config import SIMULATION_BACKEND
+
+BACKENDS = ('traci', 'libsumo')
+
+
+def load_backend(name):
+    """Import and return the SUMO control module for ``name``"""
+    name = (name or 'traci').lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown simulation backend '{name}' (expected one of {BACKENDS})")
+    return importlib.import_module(name)
+
+
+def backend_name(module):
+    """Name of a loaded backend module"""
+    return module.__name__.split('.')[0]
+
+
+# Backend selected for this process; constants always come from traci.constants
+traci = load_backend(os.environ.get('SUMO_BACKEND', SIMULATION_BACKEND))
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Pre-warmed start snapshots per city and time of day
+A fresh simulation starts with an empty city and takes several simulated
+minutes to fill up as vehicles depart. This offline job runs each city's config
+until the number of vehicles on the network stops growing (steady state) and
+saves a checkpoint there (SUMO state file plus controller, EV and power state;
+see ManhattanSimulation.save_checkpoint) for each chosen start time: morning
+rush, midday, night. The route files are the same for every time of day, so the
+demand is scaled (SUMO --scale) by the hour's DEMAND_SCALE_BY_HOUR factor; a
+night snapshot holds far fewer vehicles than the morning rush. The library is
+SNAPSHOTS_DIR/<city>/<name>/ and each snapshot's checkpoint.json records its
+time of day, demand scale and warm-up length.
+
+New web sessions load the snapshot closest to the current time of day in a
+second or two instead of replaying the warm-up (USE_START_SNAPSHOTS in config.py).
+
+Usage:
+    python snapshot_library.py                                  # every built city, all SNAPSHOT_TIMES
+    python snapshot_library.py --cities newyork --times morning_rush evening=18:30
+    python snapshot_library.py --list
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from config import CITY_CONFIGS, DEMAND_SCALE_BY_HOUR, SNAPSHOTS_DIR, SNAPSHOT_TIMES, SUMO_PATH
+from sumo_config import CITY_CONFIGS as SUMO_CITY_CONFIGS
+
+SAMPLE_EVERY = 30.0   # simulated seconds between vehicle count samples
+STEADY_WINDOW = 10    # samples compared for steady state (two halves of 5)
+FRAME_EVERY = 5       # steps between EV charging updates, as in the app loop
+POWER_EVERY = 60.0    # simulated seconds between power flows during warm-up
+
+
+def minute_of_day(value):
+    """Minutes since midnight of a datetime or an 'HH:MM' string"""
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%H:%M")
+    return value.hour * 60 + value.minute
+
+
+def demand_scale(time_of_day):
+    """Traffic demand factor of an 'HH:MM' time of day"""
+    return DEMAND_SCALE_BY_HOUR[minute_of_day(time_of_day) // 60]
+
+
+def demand_args(info):
+    """SUMO options reproducing a snapshot's demand, for the run that loads it"""
+    scale = (info or {}).get('demand_scale')
+    return ("--scale", f"{scale:g}") if scale else ()
+
+
+def list_snapshots(city=None, root=SNAPSHOTS_DIR):
+    """checkpoint.json of every snapshot in the library (with its 'path'), by city and time of day"""
+    # Not at module level: --backend must be set before the SUMO backend is imported
+    from manhattan_core import read_checkpoint_info
+
+    snapshots = []
+    cities = [city] if city else (sorted(os.listdir(root)) if os.path.isdir(root) else [])
+    for name in cities:
+        city_dir = os.path.join(root, name)
+        if not os.path.isdir(city_dir):
+            continue
+        for snapshot in sorted(os.listdir(city_dir)):
+            path = os.path.join(city_dir, snapshot)
+            info = read_checkpoint_info(path)
+            if info is not None and info.get('time_of_day'):
+                snapshots.append(dict(info, path=path))
+    return sorted(snapshots, key=lambda info: (info['city'], minute_of_day(info['time_of_day'])))
+
+
+def closest_snapshot(city, when=None, native_programs=False, root=SNAPSHOTS_DIR):
+    """The city's snapshot nearest to ``when``'s time of day (default now), or None.
+
+    Only snapshots warmed up with the same signal control mode qualify, since
+    the native SUMO programs are part of the saved state.
+    """
+    target = minute_of_day(when or datetime.now())
+
+    def distance(info):
+        # Around the clock: 23:00 is one hour from 00:00
+        delta = abs(minute_of_day(info['time_of_day']) - target)
+        return min(delta, 24 * 60 - delta)
+
+    candidates = [info for info in list_snapshots(city, root)
+                  if info['city'] == city and bool(info.get('native_programs')) == bool(native_programs)]
+    return min(candidates, key=distance) if candidates else None
+
+
+def is_steady(counts, tolerance):
+    """Vehicle count has stopped changing: the two halves of the window agree within ``tolerance``"""
+    if len(counts) < counts.maxlen:
+        return False
+    half = counts.maxlen // 2
+    samples = list(counts)
+    before = sum(samples[:half]) / half
+    after = sum(samples[half:]) / (len(samples) - half)
+    return after > 0 and abs(after - before) <= tolerance * max(before, 1.0)
+
+
+def build_snapshot(city, name, time_of_day, sumo_binary, native_programs=False,
+                   min_warmup=600.0, max_warmup=3600.0, tolerance=0.05, root=SNAPSHOTS_DIR):
+    """Warm ``city`` up to steady state and save it as snapshot ``name`` reading ``time_of_day``.
+
+    The power profiles run on a clock that leads up to ``time_of_day``; the saved
+    start_time is shifted so the snapshot's clock reads exactly ``time_of_day``.
+    Traffic demand is scaled by demand_scale(time_of_day).
+    """
+    from manhattan_core import ManhattanSimulation, read_checkpoint_info
+
+    clock = datetime.strptime(time_of_day, "%H:%M")
+    target = datetime.now().replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+    simulation = ManhattanSimulation(city, start_time=target - timedelta(seconds=min_warmup))
+    path = os.path.join(root, city, name)
+    scale = demand_scale(time_of_day)
+
+    print(f"\n🌅 Warming up {CITY_CONFIGS[city]['name']} for {name} ({time_of_day}, demand x{scale:g})")
+    wall_start = time.perf_counter()
+    counts = deque(maxlen=STEADY_WINDOW)
+    try:
+        simulation.start(sumo_binary, native_programs=native_programs, label=f"warmup_{city}",
+                         sumo_args=("--no-step-log", "true", "--no-warnings", "true",
+                                    *demand_args({'demand_scale': scale})))
+        next_sample, next_power = SAMPLE_EVERY, 0.0
+        sim_time = 0.0
+        while simulation.running():
+            steps = simulation.step()
+            if steps % FRAME_EVERY:
+                continue
+
+            # Keep EV routing, charging sessions and the grid on the app's cadence
+            frame = simulation.capture_frame()
+            sim_time = frame['simulation_time']
+            if sim_time >= next_power:
+                simulation.couple_power(frame)
+                next_power += POWER_EVERY
+            if sim_time < next_sample:
+                continue
+
+            counts.append(len(simulation.vehicle_registry))
+            next_sample += SAMPLE_EVERY
+            steady = sim_time >= min_warmup and is_steady(counts, tolerance)
+            if steady or sim_time >= max_warmup:
+                break
+            if len(counts) % 4 == 0:
+                print(f"  ⏱️ {sim_time:6.0f} s | {counts[-1]} vehicles")
+
+        simulation.start_time = target - timedelta(seconds=sim_time)
+        simulation.save_checkpoint(path, info={
+            'snapshot': name,
+            'time_of_day': time_of_day,
+            'demand_scale': scale,
+            'warmup_s': sim_time,
+            'steady': is_steady(counts, tolerance)
+        })
+    finally:
+        simulation.close()
+
+    info = read_checkpoint_info(path)
+    state = "steady" if info['steady'] else "max warm-up reached"
+    print(f"  💾 {path}: {info['vehicles']} vehicles after {sim_time:.0f} s simulated ({state}, "
+          f"{time.perf_counter() - wall_start:.0f} s wall)")
+    return info
+
+
+def parse_times(values):
+    """Snapshot (name, 'HH:MM') pairs from SNAPSHOT_TIMES names, name=HH:MM or HH:MM"""
+    times = []
+    for value in values:
+        if value in SNAPSHOT_TIMES:
+            times.append((value, SNAPSHOT_TIMES[value]))
+            continue
+        name, _, clock = value.rpartition('=')
+        clock = datetime.strptime(clock, "%H:%M").strftime("%H:%M")
+        times.append((name or clock.replace(':', ''), clock))
+    return times
+
+
+def print_library(root=SNAPSHOTS_DIR):
+    snapshots = list_snapshots(root=root)
+    if not snapshots:
+        print(f"No snapshots in {root}")
+        return
+    for info in snapshots:
+        mode = "native" if info.get('native_programs') else "TraCI"
+        print(f"  🏙️ {info['city']:12s} {info['snapshot']:14s} {info['time_of_day']} | "
+              f"demand x{info.get('demand_scale', 1.0):<4g} | {info['vehicles']:5d} vehicles | warm-up {info['warmup_s']:5.0f} s | {mode} signals | "
+              f"{info['created']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the pre-warmed start snapshot library")
+    parser.add_argument("--cities", nargs="+", choices=sorted(CITY_CONFIGS),
+                        help="cities to warm up (default: every city whose network is built)")
+    parser.add_argument("--times", nargs="+", default=list(SNAPSHOT_TIMES),
+                        help=f"start times: {', '.join(SNAPSHOT_TIMES)}, name=HH:MM or HH:MM (default: all)")
+    parser.add_argument("--min-warmup", type=float, default=600.0,
+                        help="simulated seconds before steady state is checked (default 600)")
+    parser.add_argument("--max-warmup", type=float, default=3600.0,
+                        help="simulated seconds after which the snapshot is taken regardless (default 3600)")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="relative change in vehicle count counted as steady (default 0.05)")
+    parser.add_argument("--backend", choices=("traci", "libsumo"),
+                        help="SUMO control backend (default: SIMULATION_BACKEND in config.py)")
+    parser.add_argument("--native", action="store_true",
+                        help="warm up with native SUMO signal programs (for NATIVE_SIGNAL_PROGRAMS = True)")
+    parser.add_argument("--sumo-binary", help="path to the sumo binary (default: SUMO_PATH/bin/sumo)")
+    parser.add_argument("--output", default=SNAPSHOTS_DIR, help=f"library directory (default {SNAPSHOTS_DIR})")
+    parser.add_argument("--list", action="store_true", help="list the library and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print_library(args.output)
+        return 0
+    if args.backend:
+        # Read by simulation_backend at import time
+        os.environ['SUMO_BACKEND'] = args.backend
+
+    # Default: every city whose network has been built (see build.py)
+    cities = args.cities or [city for city, config in CITY_CONFIGS.items() if os.path.exists(
+        os.path.join(config['working_dir'], SUMO_CITY_CONFIGS[city.upper()]['net-file']))]
+    sumo_binary = args.sumo_binary or os.path.join(SUMO_PATH, "bin/sumo")
+    times = parse_times(args.times)
+
+    print("=" * 80)
+    print(f"🌅 SNAPSHOT WARM-UP: {', '.join(cities)} x {', '.join(name for name, _ in times)}")
+    print("=" * 80)
+    for city in cities:
+        for name, time_of_day in times:
+            build_snapshot(city, name, time_of_day, sumo_binary, args.native,
+                           args.min_warmup, args.max_warmup, args.tolerance, args.output)
+    print("=" * 80)
+    print_library(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,7 @@ Perfect NYC Manhattan Grid Simulation with Real-Time Power Integration
 
 from flask import Flask, render_template
 from flask_socketio import SocketIO, emit
-import traci
+from simulation_backend import traci
 import time
 import threading
 import os
@@ -9,7 +9,7 @@ import json
 import pandas as pd
 import numpy as np
 import pypsa
-import traci
+from simulation_backend import traci
 from pathlib import Path
 from datetime import datetime, timedelta
 import threading
@@ -3,7 +3,7 @@ PROPER Manhattan SUMO×PyPSA Coupling System
 Real-time bidirectional coupling with actual data exchange
 """
 
-import traci
+from simulation_backend import traci
 import pypsa
 import pandas as pd
 import numpy as np
@@ -0,0 +1,36 @@
+"""
+Pluggable SUMO simulation backend for the coupling modules
+"traci" talks to a SUMO process over a socket, "libsumo" runs SUMO in-process
+with the same API. Selected by sumo.backend in configs/config.json or the
+SUMO_BACKEND environment variable.
+"""
+
+import importlib
+import json
+import os
+from pathlib import Path
+
+BACKENDS = ('traci', 'libsumo')
+CONFIG_PATH = Path(__file__).resolve().parent.parent / "configs" / "config.json"
+
+
+def configured_backend():
+    """Backend name from the environment or the project config"""
+    if os.environ.get('SUMO_BACKEND'):
+        return os.environ['SUMO_BACKEND']
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            return json.load(f).get('sumo', {}).get('backend', 'traci')
+    except (OSError, json.JSONDecodeError):
+        return 'traci'
+
+
+def load_backend(name):
+    """Import and return the SUMO control module for ``name``"""
+    name = (name or 'traci').lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown simulation backend '{name}' (expected one of {BACKENDS})")
+    return importlib.import_module(name)
+
+
+traci = load_backend(configured_backend())
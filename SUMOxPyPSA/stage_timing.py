@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing of the simulation loop
+Each stage (SUMO step, signal cycle, vehicle harvest, EV charging, power flow,
+encode, emit, ...) feeds a rolling window of durations summarised as
+p50/p95/p99, plus running totals for Prometheus. Counters (steps, frames, bytes)
+keep a short history of (time, total) samples for per-second rates.
+
+When disabled, stage() hands back one shared no-op context manager and wrap()
+returns the function unchanged, so the loop pays a method call per stage and
+nothing else. Counters stay on: they are bumped at most once per step or frame.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+WINDOW = 2048        # durations kept per stage for the percentiles
+RATE_WINDOW = 10.0   # seconds of counter history behind a rate
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = "sumoxpypsa"
+
+
+class _NoTiming:
+    """Context manager that does nothing (timing disabled)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMING = _NoTiming()
+
+
+class _StageClock:
+    """Times one ``with`` block into a histogram"""
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class RollingHistogram:
+    """Last ``window`` durations of a stage plus all-time count and sum"""
+
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def record(self, seconds):
+        # Appends come from one thread per stage; list(deque) copies under the GIL
+        self.samples.append(seconds)
+        self.count += 1
+        self.sum += seconds
+
+    def summary(self):
+        samples = np.fromiter(list(self.samples), dtype=np.float64)
+        if samples.size:
+            p50, p95, p99 = np.percentile(samples, [q * 100 for q in QUANTILES])
+            mean = samples.mean()
+        else:
+            p50 = p95 = p99 = mean = 0.0
+        return {
+            'count': self.count,
+            'sum_s': round(self.sum, 6),
+            'mean_ms': round(mean * 1000, 3),
+            'p50_ms': round(p50 * 1000, 3),
+            'p95_ms': round(p95 * 1000, 3),
+            'p99_ms': round(p99 * 1000, 3)
+        }
+
+
+class Counter:
+    """Running total with a rate over the last RATE_WINDOW seconds"""
+
+    def __init__(self):
+        self.total = 0
+        self.history = deque([(time.perf_counter(), 0)], maxlen=256)
+
+    def add(self, amount=1):
+        self.total += amount
+        now = time.perf_counter()
+        if now - self.history[-1][0] >= 0.1:
+            # One sample per 100 ms is plenty for a 10 s rate
+            self.history.append((now, self.total))
+
+    def rate(self):
+        now = time.perf_counter()
+        history = list(self.history)
+        since = next(((t, total) for t, total in history if now - t <= RATE_WINDOW), history[-1])
+        elapsed = now - since[0]
+        return (self.total - since[1]) / elapsed if elapsed > 0 else 0.0
+
+
+class StageTimer:
+    """Rolling per-stage histograms and counters of one process"""
+
+    def __init__(self, enabled=False, window=WINDOW):
+        self.enabled = bool(enabled)
+        self.window = window
+        self.histograms = {}
+        self.clocks = {}
+        self.counters = {}
+        self.lock = threading.Lock()  # only taken when a stage or counter is first seen
+
+    def _clock(self, name):
+        with self.lock:
+            clock = self.clocks.get(name)
+            if clock is None:
+                self.histograms[name] = RollingHistogram(self.window)
+                clock = self.clocks[name] = _StageClock(self.histograms[name])
+        return clock
+
+    def stage(self, name):
+        """``with timer.stage('simulation_step'):`` times the block (no-op when disabled).
+
+        Each stage has a single clock, so time a given stage from one thread only.
+        """
+        if not self.enabled:
+            return _NO_TIMING
+        clock = self.clocks.get(name)
+        return clock if clock is not None else self._clock(name)
+
+    def wrap(self, name, function):
+        """``function`` timed as stage ``name`` (unchanged when disabled)"""
+        if not self.enabled:
+            return function
+
+        def timed(*args, **kwargs):
+            with self.stage(name):
+                return function(*args, **kwargs)
+        return timed
+
+    def count(self, name, amount=1):
+        counter = self.counters.get(name)
+        if counter is None:
+            with self.lock:
+                counter = self.counters.setdefault(name, Counter())
+        counter.add(amount)
+
+    def summary(self):
+        """Stage percentiles (ms), counter totals and per-second rates"""
+        return {
+            'enabled': self.enabled,
+            'stages': {name: histogram.summary() for name, histogram in list(self.histograms.items())},
+            'counters': {name: counter.total for name, counter in list(self.counters.items())},
+            'rates': {name: round(counter.rate(), 2) for name, counter in list(self.counters.items())}
+        }
+
+
+def merge_summaries(*summaries):
+    """One view of several processes' summaries (e.g. a session's worker and the web side)"""
+    merged = {'enabled': False, 'stages': {}, 'counters': {}, 'rates': {}}
+    for summary in summaries:
+        if not summary:
+            continue
+        merged['enabled'] = merged['enabled'] or summary['enabled']
+        for key in ('stages', 'counters', 'rates'):
+            merged[key].update(summary[key])
+    return merged
+
+
+def print_stages(summary):
+    """Stage table of a summary, slowest total first"""
+    stages = sorted(summary['stages'].items(), key=lambda item: item[1]['sum_s'], reverse=True)
+    print(f"   {'Stage':26s} {'calls':>9s} {'total s':>9s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    for name, stats in stages:
+        print(f"   {name:26s} {stats['count']:9d} {stats['sum_s']:9.2f} {stats['p50_ms']:8.3f} "
+              f"{stats['p95_ms']:8.3f} {stats['p99_ms']:8.3f}")
+
+
+def _labels(labels):
+    return ','.join(f'{key}="{str(value)}"' for key, value in labels.items())
+
+
+def prometheus_text(entries):
+    """Prometheus text exposition of ``[(labels, summary), ...]``, e.g. one entry per session"""
+    stage_lines, total_lines, rate_lines = [], [], []
+    for labels, summary in entries:
+        for stage, stats in summary['stages'].items():
+            stage_labels = dict(labels, stage=stage)
+            for quantile, key in zip(QUANTILES, ('p50_ms', 'p95_ms', 'p99_ms')):
+                stage_lines.append(f"{METRIC_PREFIX}_stage_seconds{{{_labels(dict(stage_labels, quantile=quantile))}}} "
+                                   f"{stats[key] / 1000:.9f}")
+            stage_lines.append(f"{METRIC_PREFIX}_stage_seconds_sum{{{_labels(stage_labels)}}} {stats['sum_s']:.6f}")
+            stage_lines.append(f"{METRIC_PREFIX}_stage_seconds_count{{{_labels(stage_labels)}}} {stats['count']}")
+        for name, total in summary['counters'].items():
+            total_lines.append((name, f"{METRIC_PREFIX}_{name}_total{{{_labels(labels)}}} {total}"))
+        for name, rate in summary['rates'].items():
+            rate_lines.append((name, f"{METRIC_PREFIX}_{name}_per_second{{{_labels(labels)}}} {rate}"))
+
+    lines = []
+    if stage_lines:
+        lines += [f"# HELP {METRIC_PREFIX}_stage_seconds Duration of a simulation loop stage (rolling window)",
+                  f"# TYPE {METRIC_PREFIX}_stage_seconds summary", *stage_lines]
+    for kind, entries_of_kind, suffix in (('counter', total_lines, 'total'), ('gauge', rate_lines, 'per_second')):
+        for name in sorted({name for name, _ in entries_of_kind}):
+            metric = f"{METRIC_PREFIX}_{name}_{suffix}"
+            lines.append(f"# TYPE {metric} {kind}")
+            lines += [line for line_name, line in entries_of_kind if line_name == name]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,28 @@
+from batch_runner import COLUMNS, open_series, read_rows
+
+
+def row(sim_time):
+    return dict({column: 0 for column in COLUMNS}, sim_time=sim_time)
+
+
+def test_rows_are_on_disk_before_close(tmp_path):
+    output = str(tmp_path / "series.csv")
+    series, writer = open_series(output)
+    writer.writerow(row(60.0))
+    series.flush()
+
+    # An interrupted run has not closed the file
+    assert [r['sim_time'] for r in read_rows(output, float('inf'))] == ['60.0']
+    series.close()
+
+
+def test_resume_keeps_rows_up_to_checkpoint_and_appends(tmp_path):
+    output = str(tmp_path / "series.csv")
+    series, writer = open_series(output, [row(t) for t in (60.0, 120.0, 180.0)])
+    series.close()
+
+    series, writer = open_series(output, read_rows(output, 120.0))
+    writer.writerow(row(180.0))
+    series.close()
+
+    assert [r['sim_time'] for r in read_rows(output, float('inf'))] == ['60.0', '120.0', '180.0']
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from clip_region import ClipRegion
+from geo_projection import NetworkProjection
+
+SQUARE = [(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 10.0)]
+
+
+def test_interior_and_exterior_points():
+    region = ClipRegion(SQUARE)
+    mask = region.contains([5.0, -1.0, 11.0, 5.0, 5.0], [5.0, 5.0, 5.0, -1.0, 11.0])
+    assert mask.tolist() == [True, False, False, False, False]
+
+
+def test_edges_are_half_open():
+    region = ClipRegion(SQUARE)
+    # left, bottom and their corner are inside; right, top and their corners are not
+    inside = region.contains([0.0, 5.0, 0.0], [5.0, 0.0, 0.0])
+    outside = region.contains([10.0, 5.0, 10.0, 10.0, 0.0], [5.0, 10.0, 10.0, 0.0, 10.0])
+    assert inside.all()
+    assert not outside.any()
+
+
+def test_adjacent_regions_split_a_shared_edge():
+    left = ClipRegion(SQUARE)
+    right = ClipRegion([(x + 10.0, y) for x, y in SQUARE])
+    x = np.full(5, 10.0)
+    y = np.linspace(0.0, 9.0, 5)
+    assert (left.contains(x, y) ^ right.contains(x, y)).all()
+
+
+def test_points_just_inside_the_right_edge():
+    region = ClipRegion(SQUARE)
+    assert region.contains([10.0 - 1e-9], [5.0]).tolist() == [True]
+    assert region.contains([10.0 + 1e-9], [5.0]).tolist() == [False]
+
+
+def test_diagonal_edge_of_a_triangle():
+    region = ClipRegion([(0.0, 0.0), (10.0, 0.0), (0.0, 10.0)])
+    mask = region.contains([4.9, 5.1], [4.9, 5.1])
+    assert mask.tolist() == [True, False]
+
+
+def test_empty_input_and_bad_polygon():
+    region = ClipRegion(SQUARE)
+    assert region.contains([], []).shape == (0,)
+    with pytest.raises(ValueError):
+        ClipRegion([(0.0, 0.0), (1.0, 1.0)])
+
+
+def test_geo_bounds_region_matches_the_box():
+    projection = NetworkProjection((-582663.11, -4503908.89),
+                                   "+proj=utm +zone=18 +ellps=WGS84 +datum=WGS84 +units=m +no_defs")
+    bounds = {'lon_min': -74.02, 'lon_max': -73.93, 'lat_min': 40.70, 'lat_max': 40.80}
+    region = ClipRegion.from_geo_bounds(projection, bounds)
+
+    lon = np.array([-73.975, -74.0199, -73.9301, -73.975, -73.975, -74.0201, -73.9299, -73.975, -73.975])
+    lat = np.array([40.75, 40.75, 40.75, 40.7001, 40.7999, 40.75, 40.75, 40.6999, 40.8001])
+    x, y = projection.to_xy(lon, lat)
+    assert region.contains(x, y).tolist() == [True] * 5 + [False] * 4
@@ -0,0 +1,68 @@
+from frame_delta import DELTA, KEYFRAME, DeltaEncoder, FrameStream
+
+
+def vehicle(vid, x=0.0):
+    return {'id': vid, 'x': x, 'y': 0.0, 'angle': 0.0, 'speed': 0.0, 'type': 'car',
+            'is_ev': False, 'charging': False}
+
+
+def payload(vehicles, colors=None, time=0.0):
+    colors = colors or {'tl': 'green'}
+    return {
+        'vehicles': vehicles,
+        'traffic_lights': [{'id': tl_id, 'color': color, 'state': color[0]} for tl_id, color in colors.items()],
+        'ev_stations': [{'id': 's', 'evs_charging': 0}],
+        'simulation_time': time
+    }
+
+
+def test_first_message_is_keyframe_then_deltas():
+    encoder = DeltaEncoder(keyframe_interval=50, stream_id=7)
+    first = encoder.encode(payload([vehicle('a')]))
+    second = encoder.encode(payload([vehicle('a')], time=0.5))
+
+    assert (first['type'], first['seq'], first['stream']) == (KEYFRAME, 1, 7)
+    assert first['vehicles'] == [vehicle('a')]
+    assert (second['type'], second['seq'], second['base_seq']) == (DELTA, 2, 1)
+    assert second['simulation_time'] == 0.5
+
+
+def test_delta_carries_only_changes():
+    encoder = DeltaEncoder()
+    encoder.encode(payload([vehicle('a'), vehicle('b')]))
+    message = encoder.encode(payload([vehicle('a', x=1.0), vehicle('c')], colors={'tl': 'red'}))
+
+    assert message['vehicles'] == {'added': [vehicle('c')], 'changed': [{'id': 'a', 'x': 1.0}],
+                                   'removed': ['b']}
+    assert message['traffic_lights'] == {'changed': [{'id': 'tl', 'color': 'red', 'state': 'r'}]}
+    assert message['ev_stations'] == {'changed': []}
+
+
+def test_keyframe_interval_and_requests():
+    encoder = DeltaEncoder(keyframe_interval=2)
+    types = [encoder.encode(payload([]))['type'] for _ in range(4)]
+    assert types == [KEYFRAME, DELTA, DELTA, KEYFRAME]
+
+    encoder.request_keyframe()
+    assert encoder.encode(payload([]))['type'] == KEYFRAME
+
+
+def test_stream_gap_forces_keyframe():
+    stream = FrameStream('room')
+    stream.mark_sent(stream.encoder.encode(payload([]))['seq'])
+    stream.encoder.encode(payload([]))  # dropped before broadcast
+    message = stream.encoder.encode(payload([]))
+    assert message['type'] == DELTA
+
+    stream.mark_sent(message['seq'])
+    assert stream.encoder.encode(payload([]))['type'] == KEYFRAME
+
+
+def test_reset_starts_sequence_over():
+    stream = FrameStream('room')
+    for _ in range(3):
+        stream.mark_sent(stream.encoder.encode(payload([]))['seq'])
+    stream.reset()
+
+    message = stream.encoder.encode(payload([]))
+    assert (message['type'], message['seq']) == (KEYFRAME, 1)
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from frame_pipeline import BLOCK, DROP_OLDEST, FramePipeline, FrameQueue
+
+
+def test_drop_oldest_keeps_newest():
+    queue = FrameQueue(2, DROP_OLDEST)
+    for frame in range(5):
+        queue.put(frame)
+
+    assert (queue.dropped, queue.get(), queue.get()) == (3, 3, 4)
+
+
+def test_blocking_put_returns_on_stop():
+    queue = FrameQueue(1, BLOCK)
+    stop = threading.Event()
+    queue.put(0, stop)
+    stop.set()
+
+    assert queue.put(1, stop) is False
+
+
+def test_frames_pass_through_stages_in_order():
+    results = []
+    pipeline = FramePipeline(threading.Event())
+    pipeline.add_stage('double', lambda frame: frame * 2, maxsize=4)
+    pipeline.add_stage('collect', results.append, maxsize=4)
+    pipeline.start()
+    for frame in range(10):
+        pipeline.submit(frame)
+
+    assert pipeline.drain(timeout=5.0)
+    assert results == [frame * 2 for frame in range(10)]
+    pipeline.stop_event.set()
+    pipeline.join()
+
+
+def test_drain_times_out_while_a_stage_is_busy():
+    release = threading.Event()
+    pipeline = FramePipeline(threading.Event())
+    pipeline.add_stage('slow', lambda frame: release.wait(), maxsize=1)
+    pipeline.start()
+    pipeline.submit(0)
+
+    assert not pipeline.drain(timeout=0.05)
+    release.set()
+    assert pipeline.drain(timeout=5.0)
+    pipeline.stop_event.set()
+    pipeline.join()
+
+
+def test_join_without_timeout_waits_for_the_running_handler():
+    finished = []
+    pipeline = FramePipeline(threading.Event())
+    pipeline.add_stage('slow', lambda frame: time.sleep(0.2) or finished.append(frame), maxsize=1)
+    pipeline.start()
+    pipeline.submit(0)
+    time.sleep(0.05)
+
+    pipeline.stop_event.set()
+    pipeline.join(timeout=None)
+    assert finished == [0]
@@ -0,0 +1,68 @@
+import numpy as np
+
+from frame_recorder import FrameRecorder, FrameRecording
+
+
+def make_frame(step, num_vehicles):
+    ids = [f"veh_{step}_{i}" for i in range(num_vehicles)]
+    lon = np.linspace(-74.0, -73.95, num_vehicles) + step * 1e-5
+    lat = np.linspace(40.71, 40.79, num_vehicles)
+    columns = {'ids': ids, 'type': ['car'] * num_vehicles, 'lon': lon, 'lat': lat,
+               'angle': np.full(num_vehicles, 90.0), 'speed': np.full(num_vehicles, 5.0),
+               'slot': np.arange(num_vehicles, dtype=np.int32)}
+    vehicles = [{'id': vid, 'x': float(lon[i]), 'y': float(lat[i]), 'angle': 90.0, 'speed': 5.0,
+                 'type': 'car', 'is_ev': i % 2 == 0, 'charging': False} for i, vid in enumerate(ids)]
+    return {
+        'step': step * 5, 'simulation_time': step * 0.5, 'vehicles': vehicles, 'vehicle_columns': columns,
+        'traffic_lights': [{'id': 'tl', 'x': -74.0, 'y': 40.75, 'state': 'GGrr', 'color': 'green',
+                            'pattern': 'AVENUE'}],
+        'light_colors': (1, 0, 0), 'ev_stations': [], 'total_evs': (num_vehicles + 1) // 2,
+        'charging_evs': 0, 'total_ev_power_mw': 0.0, 'power': {'total_load_mw': 500.0 + step},
+        'power_flows': {'version': 1, 'etag': 'x', 'metrics': {}, 'line_flow': [float(step)] * 3,
+                        'line_utilization': [10.0] * 3, 'generator_output': [1.0], 'station_utilization': []}
+    }
+
+
+def record(path, frames, chunk_frames=4):
+    recorder = FrameRecorder(str(path), {'city': 'newyork'}, chunk_frames=chunk_frames)
+    for frame in frames:
+        recorder.record(frame)
+    recorder.close()
+    return FrameRecording(str(path))
+
+
+def test_roundtrip_across_chunks(tmp_path):
+    # Vehicle counts vary per frame so the row offsets matter
+    frames = [make_frame(step, step % 3 + 1) for step in range(10)]
+    recording = record(tmp_path, frames)
+
+    assert len(recording) == 10
+    assert len(recording.chunks) == 3
+    assert (recording.start_time, recording.end_time) == (0.0, 4.5)
+    for original in frames:
+        replayed = recording.frame(original['step'] // 5)
+        assert replayed['simulation_time'] == original['simulation_time']
+        assert replayed['vehicles'] == original['vehicles']
+        assert replayed['traffic_lights'] == original['traffic_lights']
+        assert replayed['power'] == original['power']
+        assert replayed['power_flows']['line_flow'] == original['power_flows']['line_flow']
+
+
+def test_index_at_seeks_by_simulation_time(tmp_path):
+    recording = record(tmp_path, [make_frame(step, 1) for step in range(10)])
+
+    assert recording.index_at(-1.0) == 0
+    assert recording.index_at(0.0) == 0
+    assert recording.index_at(1.99) == 3
+    assert recording.index_at(2.0) == 4
+    assert recording.index_at(100.0) == 9
+
+
+def test_unflushed_frames_are_not_indexed(tmp_path):
+    recorder = FrameRecorder(str(tmp_path), {'city': 'newyork'}, chunk_frames=4)
+    for step in range(6):
+        recorder.record(make_frame(step, 1))
+
+    # A crashed run keeps only the finished chunks
+    assert len(FrameRecording(str(tmp_path))) == 4
+    assert recorder.stats()['frames'] == 6
@@ -0,0 +1,64 @@
+import gzip
+
+import numpy as np
+import pytest
+
+from geo_projection import NetworkProjection
+
+UTM18 = "+proj=utm +zone=18 +ellps=WGS84 +datum=WGS84 +units=m +no_defs"
+NYC_OFFSET = (-582663.11, -4503908.89)  # netOffset of new_york/osm.net.xml.gz
+
+
+@pytest.mark.parametrize("lon, lat, easting, northing", [
+    (-75.0, 0.0, 500000.0, 0.0),             # central meridian on the equator
+    (-75.0, 45.0, 500000.0, 4982950.400),    # central meridian at 45 N
+    (-72.0, 0.0, 833978.557, 0.0),           # zone edges on the equator
+    (-78.0, 0.0, 166021.443, 0.0),
+])
+def test_to_xy_matches_known_utm_points(lon, lat, easting, northing):
+    projection = NetworkProjection((0.0, 0.0), UTM18)
+    x, y = projection.to_xy(lon, lat)
+    assert float(x) == pytest.approx(easting, abs=1e-3)
+    assert float(y) == pytest.approx(northing, abs=1e-3)
+
+
+def test_to_geo_inverts_known_utm_points():
+    projection = NetworkProjection((0.0, 0.0), UTM18)
+    lon, lat = projection.to_geo([500000.0, 833978.557], [4982950.400, 0.0])
+    np.testing.assert_allclose(lon, [-75.0, -72.0], atol=1e-8)
+    np.testing.assert_allclose(lat, [45.0, 0.0], atol=1e-8)
+
+
+def test_south_zone_uses_false_northing():
+    projection = NetworkProjection((0.0, 0.0), "+proj=utm +zone=18 +south +ellps=WGS84")
+    x, y = projection.to_xy(-75.0, -45.0)
+    assert float(x) == pytest.approx(500000.0, abs=1e-3)
+    assert float(y) == pytest.approx(10000000.0 - 4982950.400, abs=1e-3)
+
+
+def test_round_trip_over_manhattan_keeps_array_shape():
+    projection = NetworkProjection(NYC_OFFSET, UTM18)
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0.0, 5722.81, (50, 2))
+    y = rng.uniform(0.0, 7916.50, (50, 2))
+
+    lon, lat = projection.to_geo(x, y)
+    assert lon.shape == lat.shape == (50, 2)
+    back_x, back_y = projection.to_xy(lon, lat)
+    assert np.max(np.hypot(back_x - x, back_y - y)) < 1e-6
+
+
+def test_from_net_file_reads_location(tmp_path):
+    net = tmp_path / "tiny.net.xml.gz"
+    with gzip.open(net, 'wt') as f:
+        f.write('<net><location netOffset="-582663.11,-4503908.89" '
+                f'projParameter="{UTM18}"/></net>')
+
+    projection = NetworkProjection.from_net_file(str(net))
+    assert projection.net_offset == NYC_OFFSET
+    assert projection.zone == 18 and not projection.south
+
+
+def test_rejects_non_utm_projection():
+    with pytest.raises(ValueError):
+        NetworkProjection((0.0, 0.0), "+proj=merc +ellps=WGS84")
@@ -0,0 +1,95 @@
+import gzip
+import os
+
+import numpy as np
+import pytest
+
+import network_index
+from network_index import INDEX_PREFIX, NetworkIndex, parse_network
+
+TINY_NET = """<?xml version="1.0" encoding="UTF-8"?>
+<net version="1.9">
+    <location netOffset="-582663.11,-4503908.89" convBoundary="0.00,0.00,200.00,100.00"
+              projParameter="+proj=utm +zone=18 +ellps=WGS84 +datum=WGS84 +units=m +no_defs"/>
+    <edge id=":J1_0" function="internal">
+        <lane id=":J1_0_0" index="0" speed="10.00" length="5.00" shape="98.00,0.00 102.00,0.00"/>
+    </edge>
+    <edge id="E0" from="J0" to="J1" priority="1">
+        <lane id="E0_0" index="0" speed="13.89" length="100.00" shape="0.00,-1.60 100.00,-1.60"/>
+        <lane id="E0_1" index="1" speed="13.89" length="100.00" shape="0.00,1.60 50.00,1.60 100.00,1.60"/>
+    </edge>
+    <edge id="E1" from="J1" to="J2" priority="1">
+        <lane id="E1_0" index="0" speed="8.00" length="100.00" shape="100.00,0.00 200.00,100.00"/>
+    </edge>
+    <tlLogic id="J1" type="static" programID="0" offset="0">
+        <phase duration="31" state="GGg"/>
+        <phase duration="4" state="yyy"/>
+    </tlLogic>
+    <junction id="J0" type="dead_end" x="0.00" y="0.00"/>
+    <junction id="J1" type="traffic_light" x="100.00" y="0.00"/>
+    <junction id=":J1_0" type="internal" x="100.00" y="0.00"/>
+    <junction id="J2" type="dead_end" x="200.00" y="100.00"/>
+    <connection from="E0" to="E1" fromLane="1" toLane="0" tl="J1" linkIndex="1"/>
+    <connection from="E0" to="E1" fromLane="0" toLane="0" tl="J1" linkIndex="0"/>
+    <connection from=":J1_0" to="E1" fromLane="0" toLane="0"/>
+</net>
+"""
+
+
+@pytest.fixture
+def net_file(tmp_path):
+    path = tmp_path / "osm.net.xml.gz"
+    with gzip.open(path, 'wt') as f:
+        f.write(TINY_NET)
+    return str(path)
+
+
+def test_parse_network_skips_internal_edges_and_junctions(net_file):
+    arrays = parse_network(net_file)
+    assert arrays['edge_ids'].tolist() == ['E0', 'E1']
+    assert arrays['edge_from'].tolist() == ['J0', 'J1']
+    assert arrays['lane_ids'].tolist() == ['E0_0', 'E0_1', 'E1_0']
+    assert arrays['lane_edge'].tolist() == [0, 0, 1]
+    assert arrays['junction_ids'].tolist() == ['J0', 'J1', 'J2']
+    assert arrays['junction_type'].tolist() == ['dead_end', 'traffic_light', 'dead_end']
+
+
+def test_parse_network_lane_shapes_and_boxes(net_file):
+    arrays = parse_network(net_file)
+    assert arrays['lane_shape_offsets'].tolist() == [0, 2, 5, 7]
+    np.testing.assert_allclose(arrays['lane_speed'], [13.89, 13.89, 8.0], rtol=1e-6)
+    np.testing.assert_allclose(arrays['lane_bbox'], [
+        [0.0, -1.6, 100.0, -1.6],
+        [0.0, 1.6, 100.0, 1.6],
+        [100.0, 0.0, 200.0, 100.0],
+    ], rtol=1e-6)
+
+
+def test_parse_network_traffic_lights(net_file):
+    arrays = parse_network(net_file)
+    assert arrays['tls_ids'].tolist() == ['J1']
+    assert arrays['tls_link_count'].tolist() == [2]
+    # End of the incoming lane of link 0
+    np.testing.assert_allclose(arrays['tls_xy'], [[100.0, -1.6]])
+
+
+def test_parse_network_location(net_file):
+    arrays = parse_network(net_file)
+    assert arrays['net_offset'].tolist() == [-582663.11, -4503908.89]
+    assert arrays['conv_boundary'].tolist() == [0.0, 0.0, 200.0, 100.0]
+    assert str(arrays['proj_parameter']).startswith('+proj=utm +zone=18')
+
+
+def test_load_caches_by_content_hash(net_file, tmp_path, monkeypatch):
+    index = NetworkIndex.load(net_file)
+    cached = [name for name in os.listdir(tmp_path) if name.startswith(INDEX_PREFIX)]
+    assert cached == [f"{INDEX_PREFIX}{index.source_hash[:16]}.npz"]
+
+    def fail(_):
+        raise AssertionError("cached index was reparsed")
+    monkeypatch.setattr(network_index, 'parse_network', fail)
+    again = NetworkIndex.load(net_file)
+    assert again.lane_index('E1_0') == 2
+    assert again.lane_index('missing') is None
+    np.testing.assert_allclose(again.lane_shape(1), [[0.0, 1.6], [50.0, 1.6], [100.0, 1.6]], rtol=1e-6)
+    assert again.bounds == (0.0, 0.0, 200.0, 100.0)
@@ -0,0 +1,55 @@
+import random
+
+from phase_scheduler import PhaseScheduler
+
+DURATIONS = (35, 3, 2, 35, 3, 2)
+
+
+def test_matches_full_scan():
+    """Same phase changes, tick for tick, as scanning every light"""
+    rng = random.Random(1)
+    timers = {f"tl_{i}": rng.randint(0, 30) for i in range(200)}
+
+    scan = {tl_id: {'phase': 0, 'timer': timer} for tl_id, timer in timers.items()}
+    wheel_phases = dict.fromkeys(timers, 0)
+    scheduler = PhaseScheduler(wheel_size=16)
+    for tl_id, timer in timers.items():
+        scheduler.schedule(tl_id, DURATIONS[0] - timer)
+
+    for _ in range(500):
+        scan_changed = set()
+        for tl_id, light in scan.items():
+            light['timer'] += 1
+            if light['timer'] >= DURATIONS[light['phase']]:
+                light['phase'] = (light['phase'] + 1) % 6
+                light['timer'] = 0
+                scan_changed.add(tl_id)
+
+        wheel_changed = set(scheduler.advance())
+        for tl_id in wheel_changed:
+            wheel_phases[tl_id] = (wheel_phases[tl_id] + 1) % 6
+            scheduler.schedule(tl_id, DURATIONS[wheel_phases[tl_id]])
+
+        assert wheel_changed == scan_changed
+    assert wheel_phases == {tl_id: light['phase'] for tl_id, light in scan.items()}
+
+
+def test_delays_longer_than_the_wheel():
+    scheduler = PhaseScheduler(wheel_size=4)
+    due = scheduler.schedule('far', 10)
+
+    fired = []
+    for _ in range(12):
+        if scheduler.advance():
+            fired.append(scheduler.tick)
+    assert due == 10
+    assert fired == [10]
+    assert scheduler.pending == 0
+
+
+def test_schedule_is_at_least_one_tick_ahead():
+    scheduler = PhaseScheduler()
+    scheduler.schedule('now', 0)
+    scheduler.schedule('past', -5)
+
+    assert sorted(scheduler.advance()) == ['now', 'past']
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+import manhattan_core
+from manhattan_core import ManhattanSimulation, build_phase_states
+
+
+class FakeTrafficLights:
+    def __init__(self):
+        self.states = {}
+        self.programs = {}
+
+    def setRedYellowGreenState(self, tl_id, state):
+        self.states[tl_id] = state
+
+    def setProgram(self, tl_id, program):
+        self.programs[tl_id] = [program]
+
+    def setPhase(self, tl_id, phase):
+        self.programs[tl_id].append(phase)
+
+    def setPhaseDuration(self, tl_id, seconds):
+        self.programs[tl_id].append(seconds)
+
+
+@pytest.fixture
+def simulation(monkeypatch):
+    lights = FakeTrafficLights()
+    clock = SimpleNamespace(time=0.0)
+    monkeypatch.setattr(manhattan_core, 'traci', SimpleNamespace(
+        trafficlight=lights, simulation=SimpleNamespace(getTime=lambda: clock.time)))
+
+    simulation = ManhattanSimulation('newyork')
+    simulation.power_grid.initialize_nyc_grid()
+    controller = simulation.traffic_controller
+    for tl_id, position in (('times_sq', (-73.9855, 40.7580)), ('wall_st', (-74.0090, 40.7074))):
+        controller.lights[tl_id] = {
+            'pattern': 'STREET', 'num_signals': 4, 'states': build_phase_states('STREET', 4),
+            'phase': 0, 'offset': 5, 'green_time': 25, 'yellow_time': 3, 'all_red_time': 2,
+            'position': position, 'state_history': []
+        }
+    simulation.fake_lights, simulation.clock = lights, clock
+    return simulation
+
+
+def test_outage_darkens_only_lights_on_that_bus(simulation):
+    bus = simulation.power_grid.signal_bus(40.7580, -73.9855)
+    simulation.power_grid.set_outage([bus, 'no_such_bus'])
+    simulation.apply_power_outages()
+
+    assert simulation.power_grid.outage_buses == {bus}
+    assert simulation.fake_lights.states == {'times_sq': 'OOOO'}
+    assert simulation.traffic_controller.overridden == {'times_sq'}
+
+
+def test_lights_return_to_plan_when_power_comes_back(simulation):
+    grid = simulation.power_grid
+    grid.set_outage([grid.signal_bus(40.7580, -73.9855)])
+    simulation.apply_power_outages()
+    simulation.traffic_controller.lights['times_sq']['phase'] = 3
+
+    grid.set_outage([])
+    simulation.apply_power_outages()
+    assert simulation.fake_lights.states['times_sq'] == build_phase_states('STREET', 4)[3]
+    assert simulation.traffic_controller.overridden == set()
+
+
+def test_native_lights_rejoin_their_plan_position(simulation):
+    controller = simulation.traffic_controller
+    controller.native_programs, controller.native_start, controller.tick_seconds = True, 100.0, 1.0
+    grid = simulation.power_grid
+    grid.set_outage([grid.signal_bus(40.7580, -73.9855)])
+    simulation.apply_power_outages()
+
+    # Installed 5 s into its 25 s green, so 30 s later it is 35 s into the cycle:
+    # past green, yellow and red (25 + 3 + 2 s) and 5 s into the second green
+    simulation.clock.time = 130.0
+    grid.set_outage([])
+    simulation.apply_power_outages()
+    program, phase, remaining = simulation.fake_lights.programs['times_sq']
+    assert (program, phase) == (manhattan_core.NATIVE_PROGRAM_ID, 3)
+    assert remaining == pytest.approx(20.0)
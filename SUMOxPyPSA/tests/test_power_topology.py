@@ -0,0 +1,30 @@
+import pytest
+
+from manhattan_power_network import ManhattanPowerNetworkRealistic
+
+
+@pytest.fixture(scope='module')
+def network():
+    network = ManhattanPowerNetworkRealistic()
+    network.build_network()
+    network.simulate_power_flow()
+    return network
+
+
+def test_network_data_is_topology_plus_flows(network):
+    data = network.get_network_data()
+    topology = network.get_topology()
+    flows = network.get_flow_data()
+
+    assert [line['id'] for line in data['lines']] == [line['id'] for line in topology['lines']]
+    assert [line['flow'] for line in data['lines']] == flows['line_flow']
+    assert [gen['output'] for gen in data['generators']] == flows['generator_output']
+    assert [station['utilization'] for station in data['ev_stations']] == flows['station_utilization']
+    assert data['buses'] == topology['buses']
+
+
+def test_network_data_does_not_alias_cached_topology(network):
+    network.get_network_data()['buses'][0]['id'] = 'changed'
+
+    assert network.get_topology()['buses'][0]['id'] != 'changed'
+    assert 'flow' not in network.get_topology()['lines'][0]
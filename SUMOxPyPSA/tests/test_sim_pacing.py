@@ -0,0 +1,71 @@
+import pytest
+
+import sim_pacing
+from sim_pacing import PacingController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def paced(monkeypatch, ratio, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr(sim_pacing, 'time', clock)
+    return PacingController(ratio, **kwargs), clock
+
+
+def test_sleeps_only_what_is_left_of_the_step(monkeypatch):
+    pacer, clock = paced(monkeypatch, ratio=2.0)
+    pacer.pace(0.0)
+
+    clock.now += 0.01  # step cost
+    assert pacer.pace(0.1) == pytest.approx(0.04)
+    assert clock.now == pytest.approx(100.05)
+
+
+def test_max_ratio_never_sleeps(monkeypatch):
+    pacer, clock = paced(monkeypatch, ratio=0)
+    for step in range(5):
+        pacer.pace(step * 0.1)
+
+    assert clock.slept == []
+
+
+def test_reanchors_instead_of_bursting_when_far_behind(monkeypatch):
+    pacer, clock = paced(monkeypatch, ratio=1.0, max_lag=0.5)
+    pacer.pace(0.0)
+
+    clock.now += 2.0  # a 2 s stall
+    assert pacer.pace(0.1) == 0.0
+    assert pacer.slips == 1
+
+    # Back on schedule relative to the new anchor
+    assert pacer.pace(0.2) == pytest.approx(0.1)
+
+
+def test_achieved_ratio(monkeypatch):
+    pacer, clock = paced(monkeypatch, ratio=4.0)
+    # More steps than the sample window, all sleeping to schedule
+    for step in range(60):
+        pacer.pace(step * 0.1)
+
+    assert pacer.achieved_ratio() == pytest.approx(4.0)
+    assert pacer.stats()['target_ratio'] == 4.0
+
+
+def test_set_ratio_clamps_and_reanchors(monkeypatch):
+    pacer, clock = paced(monkeypatch, ratio=1.0)
+    pacer.pace(0.0)
+    pacer.set_ratio(-3)
+
+    assert pacer.ratio == 0.0
+    assert pacer.anchor_wall is None
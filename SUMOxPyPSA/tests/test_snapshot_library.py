@@ -0,0 +1,11 @@
+from snapshot_library import demand_args, demand_scale
+
+
+def test_demand_follows_time_of_day():
+    assert demand_scale("08:00") > demand_scale("12:30") > demand_scale("23:00")
+
+
+def test_demand_args():
+    assert demand_args({'demand_scale': 0.35}) == ("--scale", "0.35")
+    assert demand_args({}) == ()
+    assert demand_args(None) == ()
@@ -0,0 +1,60 @@
+from stage_timing import RollingHistogram, StageTimer, merge_summaries, prometheus_text
+
+
+def test_disabled_timer_records_nothing():
+    timer = StageTimer(enabled=False)
+    with timer.stage('simulation_step'):
+        pass
+    function = lambda: 1
+    assert timer.wrap('stage', function) is function
+    assert timer.summary()['stages'] == {}
+
+
+def test_enabled_timer_counts_stage_calls():
+    timer = StageTimer(enabled=True)
+    for _ in range(3):
+        with timer.stage('simulation_step'):
+            pass
+    assert timer.wrap('power', lambda x: x * 2)(4) == 8
+    timer.count('frames', 2)
+
+    summary = timer.summary()
+    assert summary['stages']['simulation_step']['count'] == 3
+    assert summary['stages']['power']['count'] == 1
+    assert summary['counters'] == {'frames': 2}
+
+
+def test_histogram_percentiles_over_window():
+    histogram = RollingHistogram(window=100)
+    for ms in range(1, 201):
+        histogram.record(ms / 1000)
+
+    summary = histogram.summary()
+    assert summary['count'] == 200
+    assert summary['p50_ms'] == 150.5  # only the last 100 samples
+    assert summary['sum_s'] == 20.1
+
+
+def test_merge_summaries_skips_missing():
+    worker = {'enabled': True, 'stages': {'step': {}}, 'counters': {'steps': 10}, 'rates': {'steps': 5.0}}
+    merged = merge_summaries(None, worker, {'enabled': False, 'stages': {}, 'counters': {'frames': 2},
+                                            'rates': {}})
+
+    assert merged['enabled'] is True
+    assert merged['counters'] == {'steps': 10, 'frames': 2}
+
+
+def test_prometheus_text():
+    summary = {
+        'stages': {'step': {'count': 4, 'sum_s': 0.5, 'p50_ms': 100.0, 'p95_ms': 200.0, 'p99_ms': 250.0}},
+        'counters': {'frames': 7},
+        'rates': {'frames': 3.5}
+    }
+    lines = prometheus_text([({'session': 's1'}, summary)]).splitlines()
+
+    assert '# TYPE sumoxpypsa_stage_seconds summary' in lines
+    assert 'sumoxpypsa_stage_seconds{session="s1",stage="step",quantile="0.95"} 0.200000000' in lines
+    assert 'sumoxpypsa_stage_seconds_count{session="s1",stage="step"} 4' in lines
+    assert lines.index('# TYPE sumoxpypsa_frames_total counter') + 1 == \
+        lines.index('sumoxpypsa_frames_total{session="s1"} 7')
+    assert 'sumoxpypsa_frames_per_second{session="s1"} 3.5' in lines
@@ -0,0 +1,64 @@
+import math
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from vehicle_density import DensityGrid
+
+BOUNDS = {'lon_min': -74.0, 'lon_max': -73.9, 'lat_min': 40.7, 'lat_max': 40.8}
+
+
+def naive_aggregate(cells, lons, lats, is_ev, charging, speeds):
+    """Per-vehicle loop over the same grid: index -> [count, evs, charging, speed sum]"""
+    cell_w = (BOUNDS['lon_max'] - BOUNDS['lon_min']) / cells
+    cell_h = (BOUNDS['lat_max'] - BOUNDS['lat_min']) / cells
+    totals = defaultdict(lambda: [0, 0, 0, 0.0])
+    for lon, lat, ev, charge, speed in zip(lons, lats, is_ev, charging, speeds):
+        col = min(max(math.floor((lon - BOUNDS['lon_min']) / cell_w), 0), cells - 1)
+        row = min(max(math.floor((lat - BOUNDS['lat_min']) / cell_h), 0), cells - 1)
+        cell = totals[row * cells + col]
+        cell[0] += 1
+        cell[1] += int(ev)
+        cell[2] += int(charge)
+        cell[3] += speed
+    return dict(sorted(totals.items()))
+
+
+def test_aggregate_matches_a_naive_reference():
+    rng = np.random.default_rng(7)
+    n = 3000
+    # Some vehicles sit outside the bbox and are clipped into the edge cells
+    lons = rng.uniform(-74.01, -73.89, n)
+    lats = rng.uniform(40.69, 40.81, n)
+    is_ev = rng.random(n) < 0.3
+    charging = is_ev & (rng.random(n) < 0.2)
+    speeds = rng.uniform(0.0, 20.0, n)
+
+    result = DensityGrid(BOUNDS, cells=12).aggregate(lons, lats, is_ev, charging, speeds)
+    expected = naive_aggregate(12, lons, lats, is_ev, charging, speeds)
+
+    assert result['cells'] == [12, 12]
+    assert result['index'] == list(expected)
+    assert result['count'] == [v[0] for v in expected.values()]
+    assert result['evs'] == [v[1] for v in expected.values()]
+    assert result['charging'] == [v[2] for v in expected.values()]
+    assert result['mean_speed'] == pytest.approx([v[3] / v[0] for v in expected.values()], abs=0.05)
+    assert sum(result['count']) == n
+
+
+def test_only_occupied_cells_are_sent():
+    grid = DensityGrid(BOUNDS, cells=4)
+    result = grid.aggregate([-73.99, -73.99, -73.91], [40.71, 40.71, 40.79],
+                            [True, False, False], [True, False, False], [10.0, 0.0, 5.0])
+    assert result['index'] == [0, 15]
+    assert result['count'] == [2, 1]
+    assert result['evs'] == [1, 0]
+    assert result['charging'] == [1, 0]
+    assert result['mean_speed'] == [5.0, 5.0]
+    assert result['bbox'] == [-74.0, 40.7, -73.9, 40.8]
+
+
+def test_empty_frame():
+    result = DensityGrid(BOUNDS).aggregate([], [], [], [], [])
+    assert result['index'] == result['count'] == result['mean_speed'] == []
@@ -0,0 +1,61 @@
+import numpy as np
+
+from vehicle_frames import OTHER_TYPE, OTHER_TYPE_CODE, VehicleFrameEncoder, decode_vehicle_frame
+
+BOUNDS = {'lon_min': -74.02, 'lat_min': 40.70, 'lon_max': -73.93, 'lat_max': 40.80}
+
+
+def encode(encoder, ids, slots, types=None, keyframe=False):
+    n = len(ids)
+    return encoder.encode(
+        ids, slots,
+        np.linspace(-74.0, -73.95, n), np.linspace(40.71, 40.79, n),
+        np.full(n, 90.0), np.full(n, 10.0),
+        types or ['car'] * n, np.zeros(n, dtype=np.uint8), keyframe)
+
+
+def test_unregistered_rows_keep_ids_aligned():
+    encoder = VehicleFrameEncoder(BOUNDS)
+    header, buffer = encode(encoder, ['a', 'b', 'c', 'd'], [0, -1, 1, 2],
+                            types=['car', 'bus', 'taxi', 'car'], keyframe=True)
+
+    assert header['count'] == 3
+    assert header['ids'] == {0: 'a', 1: 'c', 2: 'd'}
+    decoded = decode_vehicle_frame(header, buffer, {}, {})
+    assert decoded['ids'] == ['a', 'c', 'd']
+    assert decoded['type'] == ['car', 'taxi', 'car']
+
+
+def test_roundtrip_positions_within_quantization():
+    encoder = VehicleFrameEncoder(BOUNDS)
+    header, buffer = encode(encoder, ['a', 'b'], [0, 1], keyframe=True)
+    decoded = decode_vehicle_frame(header, buffer, {}, {})
+
+    assert np.allclose(decoded['x'], [-74.0, -73.95], atol=1e-5)
+    assert np.allclose(decoded['y'], [40.71, 40.79], atol=1e-5)
+    assert np.allclose(decoded['speed'], 10.0)
+
+
+def test_ids_announced_only_when_new_or_reused():
+    encoder = VehicleFrameEncoder(BOUNDS)
+    encode(encoder, ['a', 'b'], [0, 1], keyframe=True)
+
+    header, _ = encode(encoder, ['a', 'b'], [0, 1])
+    assert header['ids'] == {}
+
+    header, _ = encode(encoder, ['a', 'z'], [0, 1])
+    assert header['ids'] == {1: 'z'}
+
+    header, _ = encode(encoder, ['a', 'z'], [0, 1], keyframe=True)
+    assert header['ids'] == {0: 'a', 1: 'z'}
+
+
+def test_type_codes_do_not_wrap():
+    encoder = VehicleFrameEncoder(BOUNDS)
+    types = [f"type_{i}" for i in range(300)]
+    header, buffer = encode(encoder, [f"v{i}" for i in range(300)], list(range(300)),
+                            types=types, keyframe=True)
+    decoded = decode_vehicle_frame(header, buffer, {}, {})
+
+    assert decoded['type'][:OTHER_TYPE_CODE] == types[:OTHER_TYPE_CODE]
+    assert set(decoded['type'][OTHER_TYPE_CODE:]) == {OTHER_TYPE}
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import traci.constants as tc
+
+import vehicle_registry
+from vehicle_registry import VehicleRegistry
+
+
+class FakeSimulation:
+    """Departed/arrived subscription results fed one step at a time"""
+
+    def __init__(self, fleet=()):
+        self.fleet = list(fleet)
+        self.results = {}
+
+    def subscribe(self, variables):
+        pass
+
+    def getSubscriptionResults(self):
+        return self.results
+
+    def churn(self, departed=(), arrived=()):
+        self.results = {tc.VAR_DEPARTED_VEHICLES_IDS: tuple(departed),
+                        tc.VAR_ARRIVED_VEHICLES_IDS: tuple(arrived)}
+
+
+def started_registry(monkeypatch, fleet=()):
+    simulation = FakeSimulation(fleet)
+    vehicle = SimpleNamespace(getIDList=lambda: tuple(simulation.fleet))
+    monkeypatch.setattr(vehicle_registry, 'traci', SimpleNamespace(simulation=simulation, vehicle=vehicle))
+    registry = VehicleRegistry()
+    registry.start()
+    return registry, simulation
+
+
+def test_start_registers_current_fleet(monkeypatch):
+    registry, _ = started_registry(monkeypatch, ['a', 'b'])
+
+    assert registry.slots == {'a': 0, 'b': 1}
+    assert len(registry) == 2
+
+
+def test_released_slots_are_reused_lowest_first(monkeypatch):
+    registry, simulation = started_registry(monkeypatch)
+    simulation.churn(departed=['a', 'b', 'c', 'd'])
+    registry.step()
+
+    simulation.churn(arrived=['c', 'b'])
+    registry.step()
+    assert registry.slot_ids == ['a', None, None, 'd']
+
+    simulation.churn(departed=['e', 'f', 'g'])
+    registry.step()
+    assert registry.slots_for(['e', 'f', 'g']).tolist() == [1, 2, 4]
+    assert registry.capacity == 5
+
+
+def test_arrival_listeners_get_arrived_ids(monkeypatch):
+    registry, simulation = started_registry(monkeypatch, ['a', 'b'])
+    seen = []
+    registry.add_arrival_listener(seen.append)
+
+    simulation.churn()
+    registry.step()
+    simulation.churn(arrived=['a'])
+    registry.step()
+
+    assert seen == [('a',)]
+
+
+def test_slots_for_marks_unknown_ids():
+    registry = VehicleRegistry()
+    registry._assign('a')
+
+    assert registry.slots_for(['a', 'ghost']).tolist() == [0, -1]
+
+
+def test_set_state_keeps_saved_slots_for_live_fleet():
+    saved = VehicleRegistry()
+    for vid in ('a', 'b', 'c'):
+        saved._assign(vid)
+    saved._release('b')
+
+    registry = VehicleRegistry()
+    for vid in ('c', 'a', 'new', 'gone'):
+        registry._assign(vid)
+    registry._release('gone')
+    registry.set_state(saved.get_state())
+
+    assert registry.slots == {'a': 0, 'c': 2, 'new': 1}
+    assert registry.slot_ids == ['a', 'new', 'c']
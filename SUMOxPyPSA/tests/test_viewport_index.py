@@ -0,0 +1,61 @@
+import numpy as np
+
+from viewport_index import GridIndex
+
+BOUNDS = {'lon_min': -74.0, 'lon_max': -73.9, 'lat_min': 40.7, 'lat_max': 40.8}
+
+
+def random_points(n=2000, seed=3):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-74.0, -73.9, n), rng.uniform(40.7, 40.8, n)
+
+
+def test_query_hits_match_a_naive_filter():
+    lons, lats = random_points()
+    grid = GridIndex(BOUNDS, cells=10).build(lons, lats)
+
+    cell_range = (2, 3, 5, 7)
+    west, south, east, north = grid.cells_bounds(cell_range)
+    expected = np.flatnonzero((lons >= west) & (lons < east) & (lats >= south) & (lats < north))
+
+    hits = grid.query(cell_range)
+    assert expected.size > 0
+    assert sorted(hits.tolist()) == expected.tolist()
+
+
+def test_query_misses_empty_cells():
+    lons = np.array([-73.995, -73.905])
+    lats = np.array([40.705, 40.795])
+    grid = GridIndex(BOUNDS, cells=10).build(lons, lats)
+
+    assert grid.query((0, 0, 0, 0)).tolist() == [0]
+    assert grid.query((9, 9, 9, 9)).tolist() == [1]
+    assert grid.query((3, 3, 6, 6)).size == 0
+
+
+def test_query_on_an_empty_frame():
+    grid = GridIndex(BOUNDS, cells=8).build(np.empty(0), np.empty(0))
+    assert grid.query((0, 0, 7, 7)).size == 0
+
+
+def test_points_outside_the_bbox_land_in_edge_cells():
+    grid = GridIndex(BOUNDS, cells=4).build(np.array([-75.0, -73.0]), np.array([40.0, 41.0]))
+    assert grid.query((0, 0, 0, 0)).tolist() == [0]
+    assert grid.query((3, 3, 3, 3)).tolist() == [1]
+
+
+def test_whole_grid_query_returns_every_point_once():
+    lons, lats = random_points(500)
+    grid = GridIndex(BOUNDS, cells=16).build(lons, lats)
+    everything = (0, 0, 15, 15)
+    assert grid.covers_all(everything)
+    assert sorted(grid.query(everything).tolist()) == list(range(500))
+
+
+def test_snap_viewport_pads_and_clips():
+    grid = GridIndex(BOUNDS, cells=10)
+    # 0.02 x 0.02 view around the centre, padded by a quarter on each side
+    cell_range = grid.snap_viewport([-73.96, 40.74, -73.94, 40.76], margin=0.25)
+    assert cell_range == (3, 3, 6, 6)
+    assert not grid.covers_all(cell_range)
+    assert grid.snap_viewport([-80.0, 40.0, -70.0, 41.0]) == (0, 0, 9, 9)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the projection, phase scheduler and simulation backends
+    projection  vectorized NumPy projection vs per-point traci convertGeo
+    scheduler   timer wheel vs a full scan of every light per tick
+    backends    steps per second of the NYC net under traci and libsumo
+
+Usage:
+    python tools/benchmarks.py                 # all three
+    python tools/benchmarks.py scheduler backends
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+# The simulation modules live flat one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import SUMO_PATH, CITY_CONFIGS
+from geo_projection import NetworkProjection
+from phase_scheduler import PhaseScheduler
+from simulation_backend import BACKENDS, load_backend
+
+BENCHMARKS = ('projection', 'scheduler', 'backends')
+
+
+def benchmark_projection(net_file="new_york/osm.net.xml.gz", sumo_binary="sumo", num_points=10000):
+    """Compare vectorized projection against per-point traci convertGeo"""
+    import traci
+
+    print("=" * 80)
+    print("🌐 PROJECTION BENCHMARK: convertGeo vs vectorized NumPy")
+    print("=" * 80)
+
+    projection = NetworkProjection.from_net_file(net_file)
+    traci.start([sumo_binary, "-n", net_file, "--no-step-log", "true"])
+
+    try:
+        (xmin, ymin), (xmax, ymax) = traci.simulation.getNetBoundary()
+        rng = np.random.default_rng(42)
+        x = rng.uniform(xmin, xmax, num_points)
+        y = rng.uniform(ymin, ymax, num_points)
+
+        start = time.perf_counter()
+        reference = np.array([traci.simulation.convertGeo(float(px), float(py)) for px, py in zip(x, y)])
+        traci_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lon, lat = projection.to_geo(x, y)
+        numpy_time = time.perf_counter() - start
+
+        # Positional error in metres (approximate local scale)
+        dlat_m = (lat - reference[:, 1]) * 111320.0
+        dlon_m = (lon - reference[:, 0]) * 111320.0 * np.cos(np.radians(lat))
+        max_error = float(np.max(np.hypot(dlat_m, dlon_m)))
+
+        back_x, back_y = projection.to_xy(lon, lat)
+        max_roundtrip = float(np.max(np.hypot(back_x - x, back_y - y)))
+    finally:
+        traci.close()
+
+    print(f"   Points:              {num_points}")
+    print(f"   traci convertGeo:    {traci_time * 1000:9.1f} ms")
+    print(f"   NumPy to_geo:        {numpy_time * 1000:9.1f} ms")
+    print(f"   Speedup:             {traci_time / max(numpy_time, 1e-9):9.1f}x")
+    print(f"   Max error vs SUMO:   {max_error * 100:9.4f} cm")
+    print(f"   Max round-trip err:  {max_roundtrip * 100:9.4f} cm")
+    print("=" * 80)
+
+    return max_error
+
+
+def benchmark_scheduler(num_lights=5000, num_ticks=3600, seed=42):
+    """Compare a full scan of every light per tick with the timer wheel"""
+    print("=" * 80)
+    print(f"🚦 PHASE SCHEDULER BENCHMARK: {num_lights} synthetic lights, {num_ticks} ticks")
+    print("=" * 80)
+
+    rng = random.Random(seed)
+    durations = (35, 3, 2, 35, 3, 2)
+
+    def make_lights():
+        rng.seed(seed)
+        return {
+            f'tl_{i}': {'phase': 0, 'timer': rng.randint(0, 30)}
+            for i in range(num_lights)
+        }
+
+    # Full scan (previous update_cycle behaviour)
+    lights = make_lights()
+    scan_changes = 0
+    start = time.perf_counter()
+    for _ in range(num_ticks):
+        for light in lights.values():
+            light['timer'] += 1
+            if light['timer'] >= durations[light['phase']]:
+                light['phase'] = (light['phase'] + 1) % 6
+                light['timer'] = 0
+                scan_changes += 1
+    scan_time = time.perf_counter() - start
+
+    # Timer wheel
+    lights = make_lights()
+    scheduler = PhaseScheduler()
+    for tl_id, light in lights.items():
+        scheduler.schedule(tl_id, durations[0] - light['timer'])
+    wheel_changes = 0
+    start = time.perf_counter()
+    for _ in range(num_ticks):
+        for tl_id in scheduler.advance():
+            light = lights[tl_id]
+            light['phase'] = (light['phase'] + 1) % 6
+            scheduler.schedule(tl_id, durations[light['phase']])
+            wheel_changes += 1
+    wheel_time = time.perf_counter() - start
+
+    print(f"   Phase changes:       {scan_changes} (scan) / {wheel_changes} (wheel)")
+    print(f"   Changes per tick:    {wheel_changes / num_ticks:9.1f}")
+    print(f"   Full scan:           {scan_time / num_ticks * 1e6:9.1f} µs/tick")
+    print(f"   Timer wheel:         {wheel_time / num_ticks * 1e6:9.1f} µs/tick")
+    print(f"   Speedup:             {scan_time / max(wheel_time, 1e-9):9.1f}x")
+    print("=" * 80)
+
+    return scan_time, wheel_time
+
+
+def benchmark_backends(sumo_binary="sumo", cfg_file="manhattan.sumocfg", working_dir=None, steps=3000):
+    """Steps per second of the NYC net under each available backend"""
+    import traci.constants as tc
+
+    print("=" * 80)
+    print(f"🚀 SIMULATION BACKEND BENCHMARK: {steps} steps")
+    print("=" * 80)
+
+    original_dir = os.getcwd()
+    results = {}
+
+    try:
+        if working_dir:
+            os.chdir(working_dir)
+
+        for name in BACKENDS:
+            try:
+                backend = load_backend(name)
+            except ImportError:
+                print(f"   {name:8s}: not installed")
+                continue
+
+            backend.start([sumo_binary, "-c", cfg_file, "--no-step-log", "true",
+                           "--no-warnings", "true"])
+            try:
+                backend.simulation.subscribe([tc.VAR_DEPARTED_VEHICLES_IDS])
+                start = time.perf_counter()
+                for _ in range(steps):
+                    backend.simulationStep()
+                    # Include the per-step state queries of the app loop
+                    for vid in backend.simulation.getSubscriptionResults().get(tc.VAR_DEPARTED_VEHICLES_IDS, ()):
+                        backend.vehicle.subscribe(vid, [tc.VAR_POSITION, tc.VAR_SPEED])
+                    backend.vehicle.getAllSubscriptionResults()
+                elapsed = time.perf_counter() - start
+                vehicles = backend.vehicle.getIDCount()
+            finally:
+                backend.close()
+
+            results[name] = steps / elapsed
+            print(f"   {name:8s}: {results[name]:9.1f} steps/s ({vehicles} vehicles at end)")
+    finally:
+        os.chdir(original_dir)
+
+    if len(results) == 2:
+        print(f"   Speedup:  {results['libsumo'] / results['traci']:9.1f}x")
+    print("=" * 80)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the projection, scheduler and backend benchmarks")
+    parser.add_argument("names", nargs="*", metavar="NAME",
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    sumo_binary = os.path.join(SUMO_PATH, "bin/sumo")
+    working_dir = CITY_CONFIGS["newyork"]["working_dir"]
+    for name in args.names or BENCHMARKS:
+        if name == 'projection':
+            benchmark_projection(net_file=os.path.join(working_dir, "osm.net.xml.gz"), sumo_binary=sumo_binary)
+        elif name == 'scheduler':
+            benchmark_scheduler()
+        else:
+            benchmark_backends(sumo_binary=sumo_binary, working_dir=working_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Compact binary encoding of vehicle positions
+Vehicles are sent as one little-endian buffer of column arrays instead of a JSON
+list of dicts. IDs are interned to their registry slot and the slot -> id
+mapping is announced once per stream (again on every keyframe), positions are
+quantized to uint16 over the view bounding box, and angle, speed, flags and
+type are packed into uint8 arrays.
+
+Buffer layout for n vehicles (offsets in bytes):
+    0      uint32[n]  slot
+    4n     uint16[n]  x (lon) quantized over bbox west..east
+    6n     uint16[n]  y (lat) quantized over bbox south..north
+    8n     uint8[n]   angle, 256 steps per turn
+    9n     uint8[n]   speed, SPEED_STEP m/s per unit
+    10n    uint8[n]   flags (bit 0 EV, bit 1 charging)
+    11n    uint8[n]   vehicle type code
+"""
+
+import numpy as np
+
+QUANT_MAX = 65535
+SPEED_STEP = 0.25  # m/s per unit (max 63.75 m/s)
+FLAG_EV = 1
+FLAG_CHARGING = 2
+BYTES_PER_VEHICLE = 12
+OTHER_TYPE_CODE = 255  # shared by every type past the first 255
+OTHER_TYPE = 'other'
+
+
+class VehicleFrameEncoder:
+    """Packs vehicle columns into the binary layout above"""
+
+    def __init__(self, bounds):
+        # [west, south, east, north]
+        self.bbox = [bounds['lon_min'], bounds['lat_min'], bounds['lon_max'], bounds['lat_max']]
+        self.announced = {}    # slot -> vehicle id the client knows
+        self.type_codes = {}   # vehicle type -> code
+
+    def reset(self):
+        """Forget what the clients know; the next frame re-announces everything"""
+        self.announced = {}
+
+    def encode(self, ids, slots, lons, lats, angles, speeds, types, flags, keyframe=False):
+        """Return (header, buffer); ``header`` carries the new id/type announcements
+
+        Rows with slot -1 (not in the registry) are dropped from every column.
+        """
+        if keyframe:
+            self.announced = {}
+
+        slots = np.asarray(slots, dtype=np.int64)
+        known = slots >= 0
+        if not known.all():
+            slots, lons, lats, angles, speeds, flags = (
+                np.asarray(column)[known] for column in (slots, lons, lats, angles, speeds, flags))
+            keep = known.tolist()
+            ids = [vid for vid, k in zip(ids, keep) if k]
+            types = [t for t, k in zip(types, keep) if k]
+        count = len(slots)
+
+        # Interning: announce slots that are new or were reused by another vehicle
+        new_ids = {}
+        announced = self.announced
+        for slot, vid in zip(slots.tolist(), ids):
+            if announced.get(slot) != vid:
+                announced[slot] = vid
+                new_ids[slot] = vid
+
+        new_types = {}
+        type_codes = np.empty(count, dtype=np.uint8)
+        for i, vtype in enumerate(types):
+            code = self.type_codes.get(vtype)
+            if code is None:
+                if len(self.type_codes) < OTHER_TYPE_CODE:
+                    code = self.type_codes[vtype] = len(self.type_codes)
+                    new_types[code] = vtype
+                else:
+                    # Out of codes: never reuse one, collapse the rest into 'other'
+                    code = self.type_codes[vtype] = OTHER_TYPE_CODE
+                    new_types[code] = OTHER_TYPE
+            type_codes[i] = code
+        if keyframe:
+            new_types = {code: (OTHER_TYPE if code == OTHER_TYPE_CODE else vtype)
+                         for vtype, code in self.type_codes.items()}
+
+        west, south, east, north = self.bbox
+        qx = np.clip(np.rint((np.asarray(lons) - west) / (east - west) * QUANT_MAX), 0, QUANT_MAX)
+        qy = np.clip(np.rint((np.asarray(lats) - south) / (north - south) * QUANT_MAX), 0, QUANT_MAX)
+        qangle = np.rint(np.asarray(angles) * (256 / 360.0)).astype(np.int64) % 256
+        qspeed = np.clip(np.rint(np.asarray(speeds) / SPEED_STEP), 0, 255)
+
+        buffer = b''.join((
+            slots.astype('<u4').tobytes(),
+            qx.astype('<u2').tobytes(),
+            qy.astype('<u2').tobytes(),
+            qangle.astype(np.uint8).tobytes(),
+            qspeed.astype(np.uint8).tobytes(),
+            np.asarray(flags, dtype=np.uint8).tobytes(),
+            type_codes.tobytes()
+        ))
+
+        header = {
+            'count': count,
+            'bbox': self.bbox,
+            'ids': new_ids,
+            'types': new_types
+        }
+        return header, buffer
+
+    def encode_vehicles(self, vehicles, columns, keyframe=False):
+        """Encode app vehicle dicts, taking positions from their harvested columns"""
+        flags = np.fromiter(
+            ((FLAG_EV if v['is_ev'] else 0) | (FLAG_CHARGING if v['charging'] else 0) for v in vehicles),
+            dtype=np.uint8, count=len(vehicles))
+        return self.encode(columns['ids'], columns['slot'], columns['lon'], columns['lat'], columns['angle'],
+                           columns['speed'], columns['type'], flags, keyframe)
+
+
+def decode_vehicle_frame(header, buffer, id_table, type_table):
+    """Python counterpart of the client decoder (used by the tests)"""
+    n = header['count']
+    id_table.update({int(slot): vid for slot, vid in header['ids'].items()})
+    type_table.update({int(code): vtype for code, vtype in header['types'].items()})
+    west, south, east, north = header['bbox']
+
+    slots = np.frombuffer(buffer, '<u4', n, 0)
+    qx = np.frombuffer(buffer, '<u2', n, 4 * n)
+    qy = np.frombuffer(buffer, '<u2', n, 6 * n)
+    angle = np.frombuffer(buffer, np.uint8, n, 8 * n)
+    speed = np.frombuffer(buffer, np.uint8, n, 9 * n)
+    flags = np.frombuffer(buffer, np.uint8, n, 10 * n)
+    types = np.frombuffer(buffer, np.uint8, n, 11 * n)
+
+    return {
+        'ids': [id_table[slot] for slot in slots.tolist()],
+        'x': (west + qx * ((east - west) / QUANT_MAX)).astype(np.float32),
+        'y': (south + qy * ((north - south) / QUANT_MAX)).astype(np.float32),
+        'angle': (angle * (360.0 / 256)).astype(np.float32),
+        'speed': (speed * SPEED_STEP).astype(np.float32),
+        'is_ev': (flags & FLAG_EV) > 0,
+        'charging': (flags & FLAG_CHARGING) > 0,
+        'type': [type_table[code] for code in types.tolist()]
+    }
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Incremental vehicle registry
+Tracks the live fleet from SUMO's departed/arrived ID lists, assigns every vehicle
+a dense integer slot and notifies listeners so per-vehicle state can be evicted
+as soon as a vehicle leaves the simulation
+"""
+
+import heapq
+
+import numpy as np
+from simulation_backend import traci
+import traci.constants as tc
+
+
+class VehicleRegistry:
+    """Dense slot allocation driven by departure/arrival subscriptions"""
+
+    def __init__(self):
+        self.slots = {}        # vehicle id -> slot
+        self.slot_ids = []     # slot -> vehicle id (None when free)
+        self.free_slots = []   # min-heap of released slots
+        self.departed = ()
+        self.arrived = ()
+        self.arrival_listeners = []
+
+    def add_arrival_listener(self, callback):
+        """Register ``callback(arrived_ids)`` to run whenever vehicles leave"""
+        self.arrival_listeners.append(callback)
+
+    def start(self):
+        """Subscribe to departures/arrivals and register the current fleet"""
+        self.slots = {}
+        self.slot_ids = []
+        self.free_slots = []
+        self.arrived = ()
+
+        traci.simulation.subscribe([tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS])
+        self.departed = tuple(traci.vehicle.getIDList())
+        for vid in self.departed:
+            self._assign(vid)
+
+    def step(self):
+        """Apply the churn of the last simulation step.
+
+        Must be called after every ``traci.simulationStep()``; work is
+        proportional to the number of departures and arrivals only.
+        """
+        results = traci.simulation.getSubscriptionResults()
+        self.departed = results.get(tc.VAR_DEPARTED_VEHICLES_IDS, ())
+        self.arrived = results.get(tc.VAR_ARRIVED_VEHICLES_IDS, ())
+
+        for vid in self.departed:
+            self._assign(vid)
+
+        if self.arrived:
+            for vid in self.arrived:
+                self._release(vid)
+            for callback in self.arrival_listeners:
+                callback(self.arrived)
+
+    def get_state(self):
+        """Slot assignment (for checkpoints)"""
+        return {'slots': dict(self.slots), 'slot_ids': list(self.slot_ids), 'free_slots': list(self.free_slots)}
+
+    def set_state(self, state):
+        """Take over a saved slot assignment for the same fleet, e.g. after SUMO loaded a state"""
+        live = self.slots
+        self.slots = {vid: slot for vid, slot in state['slots'].items() if vid in live}
+        self.slot_ids = [vid if vid in self.slots else None for vid in state['slot_ids']]
+        self.free_slots = [slot for slot, vid in enumerate(self.slot_ids) if vid is None]
+        heapq.heapify(self.free_slots)
+        # Vehicles SUMO has that the saved assignment lacks get fresh slots
+        for vid in live:
+            if vid not in self.slots:
+                self._assign(vid)
+
+    def _assign(self, vid):
+        if vid in self.slots:
+            return self.slots[vid]
+
+        if self.free_slots:
+            slot = heapq.heappop(self.free_slots)
+            self.slot_ids[slot] = vid
+        else:
+            slot = len(self.slot_ids)
+            self.slot_ids.append(vid)
+
+        self.slots[vid] = slot
+        return slot
+
+    def _release(self, vid):
+        slot = self.slots.pop(vid, None)
+        if slot is not None:
+            self.slot_ids[slot] = None
+            heapq.heappush(self.free_slots, slot)
+
+    def slots_for(self, ids):
+        """Slots of the given vehicle ids as an int32 array (-1 for unknown ids)"""
+        slots = self.slots
+        return np.fromiter((slots.get(vid, -1) for vid in ids), dtype=np.int32, count=len(ids))
+
+    @property
+    def capacity(self):
+        """Number of slots ever allocated (high-water mark of the live fleet)"""
+        return len(self.slot_ids)
+
+    def __len__(self):
+        return len(self.slots)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Uniform-grid spatial index for viewport filtering
+Points (vehicles, traffic lights) are bucketed into a fixed grid over the
+Manhattan bbox once per frame. Client viewports are snapped outward to whole
+cells plus a margin, so nearby views share a Socket.IO room and one encoder,
+and a viewport query is one contiguous slice per grid row.
+"""
+
+import numpy as np
+
+
+class GridIndex:
+    """Points bucketed by grid cell in CSR form (cell-sorted order + row offsets)"""
+
+    def __init__(self, bounds, cells=64):
+        self.west = bounds['lon_min']
+        self.south = bounds['lat_min']
+        self.east = bounds['lon_max']
+        self.north = bounds['lat_max']
+        self.cols = self.rows = int(cells)
+        self.cell_width = (self.east - self.west) / self.cols
+        self.cell_height = (self.north - self.south) / self.rows
+        self.order = np.empty(0, dtype=np.intp)
+        self.starts = np.zeros(self.cols * self.rows + 1, dtype=np.intp)
+
+    def cell_of(self, lons, lats):
+        """(col, row) of each point, clipped to the grid"""
+        col = np.clip(((np.asarray(lons) - self.west) / self.cell_width).astype(np.intp), 0, self.cols - 1)
+        row = np.clip(((np.asarray(lats) - self.south) / self.cell_height).astype(np.intp), 0, self.rows - 1)
+        return col, row
+
+    def build(self, lons, lats):
+        """Index the points of this frame"""
+        col, row = self.cell_of(lons, lats)
+        cell = row * self.cols + col
+        self.order = np.argsort(cell, kind='stable')
+        counts = np.bincount(cell, minlength=self.cols * self.rows)
+        self.starts = np.concatenate(([0], np.cumsum(counts)))
+        return self
+
+    def query(self, cell_range):
+        """Indices (in cell order) of the points in cells ``(col0, row0, col1, row1)`` (inclusive)"""
+        col0, row0, col1, row1 = cell_range
+        starts = self.starts
+        slices = [
+            self.order[starts[row * self.cols + col0]:starts[row * self.cols + col1 + 1]]
+            for row in range(row0, row1 + 1)
+        ]
+        if not slices:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(slices)
+
+    def snap_viewport(self, bounds, margin=0.25):
+        """Cell range covering ``[west, south, east, north]`` plus ``margin`` of its size on each side"""
+        west, south, east, north = bounds
+        pad_x = (east - west) * margin
+        pad_y = (north - south) * margin
+        col0, row0 = self.cell_of(west - pad_x, south - pad_y)
+        col1, row1 = self.cell_of(east + pad_x, north + pad_y)
+        return int(col0), int(row0), int(col1), int(row1)
+
+    def cells_bounds(self, cell_range):
+        """[west, south, east, north] of a cell range"""
+        col0, row0, col1, row1 = cell_range
+        return [self.west + col0 * self.cell_width, self.south + row0 * self.cell_height,
+                self.west + (col1 + 1) * self.cell_width, self.south + (row1 + 1) * self.cell_height]
+
+    def covers_all(self, cell_range):
+        return cell_range == (0, 0, self.cols - 1, self.rows - 1)